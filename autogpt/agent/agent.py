@@ -1,8 +1,11 @@
 from colorama import Fore, Style
 
 from autogpt.app import execute_command, get_command
+from autogpt.budget import BudgetExceededError, get_budget
 from autogpt.chat import chat_with_ai, create_chat_message
 from autogpt.config import Config
+from autogpt.context_window import ContextWindow
+from autogpt.json_fixes.incremental import IncrementalJSONParser
 from autogpt.json_fixes.master_json_fix_method import fix_json_using_multiple_techniques
 from autogpt.json_validation.validate_json import validate_json
 from autogpt.logs import logger, print_assistant_thoughts
@@ -48,6 +51,7 @@ class Agent:
         self.next_action_count = next_action_count
         self.system_prompt = system_prompt
         self.triggering_prompt = triggering_prompt
+        self.context_window = ContextWindow(full_message_history)
 
     def start_interaction_loop(self):
         # Interaction Loop
@@ -56,6 +60,7 @@ class Agent:
         command_name = None
         arguments = None
         user_input = ""
+        budget_degraded = False
 
         while True:
             # Discontinue if continuous limit is reached
@@ -69,25 +74,55 @@ class Agent:
                     "Continuous Limit Reached: ", Fore.YELLOW, f"{cfg.continuous_limit}"
                 )
                 break
+            # Discontinue once the LLM budget of the run is spent
+            budget = get_budget()
+            if budget.exhausted:
+                logger.typewriter_log(
+                    "LLM Budget Exhausted: ", Fore.YELLOW, budget.describe()
+                )
+                break
+            if budget.degraded and not budget_degraded:
+                budget_degraded = True
+                logger.typewriter_log(
+                    "BUDGET: ",
+                    Fore.YELLOW,
+                    f"{budget.describe()}, switching to cheaper model and shorter"
+                    " summaries",
+                )
 
             # Send message to AI, get response
-            with Spinner("Thinking... "):
-                assistant_reply = chat_with_ai(
-                    self.system_prompt,
-                    self.triggering_prompt,
-                    self.full_message_history,
-                    self.memory,
-                    cfg.fast_token_limit,
-                )  # TODO: This hardcodes the model to use GPT3.5. Make this an argument
+            reply_parser = IncrementalJSONParser() if cfg.stream_completions else None
+            try:
+                with Spinner("Thinking... ") as spinner:
+                    assistant_reply = chat_with_ai(
+                        self.system_prompt,
+                        self.triggering_prompt,
+                        self.full_message_history,
+                        self.memory,
+                        cfg.fast_token_limit,
+                        on_chunk=self._reply_chunk_handler(reply_parser, spinner)
+                        if reply_parser is not None
+                        else None,
+                        context_window=self.context_window,
+                    )  # TODO: This hardcodes the model to use GPT3.5. Make this an argument
 
-            assistant_reply_json = fix_json_using_multiple_techniques(assistant_reply)
+                assistant_reply_json = fix_json_using_multiple_techniques(
+                    assistant_reply
+                )
+            except BudgetExceededError:
+                logger.typewriter_log(
+                    "LLM Budget Exhausted: ", Fore.YELLOW, budget.describe()
+                )
+                break
 
             # Print Assistant thoughts
             if assistant_reply_json != {}:
                 validate_json(assistant_reply_json, "llm_response_format_1")
                 # Get command name and arguments
                 try:
-                    print_assistant_thoughts(self.ai_name, assistant_reply_json)
+                    # Streamed thoughts were printed as soon as they arrived
+                    if reply_parser is None or "thoughts" not in reply_parser.members:
+                        print_assistant_thoughts(self.ai_name, assistant_reply_json)
                     command_name, arguments = get_command(assistant_reply_json)
                     # command_name, arguments = assistant_reply_json_valid["command"]["name"], assistant_reply_json_valid["command"]["args"]
                     if cfg.speak_mode:
@@ -168,10 +203,11 @@ class Agent:
             elif command_name == "human_feedback":
                 result = f"Human feedback: {user_input}"
             else:
-                result = (
-                    f"Command {command_name} returned: "
-                    f"{execute_command(command_name, arguments)}"
-                )
+                with budget.command(command_name):
+                    result = (
+                        f"Command {command_name} returned: "
+                        f"{execute_command(command_name, arguments)}"
+                    )
                 if self.next_action_count > 0:
                     self.next_action_count -= 1
 
@@ -195,3 +231,27 @@ class Agent:
                 logger.typewriter_log(
                     "SYSTEM: ", Fore.YELLOW, "Unable to execute command"
                 )
+
+    def _reply_chunk_handler(self, reply_parser, spinner):
+        """Build the callback reading a streamed reply
+
+        The thoughts are printed as soon as they are complete, while the command
+        is still being generated, and the stream is closed once the reply object
+        is complete.
+
+        Args:
+            reply_parser (IncrementalJSONParser): The parser fed with the reply
+            spinner (Spinner): The spinner to stop before printing
+
+        Returns:
+            Callable[[str], bool]: The callback to pass to chat_with_ai
+        """
+
+        def on_chunk(chunk):
+            for key, value in reply_parser.feed(chunk):
+                if key == "thoughts" and isinstance(value, dict):
+                    spinner.stop()
+                    print_assistant_thoughts(self.ai_name, {"thoughts": value})
+            return reply_parser.done
+
+        return on_chunk
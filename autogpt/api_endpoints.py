@@ -0,0 +1,308 @@
+"""A pool of the API keys and Azure deployments serving the models.
+
+Every OpenAI key and every Azure deployment has its own rate limits, so spreading
+the requests over several of them raises the throughput by as much. Requests are
+sent to the endpoints serving the model by smooth weighted round-robin, and an
+endpoint that was throttled or failed is left out until its cooldown is over,
+the requests failing over to the others.
+
+The pool is built from ``OPENAI_API_KEY`` and ``OPENAI_API_KEYS``, or with
+``USE_AZURE`` from ``azure.yaml`` and its ``azure_endpoints``.
+
+The rate limits of an endpoint are learnt from the headers of its responses,
+which ``response_headers`` returns for the last request of the current task:
+``capture_response_headers`` hooks them for the synchronous requests, and
+``response_headers_trace`` for the requests of an aiohttp session.
+"""
+from __future__ import annotations
+
+import contextvars
+import dataclasses
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import aiohttp
+import requests
+from openai import api_requestor
+
+from autogpt.config import Config
+from autogpt.rate_limiter import RateLimiter, RateLimitKey, get_rate_limiter
+
+_pool: EndpointPool | None = None
+# Headers of the last response received by the current task, when known
+_response_headers: contextvars.ContextVar[Mapping[str, str]] = contextvars.ContextVar(
+    "response_headers", default={}
+)
+# The last synchronous response of the current task, still open while streamed
+_response: contextvars.ContextVar[Optional[requests.Response]] = contextvars.ContextVar(
+    "response", default=None
+)
+
+
+@dataclasses.dataclass
+class Endpoint:
+    """One place requests can be sent to, with its health
+
+    Attributes:
+        name: The name of the endpoint in rate limits and reports, None for the
+            default OpenAI key
+        api_key: The API key, None to use openai.api_key
+        weight: The share of the requests sent to the endpoint
+        api_base: The base URL, None to use openai.api_base
+        api_type: The API type, None to use openai.api_type
+        api_version: The API version, None to use openai.api_version
+        deployments: The Azure deployment of each model, None when the endpoint
+            serves every model by name
+    """
+
+    name: Optional[str]
+    api_key: Optional[str] = None
+    weight: int = 1
+    api_base: Optional[str] = None
+    api_type: Optional[str] = None
+    api_version: Optional[str] = None
+    deployments: Optional[Callable[[str], str]] = None
+    requests: int = 0
+    failures: int = 0
+    unhealthy_until: float = 0.0
+
+    def serves(self, model: str) -> bool:
+        """Whether requests for the model can be sent to the endpoint"""
+        if self.deployments is None:
+            return True
+        try:
+            return bool(self.deployments(model))
+        except KeyError:
+            return False
+
+    def request_kwargs(self, model: str) -> dict:
+        """The arguments sending an OpenAI SDK request to the endpoint"""
+        kwargs = {
+            "api_key": self.api_key,
+            "api_base": self.api_base,
+            "api_type": self.api_type,
+            "api_version": self.api_version,
+        }
+        kwargs = {name: value for name, value in kwargs.items() if value is not None}
+        if self.deployments is not None:
+            kwargs["deployment_id"] = self.deployments(model)
+        return kwargs
+
+
+class EndpointPool:
+    """Spread requests over endpoints by weight, skipping unhealthy ones"""
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        limiter: RateLimiter | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the pool
+
+        Args:
+            endpoints (List[Endpoint]): The endpoints, at least one
+            limiter (RateLimiter, optional): The rate limiter scheduling the
+                requests of each endpoint. Defaults to the shared one.
+            clock (Callable[[], float]): The clock measuring the cooldowns
+        """
+        self.endpoints = endpoints
+        self._limiter = limiter
+        self.clock = clock
+        self._current_weights: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def limiter(self) -> RateLimiter:
+        return self._limiter or get_rate_limiter()
+
+    def acquire(self, model: str, tokens: int) -> Tuple[Endpoint, float]:
+        """Pick the endpoint of the next request
+
+        When every endpoint is unhealthy, the one recovering first is picked.
+
+        Args:
+            model (str): The model of the request
+            tokens (int): The estimated number of tokens of the request
+
+        Returns:
+            Tuple[Endpoint, float]: The endpoint, and the number of seconds to wait
+                before sending the request to it
+        """
+        with self._lock:
+            candidates = self._serving(model)
+            now = self.clock()
+            healthy = [e for e in candidates if e.unhealthy_until <= now]
+            if healthy:
+                endpoint = self._next_by_weight(model, healthy)
+            else:
+                endpoint = min(candidates, key=lambda e: e.unhealthy_until)
+            endpoint.requests += 1
+        return endpoint, self.limiter.reserve(self.key(endpoint, model), tokens)
+
+    def healthy(self, model: str) -> bool:
+        """Whether an endpoint serving the model is ready for requests"""
+        now = self.clock()
+        with self._lock:
+            return any(e.unhealthy_until <= now for e in self._serving(model))
+
+    def succeeded(
+        self, endpoint: Endpoint, model: str, headers: Mapping[str, str]
+    ) -> None:
+        """Record a successful request and the headers of its response"""
+        with self._lock:
+            endpoint.unhealthy_until = 0.0
+        self.limiter.observe(self.key(endpoint, model), headers)
+
+    def throttled(
+        self, endpoint: Endpoint, model: str, headers: Mapping[str, str]
+    ) -> float | None:
+        """Record a request rejected with a 429
+
+        Returns:
+            float | None: The number of seconds the server asked to wait, if any
+        """
+        return self.limiter.throttled(self.key(endpoint, model), headers)
+
+    def failed(self, endpoint: Endpoint, cooldown: float) -> None:
+        """Leave an endpoint out of the rotation for a while after a failure"""
+        with self._lock:
+            endpoint.failures += 1
+            endpoint.unhealthy_until = max(
+                endpoint.unhealthy_until, self.clock() + cooldown
+            )
+
+    def report(self) -> str:
+        """Describe the requests sent to each endpoint"""
+        return "API endpoints: " + ", ".join(
+            f"{e.name or 'default'} {e.requests} requests, {e.failures} failures"
+            for e in self.endpoints
+        )
+
+    @staticmethod
+    def key(endpoint: Endpoint, model: str) -> RateLimitKey:
+        """The rate limits the requests for a model on an endpoint count against"""
+        return model, endpoint.name
+
+    def _serving(self, model: str) -> List[Endpoint]:
+        endpoints = [e for e in self.endpoints if e.serves(model)]
+        if not endpoints:
+            raise ValueError(f"No API endpoint is configured for model '{model}'")
+        return endpoints
+
+    def _next_by_weight(self, model: str, endpoints: List[Endpoint]) -> Endpoint:
+        # Smooth weighted round-robin: every endpoint gains its weight, the one
+        # ahead is picked and pays back the total. A 2:1 split goes A, B, A.
+        total = 0
+        for endpoint in endpoints:
+            key = (model, id(endpoint))
+            self._current_weights[key] = (
+                self._current_weights.get(key, 0) + endpoint.weight
+            )
+            total += endpoint.weight
+        chosen = max(endpoints, key=lambda e: self._current_weights[(model, id(e))])
+        self._current_weights[(model, id(chosen))] -= total
+        return chosen
+
+
+def create_endpoint_pool(cfg: Config) -> EndpointPool:
+    """Create the pool of the endpoints in the config
+
+    Args:
+        cfg (Config): The config
+
+    Returns:
+        EndpointPool: The pool
+    """
+    if not cfg.use_azure:
+        endpoints = [Endpoint(name=None)]
+        for i, (api_key, weight) in enumerate(cfg.openai_api_keys):
+            endpoints.append(Endpoint(f"key-{i + 2}", api_key=api_key, weight=weight))
+        return EndpointPool(endpoints)
+
+    endpoints = [
+        Endpoint(
+            cfg.openai_api_base,
+            deployments=cfg.get_azure_deployment_id_for_model,
+        )
+    ]
+    for params in cfg.azure_endpoints:
+        model_map = params.get("azure_model_map", {})
+        endpoints.append(
+            Endpoint(
+                params["azure_api_base"],
+                api_key=params.get("azure_api_key"),
+                weight=params.get("weight", 1),
+                api_base=params["azure_api_base"],
+                api_type=params.get("azure_api_type", cfg.openai_api_type),
+                api_version=params.get("azure_api_version", cfg.openai_api_version),
+                deployments=lambda model, model_map=model_map: (
+                    cfg.get_azure_deployment_id_for_model(model, model_map)
+                ),
+            )
+        )
+    return EndpointPool(endpoints)
+
+
+def response_headers() -> Mapping[str, str]:
+    """Return the headers of the last response received by the current task"""
+    return _response_headers.get()
+
+
+def capture_response_headers() -> None:
+    """Keep the headers of the next synchronous response of this thread
+
+    The OpenAI SDK sends the requests of each thread through a requests session
+    of its own, on which a response hook is installed once. The headers of an
+    earlier response are forgotten, so that they are not taken for those of the
+    next one. With a version of the SDK that does not keep its sessions there,
+    the headers are not known and the rate limits are not learnt.
+    """
+    _response_headers.set({})
+    _response.set(None)
+    thread = getattr(api_requestor, "_thread_context", None)
+    make_session = getattr(api_requestor, "_make_session", None)
+    if thread is None or make_session is None:
+        return
+    if not hasattr(thread, "session"):
+        thread.session = make_session()
+    hooks = thread.session.hooks["response"]
+    if _keep_response_headers not in hooks:
+        hooks.append(_keep_response_headers)
+
+
+def close_response() -> None:
+    """Close the last synchronous response of the current task
+
+    A streamed response that is not read to its end keeps its connection until
+    it is closed, and the OpenAI SDK does not expose it.
+    """
+    response = _response.get()
+    if response is not None:
+        response.close()
+
+
+def response_headers_trace() -> aiohttp.TraceConfig:
+    """Keep the headers of each response in the task that made the request"""
+
+    async def on_request_end(session, context, params) -> None:
+        _response_headers.set(params.response.headers)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+def _keep_response_headers(response: requests.Response, *args, **kwargs) -> None:
+    # requests calls the hooks in the thread, and context, of the request
+    _response_headers.set(response.headers)
+    _response.set(response)
+
+
+def get_endpoint_pool() -> EndpointPool:
+    """Return the endpoint pool shared by every OpenAI call"""
+    global _pool
+    if _pool is None:
+        _pool = create_endpoint_pool(Config())
+    return _pool
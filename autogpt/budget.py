@@ -0,0 +1,151 @@
+"""Token and dollar budgets of a run and of each command.
+
+The spend is read from the LLM ledger, so every chat completion and embedding
+sent to the API counts, and nothing answered by a cache or a recording does.
+Two budgets are enforced, each in tokens and in US dollars, 0 leaving it
+unlimited:
+
+- the run: ``LLM_BUDGET_TOKENS`` and ``LLM_BUDGET_DOLLARS``
+- each command the agent executes, e.g. a ``browse_website`` fanning out into
+  one summary per chunk: ``LLM_COMMAND_BUDGET_TOKENS`` and
+  ``LLM_COMMAND_BUDGET_DOLLARS``
+
+Once ``LLM_BUDGET_DEGRADE_AT`` of a budget is spent, the calls are degraded: they
+prefer the cheaper of the fast and smart models and the summaries are kept to
+``LLM_BUDGET_SUMMARY_TOKENS``. Once it is all spent, the chat completions raise
+BudgetExceededError, which ends the command with an error. The agent stops before
+its next step when the run budget is the one spent, or as soon as one of its own
+calls, for its reply or to fix the JSON of it, raises.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import dataclasses
+from typing import Iterator, Optional, Tuple
+
+from autogpt.config import Config
+from autogpt.telemetry import LLMLedger, get_ledger, llm_command, model_prices
+
+_budget: BudgetManager | None = None
+
+# The tokens and dollars spent when the current command started
+_command_start: contextvars.ContextVar[
+    Optional[Tuple[int, float]]
+] = contextvars.ContextVar("command_start", default=None)
+
+
+class BudgetExceededError(RuntimeError):
+    """An LLM call made after its budget was spent"""
+
+
+@dataclasses.dataclass
+class Budget:
+    """A limit on the tokens and dollars spent, 0 for none"""
+
+    tokens: int = 0
+    dollars: float = 0.0
+
+    def used(self, tokens: int, dollars: float) -> float:
+        """The share of the budget spent, 0 if unlimited"""
+        return max(
+            tokens / self.tokens if self.tokens else 0.0,
+            dollars / self.dollars if self.dollars else 0.0,
+        )
+
+
+class BudgetManager:
+    """Degrade then stop the LLM calls as the budgets are spent"""
+
+    def __init__(self, cfg: Config, ledger: LLMLedger) -> None:
+        """Initialize the manager
+
+        Args:
+            cfg (Config): The config holding the budgets and the models, read on
+                every call
+            ledger (LLMLedger): The ledger the spend is read from
+        """
+        self.cfg = cfg
+        self.ledger = ledger
+
+    @property
+    def run_budget(self) -> Budget:
+        return Budget(self.cfg.llm_budget_tokens, self.cfg.llm_budget_dollars)
+
+    @property
+    def command_budget(self) -> Budget:
+        return Budget(
+            self.cfg.llm_command_budget_tokens, self.cfg.llm_command_budget_dollars
+        )
+
+    @contextlib.contextmanager
+    def command(self, name: str) -> Iterator[None]:
+        """Account the LLM calls made in the block to a command"""
+        token = _command_start.set(self.spent())
+        try:
+            with llm_command(name):
+                yield
+        finally:
+            _command_start.reset(token)
+
+    def spent(self) -> Tuple[int, float]:
+        """The tokens and dollars spent by the run"""
+        total = self.ledger.total
+        return total.prompt_tokens + total.completion_tokens, total.cost
+
+    def used(self) -> float:
+        """The largest share spent of the run budget and the command budget"""
+        tokens, dollars = self.spent()
+        used = self.run_budget.used(tokens, dollars)
+        start = _command_start.get()
+        if start is not None:
+            used = max(
+                used, self.command_budget.used(tokens - start[0], dollars - start[1])
+            )
+        return used
+
+    @property
+    def degraded(self) -> bool:
+        return self.used() >= self.cfg.llm_budget_degrade_at
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used() >= 1
+
+    def check(self) -> None:
+        """Raise BudgetExceededError if a budget is spent"""
+        if self.exhausted:
+            raise BudgetExceededError(f"LLM budget exhausted: {self.describe()}")
+
+    def model(self, preferred: str) -> str:
+        """The model a call should prefer, the cheapest once degraded"""
+        if not self.degraded:
+            return preferred
+        models = {preferred, self.cfg.fast_llm_model, self.cfg.smart_llm_model}
+        return min(models, key=lambda model: sum(model_prices(model)))
+
+    def summary_tokens(self) -> Optional[int]:
+        """The maximum length of a summary, None for no limit"""
+        return self.cfg.llm_budget_summary_tokens if self.degraded else None
+
+    def describe(self) -> str:
+        """Describe the spend against the budgets"""
+        tokens, dollars = self.spent()
+        description = f"{tokens} tokens and ${dollars:.4f} spent"
+        if self.run_budget.tokens or self.run_budget.dollars:
+            description += f", {self.run_budget.used(tokens, dollars):.0%} of the run"
+        start = _command_start.get()
+        if start is not None and (
+            self.command_budget.tokens or self.command_budget.dollars
+        ):
+            used = self.command_budget.used(tokens - start[0], dollars - start[1])
+            description += f", {used:.0%} of the command"
+        return description
+
+
+def get_budget() -> BudgetManager:
+    """Return the budget manager of this run"""
+    global _budget
+    if _budget is None:
+        _budget = BudgetManager(Config(), get_ledger())
+    return _budget
@@ -1,11 +1,13 @@
 import time
 
-from openai.error import RateLimitError
-
-from autogpt import token_counter
+from autogpt import llm_models
 from autogpt.config import Config
-from autogpt.llm_utils import create_chat_completion
+from autogpt.context_window import ContextPacker, ContextWindow
+from autogpt.llm_models import get_model_info
+from autogpt.llm_recording import CURRENT_TIME_PREFIX
+from autogpt.llm_utils import create_chat_completion, route_model
 from autogpt.logs import logger
+from autogpt.model_router import get_model_router
 
 cfg = Config()
 
@@ -24,152 +26,180 @@ def create_chat_message(role, content):
     return {"role": role, "content": content}
 
 
-def generate_context(prompt, relevant_memory, full_message_history, model):
+def memory_message(relevant_memory):
+    """The content of the message reminding the AI of its relevant memories"""
+    return f"This reminds you of these events from your past:\n{relevant_memory}\n\n"
+
+
+def add_required_messages(packer, prompt, user_input, relevant_memory):
+    """
+    Add the messages every step sends to a packer.
+
+    The prompts and the user input always fit, then the most relevant memories
+    within their allocation.
+
+    Args:
+    packer (ContextPacker): The packer counting the messages.
+    prompt (str): The prompt explaining the rules to the AI.
+    user_input (str): The input from the user.
+    relevant_memory (list | str): The memories, most relevant first, or "" when
+        there are none to look up.
+
+    Returns:
+    list: The messages, the user input last.
+    """
     current_context = [
-        create_chat_message("system", prompt),
-        create_chat_message(
-            "system", f"The current time and date is {time.strftime('%c')}"
-        ),
-        create_chat_message(
-            "system",
-            f"This reminds you of these events from your past:\n{relevant_memory}\n\n",
+        packer.add(create_chat_message("system", prompt)),
+        packer.add(
+            create_chat_message("system", f"{CURRENT_TIME_PREFIX}{time.strftime('%c')}")
         ),
     ]
-
-    # Add messages from the full message history until we reach the token limit
-    next_message_to_add_index = len(full_message_history) - 1
-    insertion_index = len(current_context)
-    # Count the currently used tokens
-    current_tokens_used = token_counter.count_message_tokens(current_context, model)
-    return (
-        next_message_to_add_index,
-        current_tokens_used,
-        insertion_index,
-        current_context,
+    packer.add(create_chat_message("system", memory_message("")))
+    if relevant_memory:
+        relevant_memory = packer.select(
+            relevant_memory, cfg.context_memory_tokens - packer.tokens
+        )
+    current_context.append(
+        create_chat_message("system", memory_message(relevant_memory))
     )
+    current_context.append(packer.add(create_chat_message("user", user_input)))
+    return current_context
+
+
+def pack_context(
+    prompt, user_input, relevant_memory, context_window, token_budget, model
+):
+    """
+    Pack the messages sent to the AI in a number of tokens.
+
+    The messages every step sends come first, see add_required_messages, then
+    the most recent messages of the history in the rest.
+
+    Args:
+    prompt (str): The prompt explaining the rules to the AI.
+    user_input (str): The input from the user.
+    relevant_memory (list | str): The memories, most relevant first, or "" when
+        there are none to look up.
+    context_window (ContextWindow): The window over the message history.
+    token_budget (int): The number of tokens the messages can use.
+    model (str): The model whose tokens are counted.
+
+    Returns:
+    tuple[list, ContextPacker]: The messages, and the packer that counted them.
+    """
+    packer = ContextPacker(token_budget, model)
+    current_context = add_required_messages(packer, prompt, user_input, relevant_memory)
+    current_context[-1:-1] = packer.fit_history(context_window)
+    return current_context, packer
 
 
 # TODO: Change debug from hardcode to argument
 def chat_with_ai(
-    prompt, user_input, full_message_history, permanent_memory, token_limit
+    prompt,
+    user_input,
+    full_message_history,
+    permanent_memory,
+    token_limit,
+    on_chunk=None,
+    context_window=None,
 ):
-    """Interact with the OpenAI API, sending the prompt, user input, message history,
-    and permanent memory."""
-    while True:
-        try:
-            """
-            Interact with the OpenAI API, sending the prompt, user input,
-                message history, and permanent memory.
-
-            Args:
-                prompt (str): The prompt explaining the rules to the AI.
-                user_input (str): The input from the user.
-                full_message_history (list): The list of all messages sent between the
-                    user and the AI.
-                permanent_memory (Obj): The memory object containing the permanent
-                  memory.
-                token_limit (int): The maximum number of tokens allowed in the API call.
-
-            Returns:
-            str: The AI's response.
-            """
-            model = cfg.fast_llm_model  # TODO: Change model from hardcode to argument
-            # Reserve 1000 tokens for the response
-
-            logger.debug(f"Token limit: {token_limit}")
-            send_token_limit = token_limit - 1000
-
-            relevant_memory = (
-                ""
-                if len(full_message_history) == 0
-                else permanent_memory.get_relevant(str(full_message_history[-9:]), 10)
-            )
-
-            logger.debug(f"Memory Stats: {permanent_memory.get_stats()}")
-
-            (
-                next_message_to_add_index,
-                current_tokens_used,
-                insertion_index,
-                current_context,
-            ) = generate_context(prompt, relevant_memory, full_message_history, model)
-
-            while current_tokens_used > 2500:
-                # remove memories until we are under 2500 tokens
-                relevant_memory = relevant_memory[:-1]
-                (
-                    next_message_to_add_index,
-                    current_tokens_used,
-                    insertion_index,
-                    current_context,
-                ) = generate_context(
-                    prompt, relevant_memory, full_message_history, model
-                )
-
-            current_tokens_used += token_counter.count_message_tokens(
-                [create_chat_message("user", user_input)], model
-            )  # Account for user input (appended later)
-
-            while next_message_to_add_index >= 0:
-                # print (f"CURRENT TOKENS USED: {current_tokens_used}")
-                message_to_add = full_message_history[next_message_to_add_index]
-
-                tokens_to_add = token_counter.count_message_tokens(
-                    [message_to_add], model
-                )
-                if current_tokens_used + tokens_to_add > send_token_limit:
-                    break
-
-                # Add the most recent message to the start of the current context,
-                #  after the two system prompts.
-                current_context.insert(
-                    insertion_index, full_message_history[next_message_to_add_index]
-                )
-
-                # Count the currently used tokens
-                current_tokens_used += tokens_to_add
-
-                # Move to the next most recent message in the full message history
-                next_message_to_add_index -= 1
-
-            # Append user input, the length of this is accounted for above
-            current_context.extend([create_chat_message("user", user_input)])
-
-            # Calculate remaining tokens
-            tokens_remaining = token_limit - current_tokens_used
-            # assert tokens_remaining >= 0, "Tokens remaining is negative.
-            # This should never happen, please submit a bug report at
-            #  https://www.github.com/Torantulino/Auto-GPT"
-
-            # Debug print the current context
-            logger.debug(f"Token limit: {token_limit}")
-            logger.debug(f"Send Token Count: {current_tokens_used}")
-            logger.debug(f"Tokens remaining for response: {tokens_remaining}")
-            logger.debug("------------ CONTEXT SENT TO AI ---------------")
-            for message in current_context:
-                # Skip printing the prompt
-                if message["role"] == "system" and message["content"] == prompt:
-                    continue
-                logger.debug(f"{message['role'].capitalize()}: {message['content']}")
-                logger.debug("")
-            logger.debug("----------- END OF CONTEXT ----------------")
-
-            # TODO: use a model defined elsewhere, so that model can contain
-            # temperature and other settings we care about
-            assistant_reply = create_chat_completion(
-                model=model,
-                messages=current_context,
-                max_tokens=tokens_remaining,
-            )
-
-            # Update full message history
-            full_message_history.append(create_chat_message("user", user_input))
-            full_message_history.append(
-                create_chat_message("assistant", assistant_reply)
-            )
-
-            return assistant_reply
-        except RateLimitError:
-            # TODO: When we switch to langchain, this is built in
-            print("Error: ", "API Rate Limit Reached. Waiting 10 seconds...")
-            time.sleep(10)
+    """
+    Interact with the OpenAI API, sending the prompt, user input,
+        message history, and permanent memory.
+
+    Rate limits are handled by create_chat_completion.
+
+    Args:
+        prompt (str): The prompt explaining the rules to the AI.
+        user_input (str): The input from the user.
+        full_message_history (list): The list of all messages sent between the
+            user and the AI.
+        permanent_memory (Obj): The memory object containing the permanent
+          memory.
+        token_limit (int): The maximum number of tokens allowed in the API call.
+        on_chunk (Callable[[str], bool | None], optional): If given, the
+          response is streamed and every piece of it is passed to
+          on_chunk, which returns True to stop reading. Defaults to None.
+        context_window (ContextWindow, optional): The window over
+          full_message_history kept from the previous step. Defaults to None,
+          building a new one.
+
+    Returns:
+    str: The AI's response.
+    """
+    # Reserve tokens for the response
+    response_tokens = cfg.context_response_tokens
+    router = get_model_router()
+
+    def model_token_limit(model):
+        if model != cfg.fast_llm_model:
+            limit = router.token_limit(model)
+        else:
+            limit = token_limit
+        # Never more than the context of the model
+        return int(llm_models.token_limit(model, limit))
+
+    relevant_memory = (
+        ""
+        if len(full_message_history) == 0
+        else permanent_memory.get_relevant(str(full_message_history[-9:]), 10)
+    )
+
+    logger.debug(f"Memory Stats: {permanent_memory.get_stats()}")
+
+    if context_window is None:
+        context_window = ContextWindow(full_message_history)
+    # Only the messages the step cannot do without choose the model, the history
+    # is then trimmed to fit in it
+    packer = ContextPacker(
+        model_token_limit(cfg.fast_llm_model) - response_tokens, cfg.fast_llm_model
+    )
+    current_context = add_required_messages(packer, prompt, user_input, relevant_memory)
+    model = route_model("chat", cfg.fast_llm_model, packer.tokens, response_tokens)
+    token_limit = model_token_limit(model)
+    send_token_limit = token_limit - response_tokens
+    if get_model_info(model).encoding == get_model_info(packer.model).encoding:
+        # The messages counted so far count the same for the routed model
+        packer.token_budget, packer.model = send_token_limit, model
+    else:
+        packer = ContextPacker(send_token_limit, model)
+        current_context = add_required_messages(
+            packer, prompt, user_input, relevant_memory
+        )
+    current_context[-1:-1] = packer.fit_history(context_window)
+    current_tokens_used = packer.tokens
+
+    # Calculate remaining tokens
+    tokens_remaining = token_limit - current_tokens_used
+    # assert tokens_remaining >= 0, "Tokens remaining is negative.
+    # This should never happen, please submit a bug report at
+    #  https://www.github.com/Torantulino/Auto-GPT"
+
+    # Debug print the current context
+    logger.debug(f"Token limit: {token_limit}")
+    logger.debug(f"Send Token Count: {current_tokens_used}")
+    logger.debug(f"Tokens remaining for response: {tokens_remaining}")
+    logger.debug("------------ CONTEXT SENT TO AI ---------------")
+    for message in current_context:
+        # Skip printing the prompt
+        if message["role"] == "system" and message["content"] == prompt:
+            continue
+        logger.debug(f"{message['role'].capitalize()}: {message['content']}")
+        logger.debug("")
+    logger.debug("----------- END OF CONTEXT ----------------")
+
+    # TODO: use a model defined elsewhere, so that model can contain
+    # temperature and other settings we care about
+    assistant_reply = create_chat_completion(
+        model=model,
+        messages=current_context,
+        max_tokens=tokens_remaining,
+        stream=on_chunk is not None,
+        on_chunk=on_chunk,
+    )
+
+    # Update full message history
+    full_message_history.append(create_chat_message("user", user_input))
+    full_message_history.append(create_chat_message("assistant", assistant_reply))
+
+    return assistant_reply
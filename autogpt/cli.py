@@ -79,6 +79,8 @@ def main(
     from autogpt.logs import logger
     from autogpt.memory import get_memory
     from autogpt.prompt import construct_prompt
+    from autogpt.telemetry import get_ledger
+    from autogpt.token_counter import warm_up_encodings
     from autogpt.utils import get_latest_bulletin
 
     if ctx.invoked_subcommand is None:
@@ -100,6 +102,8 @@ def main(
             skip_news,
         )
         logger.set_level(logging.DEBUG if cfg.debug_mode else logging.INFO)
+        # Build the encodings while the user sets the agent up
+        warm_up_encodings([cfg.fast_llm_model, cfg.smart_llm_model])
         ai_name = ""
         if not cfg.skip_news:
             motd = get_latest_bulletin()
@@ -130,7 +134,10 @@ def main(
             system_prompt=system_prompt,
             triggering_prompt=triggering_prompt,
         )
-        agent.start_interaction_loop()
+        try:
+            agent.start_interaction_loop()
+        finally:
+            logger.info(get_ledger().summary(), "LLM USAGE:", Fore.GREEN)
 
 
 if __name__ == "__main__":
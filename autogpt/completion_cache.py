@@ -0,0 +1,114 @@
+"""Persistent cache of deterministic chat completions.
+
+A completion requested with a temperature of 0 is, for practical purposes, a
+function of its model, messages and parameters, so repeating it is a waste of
+latency and money. ``call_ai_function`` always runs at temperature 0, which makes
+``fix_json``, ``evaluate_code``, ``improve_code`` and ``write_tests`` the main
+beneficiaries.
+
+Entries expire after a time to live, as the models behind a name change over
+time. The least recently used entries are evicted once the cached responses
+exceed the size cap.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+
+from autogpt.sqlite_cache import SQLiteLRUCache
+
+
+class CompletionCache(SQLiteLRUCache):
+    """Disk-backed LRU cache of chat completions with a time to live"""
+
+    table = "completions"
+    schema = (
+        "CREATE TABLE IF NOT EXISTS completions ("
+        " key TEXT PRIMARY KEY,"
+        " response TEXT NOT NULL,"
+        " created REAL NOT NULL,"
+        " last_used REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS completions_last_used"
+        " ON completions (last_used)",
+        "CREATE INDEX IF NOT EXISTS completions_created ON completions (created)",
+    )
+    size_expression = "LENGTH(CAST(response AS BLOB))"
+
+    def __init__(self, filename: str, max_size: int, ttl: float) -> None:
+        """Open the cache, creating the file if needed
+
+        Args:
+            filename (str): The path of the SQLite file
+            max_size (int): The maximum total size of the responses, in bytes
+            ttl (float): The number of seconds an entry stays valid
+        """
+        super().__init__(filename, max_size)
+        self.ttl = ttl
+
+    def get(self, key: str) -> str | None:
+        """Look up a completion
+
+        Args:
+            key (str): The key returned by completion_key
+
+        Returns:
+            str | None: The cached response, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._cnx.execute(
+                "SELECT response, created FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._delete([key])
+                row = None
+            elif row is not None:
+                self._touch([key], now)
+            self._cnx.commit()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Store a completion, evicting old entries if needed
+
+        Args:
+            key (str): The key returned by completion_key
+            response (str): The response of the completion
+        """
+        now = time.time()
+        with self._lock:
+            self._delete(
+                expired
+                for (expired,) in self._cnx.execute(
+                    "SELECT key FROM completions WHERE created < ?", (now - self.ttl,)
+                ).fetchall()
+            )
+            self._insert([(key, response, now, now)], [len(response.encode())])
+            self._cnx.commit()
+
+    def report(self) -> str:
+        """Describe the cache usage since it was opened"""
+        return (
+            f"Completion cache: {self.hits} hits, {self.misses} misses"
+            f" ({self.hit_rate:.0%} hit rate)"
+        )
+
+
+def completion_key(
+    model: str | None, messages: list, temperature: float, max_tokens: int | None
+) -> str:
+    """Hash everything that determines a completion into a cache key"""
+    request = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
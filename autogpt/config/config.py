@@ -35,7 +35,58 @@ class Config(metaclass=Singleton):
         self.browse_chunk_max_length = int(os.getenv("BROWSE_CHUNK_MAX_LENGTH", 8192))
 
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
+        # Extra API keys to spread the requests over, as (key, weight) pairs
+        self.openai_api_keys = parse_api_keys(os.getenv("OPENAI_API_KEYS", ""))
         self.temperature = float(os.getenv("TEMPERATURE", "1"))
+        # Directory the tokenizer encodings are read from, downloaded if missing,
+        # next to the package unless configured
+        self.set_tiktoken_cache_dir(
+            os.getenv(
+                "TIKTOKEN_CACHE_DIR",
+                os.path.join(os.path.dirname(__file__), "..", "tiktoken_cache"),
+            )
+        )
+        # Tokens of the agent's context kept for its reply, and the most its system
+        # prompt and relevant memories may use, the rest going to the history
+        self.context_response_tokens = int(os.getenv("CONTEXT_RESPONSE_TOKENS", 1000))
+        self.context_memory_tokens = int(os.getenv("CONTEXT_MEMORY_TOKENS", 2500))
+        # Maximum number of concurrent requests made by the async LLM client
+        self.llm_max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+        # Stream the agent's replies and act on their members as they complete
+        self.stream_completions = os.getenv("STREAM_COMPLETIONS", "False") == "True"
+        # Seconds before an LLM request is abandoned, 0 for the OpenAI default
+        self.llm_request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", 0))
+        # Routing of the calls between the fast and the smart model
+        self.model_router_max_error_rate = float(
+            os.getenv("MODEL_ROUTER_MAX_ERROR_RATE", 0.5)
+        )
+        self.model_router_latency_budget = float(
+            os.getenv("MODEL_ROUTER_LATENCY_BUDGET", 0)
+        )
+        self.model_router_fallback = (
+            os.getenv("MODEL_ROUTER_FALLBACK", "True") == "True"
+        )
+        self.model_router_log = os.getenv(
+            "MODEL_ROUTER_LOG", os.path.join("logs", "model_router.jsonl")
+        )
+        # JSON lines file of the LLM calls of the run, with their usage and cost
+        self.llm_ledger_file = os.getenv(
+            "LLM_LEDGER_FILE", os.path.join("logs", "llm_ledger.jsonl")
+        )
+        # Token and dollar budgets of the run and of each command, 0 for none
+        self.llm_budget_tokens = int(os.getenv("LLM_BUDGET_TOKENS", 0))
+        self.llm_budget_dollars = float(os.getenv("LLM_BUDGET_DOLLARS", 0))
+        self.llm_command_budget_tokens = int(os.getenv("LLM_COMMAND_BUDGET_TOKENS", 0))
+        self.llm_command_budget_dollars = float(
+            os.getenv("LLM_COMMAND_BUDGET_DOLLARS", 0)
+        )
+        self.llm_budget_degrade_at = float(os.getenv("LLM_BUDGET_DEGRADE_AT", 0.8))
+        self.llm_budget_summary_tokens = int(
+            os.getenv("LLM_BUDGET_SUMMARY_TOKENS", 300)
+        )
+        # "record" the LLM calls of the session to a file, or "replay" them
+        self.llm_recording = os.getenv("LLM_RECORDING", "")
+        self.llm_recording_file = os.getenv("LLM_RECORDING_FILE", "llm_recording.jsonl")
         self.use_azure = os.getenv("USE_AZURE") == "True"
         self.execute_local_commands = (
             os.getenv("EXECUTE_LOCAL_COMMANDS", "False") == "True"
@@ -46,6 +97,9 @@ class Config(metaclass=Singleton):
             openai.api_type = self.openai_api_type
             openai.api_base = self.openai_api_base
             openai.api_version = self.openai_api_version
+        elif os.getenv("OPENAI_API_BASE"):
+            # e.g. a local server such as autogpt.mock_openai_server
+            openai.api_base = os.getenv("OPENAI_API_BASE")
 
         self.elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY")
         self.elevenlabs_voice_1_id = os.getenv("ELEVENLABS_VOICE_1_ID")
@@ -104,31 +158,57 @@ class Config(metaclass=Singleton):
         # Note that indexes must be created on db 0 in redis, this is not configurable.
 
         self.memory_backend = os.getenv("MEMORY_BACKEND", "local")
+        # Search mode of the local memory: "flat" scores every memory, "ivf" only
+        # scores the LOCAL_MEMORY_NPROBE closest clusters of memories.
+        self.local_memory_index = os.getenv("LOCAL_MEMORY_INDEX", "flat")
+        self.local_memory_nprobe = int(os.getenv("LOCAL_MEMORY_NPROBE", 16))
+        # Storage precision of the local memory vectors: "float32", "float16" or
+        # "int8". Quantized searches re-rank the best k * LOCAL_MEMORY_RERANK
+        # candidates with a float32 copy of the vectors, 0 disables the copy.
+        self.local_memory_precision = os.getenv("LOCAL_MEMORY_PRECISION", "float32")
+        self.local_memory_rerank = int(os.getenv("LOCAL_MEMORY_RERANK", 4))
+        # Embedding provider: "openai" or "local", an offline feature hashing
+        # model whose dimension is set by EMBEDDING_DIM
+        self.embedding_provider = os.getenv("EMBEDDING_PROVIDER", "openai")
+        self.embedding_dim = int(os.getenv("EMBEDDING_DIM", 1536))
+        # Persistent cache of the embeddings, shared by every memory backend
+        self.embedding_cache = os.getenv("EMBEDDING_CACHE", "True") == "True"
+        self.embedding_cache_file = os.getenv(
+            "EMBEDDING_CACHE_FILE", "embedding_cache.sqlite3"
+        )
+        self.embedding_cache_max_mb = int(os.getenv("EMBEDDING_CACHE_MAX_MB", 512))
+        # Opt-in persistent cache of the completions requested with temperature 0
+        self.completion_cache = os.getenv("COMPLETION_CACHE", "False") == "True"
+        self.completion_cache_file = os.getenv(
+            "COMPLETION_CACHE_FILE", "completion_cache.sqlite3"
+        )
+        self.completion_cache_ttl = float(os.getenv("COMPLETION_CACHE_TTL", 604800))
+        self.completion_cache_max_mb = int(os.getenv("COMPLETION_CACHE_MAX_MB", 64))
         # Initialize the OpenAI API client
         openai.api_key = self.openai_api_key
 
-    def get_azure_deployment_id_for_model(self, model: str) -> str:
+    def get_azure_deployment_id_for_model(
+        self, model: str, model_map: dict | None = None
+    ) -> str:
         """
         Returns the relevant deployment id for the model specified.
 
         Parameters:
             model(str): The model to map to the deployment id.
+            model_map(dict): The deployment ids to pick from. DEFAULT: the
+              azure_model_map of the azure config
 
         Returns:
             The matching deployment id if found, otherwise an empty string.
         """
+        if model_map is None:
+            model_map = self.azure_model_to_deployment_id_map
         if model == self.fast_llm_model:
-            return self.azure_model_to_deployment_id_map[
-                "fast_llm_model_deployment_id"
-            ]  # type: ignore
+            return model_map["fast_llm_model_deployment_id"]  # type: ignore
         elif model == self.smart_llm_model:
-            return self.azure_model_to_deployment_id_map[
-                "smart_llm_model_deployment_id"
-            ]  # type: ignore
+            return model_map["smart_llm_model_deployment_id"]  # type: ignore
         elif model == "text-embedding-ada-002":
-            return self.azure_model_to_deployment_id_map[
-                "embedding_model_deployment_id"
-            ]  # type: ignore
+            return model_map["embedding_model_deployment_id"]  # type: ignore
         else:
             return ""
 
@@ -156,6 +236,9 @@ class Config(metaclass=Singleton):
             config_params.get("azure_api_version") or "2023-03-15-preview"
         )
         self.azure_model_to_deployment_id_map = config_params.get("azure_model_map", [])
+        # Extra deployments to spread the requests over, each with its own
+        # azure_api_base, azure_model_map and optionally azure_api_key and weight
+        self.azure_endpoints = config_params.get("azure_endpoints", [])
 
     def set_continuous_mode(self, value: bool) -> None:
         """Set the continuous mode value."""
@@ -181,6 +264,11 @@ class Config(metaclass=Singleton):
         """Set the fast token limit value."""
         self.fast_token_limit = value
 
+    def set_tiktoken_cache_dir(self, value: str) -> None:
+        """Set the tokenizer cache directory, where tiktoken also looks it up."""
+        self.tiktoken_cache_dir = os.path.abspath(value)
+        os.environ["TIKTOKEN_CACHE_DIR"] = self.tiktoken_cache_dir
+
     def set_smart_token_limit(self, value: int) -> None:
         """Set the smart token limit value."""
         self.smart_token_limit = value
@@ -229,10 +317,30 @@ class Config(metaclass=Singleton):
 def check_openai_api_key() -> None:
     """Check if the OpenAI API key is set in config.py or as an environment variable."""
     cfg = Config()
-    if not cfg.openai_api_key:
+    # A replayed session makes no API call
+    if not cfg.openai_api_key and cfg.llm_recording != "replay":
         print(
             Fore.RED
             + "Please set your OpenAI API key in .env or as an environment variable."
         )
         print("You can get your key from https://platform.openai.com/account/api-keys")
         exit(1)
+
+
+def parse_api_keys(value: str) -> list[tuple[str, int]]:
+    """Parse a comma separated list of API keys, each with an optional :weight
+
+    Parameters:
+        value(str): The list, e.g. "sk-key1,sk-key2:2"
+
+    Returns:
+        The (key, weight) pairs, with a weight of 1 when none is given.
+    """
+    keys = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        api_key, _, weight = item.partition(":")
+        keys.append((api_key, int(weight) if weight else 1))
+    return keys
@@ -0,0 +1,150 @@
+"""The packing of the prompt, the memories and the conversation in the context"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from autogpt import token_counter
+
+
+class ContextWindow:
+    """The longest suffix of a message history fitting in a token budget
+
+    The history only grows between two steps of the agent, so the token count of
+    each message is kept, along with where the suffix starts and its total. A
+    step then counts the messages added since the last one, and moves the start
+    of the suffix by as many messages as the budget changed, instead of walking
+    the whole history again. The counts and the suffix are kept for each model,
+    so a step sent to the other model does not walk the history again either.
+    """
+
+    def __init__(self, full_message_history: List[Dict[str, str]]) -> None:
+        """Initialize the window
+
+        Args:
+            full_message_history (list): The history of the conversation, only
+                ever appended to
+        """
+        self.full_message_history = full_message_history
+        self.model: Optional[str] = None
+        # The counts and the suffix of the other models
+        self._models: Dict[str, Tuple[List[int], int, int]] = {}
+        # The tokens of each message of the history counted so far
+        self.message_tokens: List[int] = []
+        # The suffix of the counted messages in the window, and its size
+        self.start = 0
+        self.tokens = 0
+
+    def fit(self, token_budget: int, model: str) -> List[Dict[str, str]]:
+        """Return the most recent messages fitting in a number of tokens
+
+        Args:
+            token_budget (int): The number of tokens the messages can use
+            model (str): The model whose tokens are counted
+
+        Returns:
+            list: The messages in the window, oldest first
+        """
+        history = self.full_message_history
+        if model != self.model:
+            self._switch(model)
+        if len(history) < len(self.message_tokens):
+            # The history was replaced, it is counted again
+            self._models.clear()
+            self.message_tokens, self.start, self.tokens = [], 0, 0
+
+        # Messages added since the last step enter at the end
+        for message in history[len(self.message_tokens) :]:
+            tokens = token_counter.count_message_tokens([message], model)
+            self.message_tokens.append(tokens)
+            self.tokens += tokens
+
+        # The oldest messages leave until the rest fits
+        while self.tokens > token_budget and self.start < len(self.message_tokens):
+            self.tokens -= self.message_tokens[self.start]
+            self.start += 1
+        # Or older messages come back if the budget grew
+        while (
+            self.start > 0
+            and self.tokens + self.message_tokens[self.start - 1] <= token_budget
+        ):
+            self.start -= 1
+            self.tokens += self.message_tokens[self.start]
+
+        return history[self.start :]
+
+    def _switch(self, model: str) -> None:
+        if self.model is not None:
+            self._models[self.model] = (self.message_tokens, self.start, self.tokens)
+        self.model = model
+        self.message_tokens, self.start, self.tokens = self._models.pop(
+            model, ([], 0, 0)
+        )
+
+
+class ContextPacker:
+    """Fill a token budget with messages, counting each of them once
+
+    The messages every request needs are added first, then the candidates of
+    each part of the context are selected by score within the tokens allocated to
+    that part, in a single pass over them.
+    """
+
+    def __init__(self, token_budget: int, model: str) -> None:
+        """Initialize the packer
+
+        Args:
+            token_budget (int): The number of tokens of the whole context
+            model (str): The model whose tokens are counted
+        """
+        self.token_budget = token_budget
+        self.model = model
+        self.tokens = 0
+
+    @property
+    def remaining(self) -> int:
+        """The number of tokens left in the budget"""
+        return max(self.token_budget - self.tokens, 0)
+
+    def add(self, message: Dict[str, str]) -> Dict[str, str]:
+        """Count a message the context cannot do without"""
+        self.tokens += token_counter.count_message_tokens([message], self.model)
+        return message
+
+    def select(
+        self,
+        texts: Sequence[str],
+        allocation: int,
+        scores: Optional[Sequence[float]] = None,
+    ) -> List[str]:
+        """Select the best texts fitting in an allocation
+
+        Args:
+            texts (Sequence[str]): The candidates, rendered as a list in one
+                message already added
+            allocation (int): The number of tokens the texts can use, never
+                more than the budget left
+            scores (Sequence[float], optional): How valuable each text is.
+                Defaults to None, the first texts being the most valuable.
+
+        Returns:
+            list[str]: The texts selected, in their original order
+        """
+        if scores is None:
+            scores = [-rank for rank in range(len(texts))]
+        allocation = min(allocation, self.remaining)
+        used = 0
+        selected = []
+        for i in sorted(range(len(texts)), key=lambda i: scores[i], reverse=True):
+            # The text is quoted in the list, and separated from the next
+            tokens = token_counter.count_string_tokens(repr(texts[i]), self.model) + 1
+            if used + tokens <= allocation:
+                used += tokens
+                selected.append(i)
+        self.tokens += used
+        return [texts[i] for i in sorted(selected)]
+
+    def fit_history(self, context_window: ContextWindow) -> List[Dict[str, str]]:
+        """Select the most recent messages of the history fitting in the rest"""
+        messages = context_window.fit(self.remaining, self.model)
+        self.tokens += context_window.tokens
+        return messages
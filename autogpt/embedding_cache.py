@@ -0,0 +1,94 @@
+"""Persistent cache of embeddings, keyed by a hash of the model and the text.
+
+Embeddings are deterministic, so the same text never needs to be sent twice.
+The cache is a SQLite file holding one float32 blob per entry. Every lookup
+refreshes the entry's last use, and the least recently used entries are evicted
+once the blobs exceed the size cap.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from autogpt.sqlite_cache import SQLiteLRUCache
+
+
+class EmbeddingCache(SQLiteLRUCache):
+    """Disk-backed LRU cache of embeddings"""
+
+    table = "embeddings"
+    schema = (
+        "CREATE TABLE IF NOT EXISTS embeddings ("
+        " key TEXT PRIMARY KEY,"
+        " embedding BLOB NOT NULL,"
+        " last_used REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)",
+    )
+    size_expression = "LENGTH(embedding)"
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[list]]:
+        """Look up the embeddings of several texts
+
+        Args:
+            model (str): The embedding model
+            texts (Sequence[str]): The texts to look up
+
+        Returns:
+            List[Optional[list]]: The embedding of each text, or None on a miss
+        """
+        keys = [_key(model, text) for text in texts]
+        with self._lock:
+            found = {}
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                found.update(
+                    self._cnx.execute(
+                        "SELECT key, embedding FROM embeddings WHERE key IN"
+                        f" ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+            if found:
+                self._touch(found, time.time())
+                self._cnx.commit()
+            self.hits += sum(key in found for key in keys)
+            self.misses += sum(key not in found for key in keys)
+        return [
+            np.frombuffer(found[key], dtype=np.float32).tolist()
+            if key in found
+            else None
+            for key in keys
+        ]
+
+    def put_many(
+        self, model: str, texts: Sequence[str], embeddings: Sequence[list]
+    ) -> None:
+        """Store the embeddings of several texts, evicting old entries if needed
+
+        Args:
+            model (str): The embedding model
+            texts (Sequence[str]): The embedded texts
+            embeddings (Sequence[list]): The embedding of each text
+        """
+        now = time.time()
+        rows = [
+            (_key(model, text), np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._insert(rows, [len(row[1]) for row in rows])
+            self._cnx.commit()
+
+    def report(self) -> str:
+        """Describe the cache usage since it was opened"""
+        return (
+            f"Embedding cache: {self.hits} hits, {self.misses} misses"
+            f" ({self.hit_rate:.0%} hit rate)"
+        )
+
+
+def _key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
@@ -0,0 +1,478 @@
+"""Embedding client shared by every memory backend.
+
+All embeddings go through ``embed`` and ``embed_many``, which:
+
+* answer from the persistent embedding cache when they can
+* send the remaining texts in as few requests as the request limits allow
+* spread the OpenAI requests over the API endpoint pool, waiting for the rate
+  limits of each endpoint
+* retry rate limits and server errors with jittered exponential backoff, or as
+  long as the server asked, failing over to another endpoint when there is one
+* record the latency of every request
+
+The requests themselves are made by the ``EmbeddingBackend`` selected by
+``EMBEDDING_PROVIDER``:
+
+* ``openai``: text-embedding-ada-002, 1536 dimensions. The OpenAI SDK keeps a
+  pooled keep-alive session per thread.
+* ``local``: feature hashing of the words of the text, ``EMBEDDING_DIM``
+  dimensions. It runs offline on CPU and is meant for benchmarks, tests and
+  air-gapped runs. Texts sharing words get similar vectors, but it has no notion
+  of meaning.
+
+With ``LLM_RECORDING`` set, the OpenAI embeddings are recorded to or replayed
+from the session recording.
+"""
+from __future__ import annotations
+
+import abc
+import dataclasses
+import random
+import re
+import time
+import zlib
+from collections import Counter
+from typing import Callable, Iterator, List
+
+import numpy as np
+import openai
+from colorama import Fore
+from openai.error import APIError, RateLimitError, ServiceUnavailableError, Timeout
+
+from autogpt.api_endpoints import (
+    Endpoint,
+    EndpointPool,
+    capture_response_headers,
+    get_endpoint_pool,
+    response_headers,
+)
+from autogpt.config import Config
+from autogpt.embedding_cache import EmbeddingCache
+from autogpt.llm_recording import LLMRecording, get_recording
+from autogpt.logs import logger
+from autogpt.rate_limiter import estimate_tokens
+from autogpt.single_flight import SingleFlight
+from autogpt.telemetry import LLMCall, call_site, current_command, get_ledger
+from autogpt.token_counter import count_string_tokens
+
+CFG = Config()
+
+# Limits of a single embedding request. An input can hold up to 8191 tokens and
+# a request is capped at the size of eight such inputs.
+EMBEDDING_BATCH_MAX_TOKENS = 8191 * 8
+EMBEDDING_BATCH_MAX_INPUTS = 2048
+
+_client: EmbeddingClient | None = None
+
+
+class EmbeddingBackend(abc.ABC):
+    """A model that turns texts into embeddings"""
+
+    model: str
+    dimension: int
+    # Limits of a single request, None when there is no limit
+    max_batch_tokens: int | None = None
+    max_batch_inputs: int | None = None
+    # Whether embeddings are worth keeping in the persistent cache
+    cacheable = True
+    # The API endpoints serving the model, None when there is no API
+    endpoints: EndpointPool | None = None
+
+    @abc.abstractmethod
+    def create(
+        self, texts: List[str], endpoint: Endpoint | None = None
+    ) -> List[List[float]]:
+        """Embed a batch of texts with a single request
+
+        Args:
+            texts (List[str]): The texts to embed
+            endpoint (Endpoint, optional): The endpoint to send the request to,
+                picked from the endpoints of the backend. Defaults to None.
+
+        Returns:
+            List[List[float]]: The embedding of each text, in order
+        """
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Embeddings from the OpenAI or Azure OpenAI API"""
+
+    model = "text-embedding-ada-002"
+    dimension = 1536
+    max_batch_tokens = EMBEDDING_BATCH_MAX_TOKENS
+    max_batch_inputs = EMBEDDING_BATCH_MAX_INPUTS
+
+    def __init__(self, endpoints: EndpointPool | None = None) -> None:
+        """Initialize the backend
+
+        Args:
+            endpoints (EndpointPool, optional): The endpoints to send the requests
+                to. Defaults to the shared pool.
+        """
+        self._endpoints = endpoints
+
+    @property
+    def endpoints(self) -> EndpointPool:
+        return self._endpoints or get_endpoint_pool()
+
+    def create(
+        self, texts: List[str], endpoint: Endpoint | None = None
+    ) -> List[List[float]]:
+        if endpoint is None:
+            endpoint, _ = self.endpoints.acquire(self.model, estimate_tokens(texts))
+        capture_response_headers()
+        response = openai.Embedding.create(
+            input=texts, model=self.model, **endpoint.request_kwargs(self.model)
+        )
+        # The API does not guarantee that the embeddings come back in order
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """Offline embeddings built by hashing the words and word pairs of a text
+
+    Each feature is hashed to a dimension and a sign and weighted by the log of
+    its count, and the vector is normalized to unit length.
+    """
+
+    cacheable = False
+
+    def __init__(self, dimension: int = 1536) -> None:
+        """Initialize the backend
+
+        Args:
+            dimension (int): The dimension of the embeddings
+        """
+        self.dimension = dimension
+        self.model = f"hashing-{dimension}"
+
+    def create(
+        self, texts: List[str], endpoint: Endpoint | None = None
+    ) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def _embed(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.lower())
+        features = Counter(words)
+        features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        if not features:
+            return vector
+        hashes = np.array(
+            [zlib.crc32(feature.encode("utf-8")) for feature in features],
+            dtype=np.uint32,
+        )
+        weights = 1 + np.log(np.fromiter(features.values(), dtype=np.float32))
+        # The top bit of the hash picks the sign, so collisions tend to cancel
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, hashes % self.dimension, signs * weights)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class RecordingEmbeddingBackend(EmbeddingBackend):
+    """Record the embeddings of another backend, or replay them without it"""
+
+    def __init__(self, backend: EmbeddingBackend, recording: LLMRecording) -> None:
+        """Initialize the backend
+
+        Args:
+            backend (EmbeddingBackend): The backend making the requests
+            recording (LLMRecording): The recording of the session
+        """
+        self.backend = backend
+        self.recording = recording
+        self.model = backend.model
+        self.dimension = backend.dimension
+        self.max_batch_tokens = backend.max_batch_tokens
+        self.max_batch_inputs = backend.max_batch_inputs
+        self.cacheable = backend.cacheable
+
+    @property
+    def endpoints(self) -> EndpointPool | None:
+        # Replayed embeddings need no rate limiting
+        return None if self.recording.replaying else self.backend.endpoints
+
+    def create(
+        self, texts: List[str], endpoint: Endpoint | None = None
+    ) -> List[List[float]]:
+        if self.recording.replaying:
+            return self.recording.embeddings(self.model, texts)
+        embeddings = self.backend.create(texts, endpoint)
+        self.recording.record_embeddings(self.model, texts, embeddings)
+        return embeddings
+
+
+@dataclasses.dataclass
+class EmbeddingMetrics:
+    """Counters of the requests made by an embedding client"""
+
+    texts: int = 0
+    retries: int = 0
+    latencies: List[float] = dataclasses.field(default_factory=list)
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    def report(self) -> str:
+        """Describe the requests made so far"""
+        if not self.latencies:
+            return "Embedding requests: none"
+        latencies_ms = np.array(self.latencies) * 1000
+        return (
+            f"Embedding requests: {self.requests} for {self.texts} texts,"
+            f" {self.retries} retries, latency p50"
+            f" {np.percentile(latencies_ms, 50):.0f} ms,"
+            f" max {latencies_ms.max():.0f} ms"
+        )
+
+
+class EmbeddingClient:
+    """Cached, batched and retried access to an embedding backend"""
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        cache: EmbeddingCache | None = None,
+        max_retries: int = 10,
+        backoff_base: float = 4.0,
+        backoff_max: float = 60.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Initialize the client
+
+        Args:
+            backend (EmbeddingBackend): The backend making the requests
+            cache (EmbeddingCache, optional): The cache consulted before any
+                request. Defaults to None.
+            max_retries (int): The number of attempts made for each request
+            backoff_base (float): The backoff of the first retry, in seconds. It
+                doubles on every retry, up to backoff_max.
+            backoff_max (float): The longest backoff, in seconds
+            sleep (Callable[[float], None]): The function waiting between retries
+        """
+        self.backend = backend
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.metrics = EmbeddingMetrics()
+        self.flights = SingleFlight("embedding batches")
+
+    def embed(self, text: str) -> List[float]:
+        """Embed a single text"""
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts, requesting only those missing from the cache
+
+        Args:
+            texts (List[str]): The texts to embed
+
+        Returns:
+            List[List[float]]: The embedding of each text, in order
+        """
+        model = self.backend.model
+        site = call_site(__name__, "autogpt.llm_utils")
+        if self.cache is None:
+            cached = [None] * len(texts)
+        else:
+            cached = self.cache.get_many(model, texts)
+        missing = list(dict.fromkeys(t for t, e in zip(texts, cached) if e is None))
+
+        created = []
+        for batch in batch_embedding_inputs(
+            missing, self.backend.max_batch_tokens, self.backend.max_batch_inputs
+        ):
+            # Threads embedding the same batch at the same time share a request
+            created.extend(
+                self.flights.do(
+                    (model, tuple(batch)), lambda: self._request(batch, site)
+                )
+            )
+        if self.cache is not None and missing:
+            self.cache.put_many(model, missing, created)
+            if CFG.debug_mode:
+                logger.debug(self.cache.report())
+
+        created_by_text = dict(zip(missing, created))
+        return [
+            embedding if embedding is not None else created_by_text[text]
+            for text, embedding in zip(texts, cached)
+        ]
+
+    def report(self) -> str:
+        """Describe the cache usage and the requests made so far"""
+        reports = [self.metrics.report(), self.flights.report()]
+        if self.cache is not None:
+            reports.insert(0, self.cache.report())
+        return "\n".join(reports)
+
+    def _request(self, texts: List[str], site: str) -> List[List[float]]:
+        model = self.backend.model
+        endpoints = self.backend.endpoints
+        started = time.perf_counter()
+        for attempt in range(self.max_retries):
+            retry_after = None
+            endpoint = None
+            if endpoints is not None:
+                endpoint, delay = endpoints.acquire(model, estimate_tokens(texts))
+                if delay:
+                    self.sleep(delay)
+            start = time.perf_counter()
+            try:
+                embeddings = self.backend.create(texts, endpoint)
+            except (RateLimitError, ServiceUnavailableError, Timeout, APIError) as e:
+                retryable = not isinstance(e, APIError) or e.http_status in (
+                    None,
+                    500,
+                    502,
+                    503,
+                )
+                if endpoint is not None and isinstance(e, RateLimitError):
+                    retry_after = endpoints.throttled(endpoint, model, e.headers)
+                if not retryable or attempt == self.max_retries - 1:
+                    raise
+            else:
+                if endpoint is not None:
+                    endpoints.succeeded(endpoint, model, response_headers())
+                latency = time.perf_counter() - start
+                self.metrics.latencies.append(latency)
+                self.metrics.texts += len(texts)
+                if CFG.debug_mode:
+                    logger.debug(
+                        f"Embedded {len(texts)} texts in {latency * 1000:.0f} ms"
+                    )
+                if endpoint is not None:
+                    get_ledger().record(
+                        LLMCall(
+                            "embedding",
+                            model,
+                            site,
+                            current_command(),
+                            estimate_tokens(texts),
+                            0,
+                            time.perf_counter() - started,
+                            attempt,
+                            estimated=True,
+                        )
+                    )
+                return embeddings
+
+            # Full jitter keeps clients that failed together from retrying
+            # together
+            backoff = random.uniform(
+                0, min(self.backoff_max, self.backoff_base * 2**attempt)
+            )
+            if retry_after is not None:
+                backoff = retry_after
+            self.metrics.retries += 1
+            if endpoint is not None:
+                endpoints.failed(endpoint, backoff)
+                if endpoints.healthy(model):
+                    # Fail over to another endpoint right away
+                    continue
+            if CFG.debug_mode:
+                print(
+                    Fore.RED + "Error: ",
+                    f"Embedding request failed. Waiting {backoff:.1f} seconds..."
+                    + Fore.RESET,
+                )
+            self.sleep(backoff)
+
+
+def batch_embedding_inputs(
+    texts: List[str],
+    max_tokens: int | None = EMBEDDING_BATCH_MAX_TOKENS,
+    max_inputs: int | None = EMBEDDING_BATCH_MAX_INPUTS,
+) -> Iterator[List[str]]:
+    """Group texts into consecutive batches that fit in one embedding request
+
+    A text longer than max_tokens on its own is sent alone.
+
+    Args:
+        texts (List[str]): The texts to embed
+        max_tokens (int, optional): The maximum number of tokens in a batch, or
+            None for no limit
+        max_inputs (int, optional): The maximum number of texts in a batch, or
+            None for no limit
+
+    Yields:
+        List[str]: The next batch of texts
+    """
+    batch: List[str] = []
+    batch_tokens = 0
+    for text in texts:
+        tokens = 0
+        if max_tokens is not None:
+            tokens = count_string_tokens(text, "text-embedding-ada-002")
+        if batch and (
+            (max_tokens is not None and batch_tokens + tokens > max_tokens)
+            or len(batch) == max_inputs
+        ):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def create_embedding_backend(cfg: Config) -> EmbeddingBackend:
+    """Create the embedding backend selected by the config
+
+    Args:
+        cfg (Config): The config
+
+    Returns:
+        EmbeddingBackend: The backend
+    """
+    if cfg.embedding_provider == "local":
+        return HashingEmbeddingBackend(cfg.embedding_dim)
+    if cfg.embedding_provider == "openai":
+        recording = get_recording()
+        if recording is not None:
+            return RecordingEmbeddingBackend(OpenAIEmbeddingBackend(), recording)
+        return OpenAIEmbeddingBackend()
+    raise ValueError(
+        f"Unknown embedding provider '{cfg.embedding_provider}',"
+        " expected 'openai' or 'local'."
+    )
+
+
+def get_embedding_client() -> EmbeddingClient:
+    """Return the embedding client configured for this run"""
+    global _client
+    if _client is None:
+        backend = create_embedding_backend(CFG)
+        cache = None
+        if CFG.embedding_cache and backend.cacheable:
+            cache = EmbeddingCache(
+                CFG.embedding_cache_file, CFG.embedding_cache_max_mb * 1024 * 1024
+            )
+        _client = EmbeddingClient(backend, cache)
+    return _client
+
+
+def embedding_dimension() -> int:
+    """The dimension of the embeddings of the configured backend"""
+    return get_embedding_client().backend.dimension
+
+
+def embedding_model() -> str:
+    """The name of the embedding model of the configured backend"""
+    return get_embedding_client().backend.model
+
+
+def embed(text: str) -> List[float]:
+    """Embed a single text with the configured embedding client"""
+    return get_embedding_client().embed(text)
+
+
+def embed_many(texts: List[str]) -> List[List[float]]:
+    """Embed several texts with the configured embedding client"""
+    return get_embedding_client().embed_many(texts)
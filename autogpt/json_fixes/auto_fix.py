@@ -2,7 +2,7 @@
 import json
 
 from autogpt.config import Config
-from autogpt.llm_utils import call_ai_function
+from autogpt.llm_utils import call_ai_function, route_model
 from autogpt.logs import logger
 
 CFG = Config()
@@ -34,7 +34,10 @@ def fix_json(json_string: str, schema: str) -> str:
     if not json_string.startswith("`"):
         json_string = "```json\n" + json_string + "\n```"
     result_string = call_ai_function(
-        function_string, args, description_string, model=CFG.fast_llm_model
+        function_string,
+        args,
+        description_string,
+        model=route_model("json_fix", CFG.fast_llm_model, [json_string, schema]),
     )
     logger.debug("------------ JSON FIX ATTEMPT ---------------")
     logger.debug(f"Original JSON: {json_string}")
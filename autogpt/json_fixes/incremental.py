@@ -0,0 +1,105 @@
+"""Incremental parsing of a JSON object that arrives in pieces.
+
+The agent replies with one JSON object following ``PromptGenerator.response_format``.
+When the reply is streamed, the parser below hands out each top-level member,
+such as ``thoughts`` or ``command``, as soon as its value is complete, so the
+agent can show and use it before the rest of the reply has arrived.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Tuple
+
+
+class IncrementalJSONParser:
+    """Pick the top-level members of a JSON object out of a stream of text
+
+    Text before the opening brace is skipped. A member whose value is not valid
+    JSON on its own is left out, the complete reply can still be repaired by the
+    usual fixes once it has arrived.
+
+    Attributes:
+        members: The complete members found so far
+        done: Whether the closing brace of the object has been read
+    """
+
+    def __init__(self) -> None:
+        self.members: Dict[str, Any] = {}
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key_start: int | None = None
+        self._key: str | None = None
+        self._value_start: int | None = None
+
+    @property
+    def text(self) -> str:
+        """The text fed so far"""
+        return self._text
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Read the next piece of the text
+
+        Args:
+            chunk (str): The text following what was fed before
+
+        Returns:
+            List[Tuple[str, Any]]: The members completed by this piece, in order
+        """
+        self._text += chunk
+        completed = []
+        text = self._text
+        while self._pos < len(text) and not self.done:
+            char = text[self._pos]
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = self._parse(text[self._key_start : self._pos + 1])
+                        self._key_start = None
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start is None:
+                    self._key_start = self._pos
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_member(completed)
+                    self.done = True
+            elif self._depth == 1 and char == ":":
+                self._value_start = self._pos + 1
+            elif self._depth == 1 and char == ",":
+                self._complete_member(completed)
+            self._pos += 1
+        return completed
+
+    def _complete_member(self, completed: List[Tuple[str, Any]]) -> None:
+        if self._value_start is not None and isinstance(self._key, str):
+            value = self._parse(self._text[self._value_start : self._pos])
+            if value is not _INVALID:
+                self.members[self._key] = value
+                completed.append((self._key, value))
+        self._key = None
+        self._value_start = None
+
+    @staticmethod
+    def _parse(text: str) -> Any:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return _INVALID
+
+
+_INVALID = object()
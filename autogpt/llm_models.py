@@ -0,0 +1,81 @@
+"""What Auto-GPT knows of each OpenAI model.
+
+The token counts, the context sizes and the costs of the LLM calls are all read
+from this table, a model matching the entry with the longest prefix of its name,
+e.g. ``gpt-4-0314`` matching ``gpt-4``. Unknown models are counted with
+``cl100k_base`` and the overheads of the gpt-4 messages, their context size
+is the configured token limit and they are assumed free.
+"""
+from __future__ import annotations
+
+import dataclasses
+from typing import Dict, Optional
+
+
+@dataclasses.dataclass(frozen=True)
+class ModelInfo:
+    """The tokenization, context size and prices of a model"""
+
+    name: str
+    encoding: str = "cl100k_base"
+    # Tokens of the chat markup around each message and around a name
+    tokens_per_message: int = 3
+    tokens_per_name: int = 1
+    # The size of the prompt and the completion together, None if unknown
+    context_window: Optional[int] = None
+    # US dollars per 1000 prompt and completion tokens
+    prompt_price: float = 0.0
+    completion_price: float = 0.0
+
+
+MODELS: Dict[str, ModelInfo] = {
+    info.name: info
+    for info in (
+        # Every message follows <|start|>{role/name}\n{content}<|end|>\n, and
+        # if there's a name, the role is omitted
+        ModelInfo("gpt-3.5-turbo", "cl100k_base", 4, -1, 4096, 0.002, 0.002),
+        ModelInfo("gpt-4", "cl100k_base", 3, 1, 8192, 0.03, 0.06),
+        ModelInfo("gpt-4-32k", "cl100k_base", 3, 1, 32768, 0.06, 0.12),
+        ModelInfo("text-embedding-ada-002", "cl100k_base", 0, 0, 8191, 0.0004, 0.0),
+    )
+}
+
+DEFAULT_MODEL = ModelInfo("default")
+
+
+def get_model_info(model: str | None) -> ModelInfo:
+    """Return what is known of a model, the defaults if nothing
+
+    Args:
+        model (str): The name of the model
+
+    Returns:
+        ModelInfo: The entry with the longest prefix of the name
+    """
+    if model is None:
+        return DEFAULT_MODEL
+    matches = [name for name in MODELS if model.startswith(name)]
+    if not matches:
+        return DEFAULT_MODEL
+    return MODELS[max(matches, key=len)]
+
+
+def is_known_model(model: str | None) -> bool:
+    """Whether a model has an entry in the table"""
+    return get_model_info(model) is not DEFAULT_MODEL
+
+
+def token_limit(model: str | None, configured: float = float("inf")) -> float:
+    """The number of tokens a call to a model can use
+
+    Args:
+        model (str): The name of the model
+        configured (float): The limit set for it, e.g. FAST_TOKEN_LIMIT
+
+    Returns:
+        float: The configured limit, never more than the context of the model
+    """
+    context_window = get_model_info(model).context_window
+    if context_window is None:
+        return configured
+    return min(configured, context_window)
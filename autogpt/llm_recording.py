@@ -0,0 +1,156 @@
+"""Recording and replay of the LLM calls of a session.
+
+With ``LLM_RECORDING=record``, every chat completion and embedding the session
+gets from the API is appended to ``LLM_RECORDING_FILE``. With
+``LLM_RECORDING=replay``, they are answered from that file instead, without any
+network access, so a recorded run can be repeated deterministically and offline,
+e.g. to measure the overhead of the agent loop. ``autogpt.mock_openai_server``
+serves the same file over HTTP.
+
+Chat completions are matched on their model, messages, temperature and maximum
+number of tokens, leaving out the current time the agent is told on every step.
+A request made several times gets the recorded replies in order, the last one
+repeating. Embeddings are matched on their model and text,
+however they are batched.
+"""
+from __future__ import annotations
+
+import collections
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from autogpt.completion_cache import completion_key
+from autogpt.config import Config
+
+# The start of the message telling the agent the current time
+CURRENT_TIME_PREFIX = "The current time and date is "
+
+_recording: LLMRecording | None = None
+
+
+class ReplayMissError(LookupError):
+    """A request that is not in the recording being replayed"""
+
+
+class LLMRecording:
+    """A JSON lines file of the LLM calls of a session"""
+
+    def __init__(self, filename: str, mode: str) -> None:
+        """Open the recording
+
+        Args:
+            filename (str): The path of the JSON lines file
+            mode (str): "record" to append the calls to the file, "replay" to
+                answer them from it
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown LLM recording mode '{mode}'")
+        self.filename = filename
+        self.mode = mode
+        self._completions: Dict[str, List[str]] = {}
+        self._served: Dict[str, int] = collections.Counter()
+        self._embeddings: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+        if self.replaying:
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def completion(self, key: str) -> str:
+        """Replay the next recorded reply of a chat completion
+
+        Args:
+            key (str): The recording_key of the request
+
+        Returns:
+            str: The reply
+        """
+        with self._lock:
+            replies = self._completions.get(key)
+            if not replies:
+                raise ReplayMissError(
+                    f"No chat completion with key {key} in {self.filename}"
+                )
+            served = self._served[key]
+            self._served[key] += 1
+            return replies[min(served, len(replies) - 1)]
+
+    def record_completion(self, key: str, model: str | None, content: str) -> None:
+        """Append the reply of a chat completion to the recording"""
+        self._append(
+            {"type": "chat_completion", "key": key, "model": model, "content": content}
+        )
+
+    def embeddings(self, model: str, texts: List[str]) -> List[List[float]]:
+        """Replay the recorded embeddings of some texts"""
+        try:
+            return [self._embeddings[(model, text)] for text in texts]
+        except KeyError as e:
+            raise ReplayMissError(
+                f"No {model} embedding of {e.args[0][1][:50]!r} in {self.filename}"
+            ) from None
+
+    def record_embeddings(
+        self, model: str, texts: List[str], embeddings: List[List[float]]
+    ) -> None:
+        """Append the embeddings of some texts to the recording"""
+        for text, embedding in zip(texts, embeddings):
+            self._append(
+                {
+                    "type": "embedding",
+                    "model": model,
+                    "text": text,
+                    "embedding": embedding,
+                }
+            )
+
+    def _append(self, entry: dict) -> None:
+        with self._lock:
+            with open(self.filename, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["type"] == "chat_completion":
+                    self._completions.setdefault(entry["key"], []).append(
+                        entry["content"]
+                    )
+                elif entry["type"] == "embedding":
+                    self._embeddings[(entry["model"], entry["text"])] = entry[
+                        "embedding"
+                    ]
+
+
+def recording_key(
+    model: str | None, messages: list, temperature: float, max_tokens: int | None
+) -> str:
+    """The completion_key of a request, whatever the current time it tells"""
+    messages = [
+        {**message, "content": CURRENT_TIME_PREFIX}
+        if message.get("role") == "system"
+        and message.get("content", "").startswith(CURRENT_TIME_PREFIX)
+        else message
+        for message in messages
+    ]
+    return completion_key(model, messages, temperature, max_tokens)
+
+
+def get_recording() -> LLMRecording | None:
+    """Return the recording of the LLM calls, or None if there is none"""
+    global _recording
+    cfg = Config()
+    if not cfg.llm_recording:
+        return None
+    if _recording is None:
+        _recording = LLMRecording(cfg.llm_recording_file, cfg.llm_recording)
+    return _recording
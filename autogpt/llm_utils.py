@@ -1,17 +1,56 @@
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import contextvars
 import time
+import weakref
 from ast import List
+from typing import Awaitable, Callable, Iterable, TypeVar
 
+import aiohttp
 import openai
+import requests
 from colorama import Fore, Style
-from openai.error import APIError, RateLimitError
+from openai.error import APIError, RateLimitError, Timeout
 
+from autogpt.api_endpoints import (
+    Endpoint,
+    capture_response_headers,
+    close_response,
+    get_endpoint_pool,
+    response_headers,
+    response_headers_trace,
+)
+from autogpt.budget import get_budget
+from autogpt.completion_cache import CompletionCache, completion_key
 from autogpt.config import Config
+from autogpt.embeddings import embed, embed_many
+from autogpt.llm_recording import get_recording, recording_key
 from autogpt.logs import logger
+from autogpt.model_router import get_model_router
+from autogpt.rate_limiter import AdaptiveSemaphore, estimate_tokens, get_rate_limiter
+from autogpt.single_flight import CoalescingMetrics, SingleFlight
+from autogpt.telemetry import LLMCall, call_site, current_command, get_ledger
 
 CFG = Config()
 
+T = TypeVar("T")
+
+# The longest wait between two attempts when the server did not say how long
+MAX_BACKOFF = 60
+
+_semaphores: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, AdaptiveSemaphore
+] = weakref.WeakKeyDictionary()
+# The function that asked for the completion being made, for the ledger
+_call_site: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "call_site", default="unknown"
+)
+_completion_cache: CompletionCache | None = None
+# Identical requests in flight at the same time share one call
+_chat_completion_flights = SingleFlight("chat completions")
+
 openai.api_key = CFG.openai_api_key
 
 
@@ -27,13 +66,12 @@ def call_ai_function(
         function (str): The function to call
         args (list): The arguments to pass to the function
         description (str): The description of the function
-        model (str, optional): The model to use. Defaults to None.
+        model (str, optional): The model to use. Defaults to None, letting the
+            router choose, preferably the smart model.
 
     Returns:
         str: The response from the function
     """
-    if model is None:
-        model = CFG.smart_llm_model
     # For each arg, if any are None, convert to "None":
     args = [str(arg) if arg is not None else "None" for arg in args]
     # parse args to comma separated string
@@ -46,10 +84,39 @@ def call_ai_function(
         },
         {"role": "user", "content": args},
     ]
+    if model is None:
+        model = route_model(
+            "ai_function",
+            CFG.smart_llm_model,
+            (message["content"] for message in messages),
+        )
 
     return create_chat_completion(model=model, messages=messages, temperature=0)
 
 
+def route_model(
+    call_site: str, preferred: str, texts: Iterable[str] | int, max_tokens: int = 0
+) -> str:
+    """Choose the model of a call between the fast and the smart model
+
+    Args:
+        call_site (str): What the call is for, in the routing log
+        preferred (str): The model the call site would use
+        texts (Iterable[str] | int): The texts of the prompt, or its number of
+            tokens when the call site counted them already
+        max_tokens (int, optional): The number of tokens kept for the completion.
+            Defaults to 0.
+
+    Returns:
+        str: The model to use
+    """
+    prompt_tokens = texts if isinstance(texts, int) else estimate_tokens(texts)
+    # Past most of its budget, a call prefers the cheaper model
+    return get_model_router().route(
+        call_site, get_budget().model(preferred), prompt_tokens, max_tokens
+    )
+
+
 # Overly simple abstraction until we create something better
 # simple retry mechanism when getting a rate error or a bad gateway
 def create_chat_completion(
@@ -57,116 +124,508 @@ def create_chat_completion(
     model: str | None = None,
     temperature: float = CFG.temperature,
     max_tokens: int | None = None,
+    stream: bool = False,
+    on_chunk: Callable[[str], bool | None] | None = None,
 ) -> str:
     """Create a chat completion using the OpenAI API
 
+    Identical requests made while one is in flight, e.g. by other threads, wait
+    for its reply instead of sending their own, even when sampled. With
+    LLM_RECORDING set, the replies are recorded or replayed. Once the budget of
+    the run or of the command is spent, BudgetExceededError is raised instead of
+    calling the API.
+
+    When streaming, the response is read as it is generated and every piece of
+    it is passed to on_chunk. Returning True from on_chunk stops reading, once the
+    caller has all it needs. Errors are only retried until the first piece
+    arrives.
+
     Args:
         messages (list[dict[str, str]]): The messages to send to the chat completion
         model (str, optional): The model to use. Defaults to None.
         temperature (float, optional): The temperature to use. Defaults to 0.9.
         max_tokens (int, optional): The max tokens to use. Defaults to None.
+        stream (bool, optional): Whether to stream the response. Defaults to False.
+        on_chunk (Callable[[str], bool | None], optional): The function receiving
+            the pieces of a streamed response. Defaults to None.
 
     Returns:
         str: The response from the chat completion
     """
-    response = None
-    num_retries = 10
-    warned_user = False
-    if CFG.debug_mode:
-        print(
-            Fore.GREEN
-            + f"Creating chat completion with model {model}, temperature {temperature},"
-            f" max_tokens {max_tokens}" + Fore.RESET
+    _call_site.set(call_site(__name__))
+    recording = get_recording()
+    if recording is None:
+        return _create_chat_completion(
+            messages, model, temperature, max_tokens, stream, on_chunk
         )
-    for attempt in range(num_retries):
-        backoff = 2 ** (attempt + 2)
+    key = recording_key(model, messages, temperature, max_tokens)
+    if recording.replaying:
+        content = recording.completion(key)
+        if stream and on_chunk is not None:
+            on_chunk(content)
+        return content
+    content = _create_chat_completion(
+        messages, model, temperature, max_tokens, stream, on_chunk
+    )
+    recording.record_completion(key, model, content)
+    return content
+
+
+async def acreate_chat_completion(
+    messages: list,  # type: ignore
+    model: str | None = None,
+    temperature: float = CFG.temperature,
+    max_tokens: int | None = None,
+) -> str:
+    """Create a chat completion using the OpenAI API without blocking the event loop
+
+    At most LLM_MAX_CONCURRENCY requests run at the same time on an event loop,
+    fewer after requests were throttled, and the other calls wait for a slot.
+    Identical requests made while one is in flight on the loop wait for its
+    reply instead of sending their own, even when sampled. Cancelling the
+    awaiting task aborts the request or the backoff in progress, unless other
+    tasks wait for the same reply. With LLM_RECORDING set, the replies are
+    recorded or replayed. Once the budget of the run or of the command is spent,
+    BudgetExceededError is raised instead of calling the API.
+
+    Args:
+        messages (list[dict[str, str]]): The messages to send to the chat completion
+        model (str, optional): The model to use. Defaults to None.
+        temperature (float, optional): The temperature to use. Defaults to 0.9.
+        max_tokens (int, optional): The max tokens to use. Defaults to None.
+
+    Returns:
+        str: The response from the chat completion
+    """
+    _call_site.set(call_site(__name__))
+    recording = get_recording()
+    if recording is None:
+        return await _acreate_chat_completion(messages, model, temperature, max_tokens)
+    key = recording_key(model, messages, temperature, max_tokens)
+    if recording.replaying:
+        return recording.completion(key)
+    content = await _acreate_chat_completion(messages, model, temperature, max_tokens)
+    recording.record_completion(key, model, content)
+    return content
+
+
+def _create_chat_completion(
+    messages: list,
+    model: str | None,
+    temperature: float,
+    max_tokens: int | None,
+    stream: bool,
+    on_chunk: Callable[[str], bool | None] | None,
+) -> str:
+    cache_key, cached = _cached_completion(messages, model, temperature, max_tokens)
+    if cached is not None:
+        if stream and on_chunk is not None:
+            on_chunk(cached)
+        return cached
+    get_budget().check()
+    if stream:
+        # Every caller of a stream wants its own pieces
+        return _chat_completion(
+            messages, model, temperature, max_tokens, cache_key, True, on_chunk
+        )
+    return _chat_completion_flights.do(
+        completion_key(model, messages, temperature, max_tokens),
+        lambda: _chat_completion(messages, model, temperature, max_tokens, cache_key),
+    )
+
+
+async def _acreate_chat_completion(
+    messages: list, model: str | None, temperature: float, max_tokens: int | None
+) -> str:
+    cache_key, cached = _cached_completion(messages, model, temperature, max_tokens)
+    if cached is not None:
+        return cached
+    get_budget().check()
+    return await _chat_completion_flights.ado(
+        completion_key(model, messages, temperature, max_tokens),
+        lambda: _achat_completion(messages, model, temperature, max_tokens, cache_key),
+    )
+
+
+def _chat_completion(
+    messages: list,
+    model: str | None,
+    temperature: float,
+    max_tokens: int | None,
+    cache_key: str | None,
+    stream: bool = False,
+    on_chunk: Callable[[str], bool | None] | None = None,
+) -> str:
+    response = None
+    content, complete = "", True
+    retries = _ChatCompletionRetries(model)
+    tokens = _estimate_request_tokens(messages, max_tokens)
+    started = time.perf_counter()
+    _log_chat_completion(model, temperature, max_tokens)
+    # A reply retried after part of it was passed on is not passed on again
+    passed_on = []
+
+    def pass_on(piece: str) -> bool | None:
+        passed_on.append(piece)
+        return on_chunk(piece)
+
+    for attempt in range(retries.num_retries):
+        endpoint, delay = retries.endpoints.acquire(retries.model, tokens)
+        if delay:
+            time.sleep(delay)
+        start = time.perf_counter()
         try:
-            if CFG.use_azure:
-                response = openai.ChatCompletion.create(
-                    deployment_id=CFG.get_azure_deployment_id_for_model(model),
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
+            capture_response_headers()
+            reply = openai.ChatCompletion.create(
+                **_chat_completion_kwargs(
+                    messages, retries.model, temperature, max_tokens, endpoint
+                ),
+                stream=stream,
+            )
+            if stream:
+                # Errors in the middle of the stream are retried like the others
+                content, complete = _read_stream(
+                    reply, pass_on if on_chunk is not None and not passed_on else None
                 )
-            else:
-                response = openai.ChatCompletion.create(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
+            response = reply
+            retries.succeeded(endpoint, time.perf_counter() - start)
+            break
+        except (RateLimitError, APIError) as e:
+            backoff = retries.backoff(e, attempt, endpoint)
+        except Timeout as e:
+            backoff = retries.timed_out(e, time.perf_counter() - start)
+        if backoff:
+            time.sleep(backoff)
+    if retries.model != model:
+        # The reply of the fallback model is not the one asked for
+        cache_key = None
+    if stream and response is not None:
+        retries.record(messages, content, None, started)
+        # A response cut short by the caller is not worth replaying
+        return _store_completion(cache_key if complete else None, content)
+    content = retries.content(response)
+    retries.record(messages, content, response.get("usage"), started)
+    return _store_completion(cache_key, content)
+
+
+async def _achat_completion(
+    messages: list,
+    model: str | None,
+    temperature: float,
+    max_tokens: int | None,
+    cache_key: str | None,
+) -> str:
+    response = None
+    retries = _ChatCompletionRetries(model)
+    tokens = _estimate_request_tokens(messages, max_tokens)
+    started = time.perf_counter()
+    _log_chat_completion(model, temperature, max_tokens)
+    for attempt in range(retries.num_retries):
+        start = time.perf_counter()
+        try:
+            async with _concurrency_limit():
+                endpoint, delay = retries.endpoints.acquire(retries.model, tokens)
+                if delay:
+                    await asyncio.sleep(delay)
+                start = time.perf_counter()
+                response = await openai.ChatCompletion.acreate(
+                    **_chat_completion_kwargs(
+                        messages, retries.model, temperature, max_tokens, endpoint
+                    )
                 )
+            retries.succeeded(endpoint, time.perf_counter() - start)
             break
-        except RateLimitError:
+        except (RateLimitError, APIError) as e:
+            backoff = retries.backoff(e, attempt, endpoint)
+        except Timeout as e:
+            backoff = retries.timed_out(e, time.perf_counter() - start)
+        if backoff:
+            await asyncio.sleep(backoff)
+    if retries.model != model:
+        # The reply of the fallback model is not the one asked for
+        cache_key = None
+    content = retries.content(response)
+    retries.record(messages, content, response.get("usage"), started)
+    return _store_completion(cache_key, content)
+
+
+def run_concurrently(coroutines: Iterable[Awaitable[T]]) -> list[T]:
+    """Run independent LLM calls concurrently from synchronous code
+
+    The calls share one HTTP connection pool, whose responses feed the rate
+    limiter, and the results are returned in order. If one call fails, the
+    others are cancelled.
+
+    Called from a coroutine, the calls run on an event loop of their own in a
+    worker thread, as the loop of the caller cannot be re-entered, and the
+    caller's loop is blocked until they are done.
+
+    Args:
+        coroutines (Iterable[Awaitable[T]]): The calls to run
+
+    Returns:
+        list[T]: The result of each call
+    """
+
+    async def gather() -> list[T]:
+        async with aiohttp.ClientSession(
+            trace_configs=[response_headers_trace()]
+        ) as session:
+            openai.aiosession.set(session)
+            tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+            try:
+                return await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(gather())
+    # The calls keep the call site and command of the caller
+    context = contextvars.copy_context()
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        return executor.submit(context.run, asyncio.run, gather()).result()
+
+
+class _ChatCompletionRetries:
+    """Retry policy shared by the synchronous and asynchronous completions"""
+
+    num_retries = 10
+
+    def __init__(self, model: str | None) -> None:
+        self.model = model
+        self.endpoints = get_endpoint_pool()
+        self.router = get_model_router()
+        self.warned_user = False
+        self.retries = 0
+
+    def record(
+        self, messages: list, content: str, usage: dict | None, started: float
+    ) -> None:
+        """Add the completion to the ledger, estimating the usage if unknown"""
+        if usage is not None:
+            prompt_tokens = usage["prompt_tokens"]
+            completion_tokens = usage["completion_tokens"]
+        else:
+            prompt_tokens = estimate_tokens(m["content"] for m in messages)
+            completion_tokens = estimate_tokens([content])
+        get_ledger().record(
+            LLMCall(
+                "chat",
+                self.model,
+                _call_site.get(),
+                current_command(),
+                prompt_tokens,
+                completion_tokens,
+                time.perf_counter() - started,
+                self.retries,
+                estimated=usage is None,
+            )
+        )
+
+    def succeeded(self, endpoint: Endpoint, latency: float) -> None:
+        """Record a response, with the headers of the request that got it"""
+        self.endpoints.succeeded(endpoint, self.model, response_headers())
+        self.router.record(self.model, latency)
+
+    def timed_out(self, error: Timeout, latency: float) -> float:
+        """Switch to the fallback model after a timeout, or raise the error"""
+        self.retries += 1
+        self.router.record(self.model, latency, failed=True)
+        fallback = self.router.fallback(self.model)
+        if fallback is None:
+            raise error
+        if CFG.debug_mode:
+            print(
+                Fore.RED + "Error: ",
+                f"Request to {self.model} timed out, retrying with {fallback}"
+                + Fore.RESET,
+            )
+        self.model = fallback
+        return 0
+
+    def backoff(self, error: Exception, attempt: int, endpoint: Endpoint) -> float:
+        """Return how long to wait before retrying, or raise the error
+
+        The endpoint that failed is left out of the rotation for that long, and
+        there is no need to wait when another endpoint can take the retry.
+        """
+        retry_after = None
+        self.retries += 1
+        self.router.record(self.model, 0.0, failed=True)
+        if isinstance(error, RateLimitError):
+            retry_after = self.endpoints.throttled(endpoint, self.model, error.headers)
             if CFG.debug_mode:
                 print(
                     Fore.RED + "Error: ",
                     f"Reached rate limit, passing..." + Fore.RESET,
                 )
-            if not warned_user:
+            if not self.warned_user:
                 logger.double_check(
                     f"Please double check that you have setup a {Fore.CYAN + Style.BRIGHT}PAID{Style.RESET_ALL} OpenAI API Account. "
                     + f"You can read more here: {Fore.CYAN}https://github.com/Significant-Gravitas/Auto-GPT#openai-api-keys-configuration{Fore.RESET}"
                 )
-                warned_user = True
-        except APIError as e:
-            if e.http_status == 502:
-                pass
-            else:
-                raise
-            if attempt == num_retries - 1:
-                raise
+                self.warned_user = True
+        elif error.http_status != 502 or attempt == self.num_retries - 1:
+            raise error
+        if retry_after is not None:
+            backoff = retry_after
+        else:
+            backoff = min(2 ** (attempt + 2), MAX_BACKOFF)
+        self.endpoints.failed(endpoint, backoff)
+        if self.endpoints.healthy(self.model):
+            return 0
         if CFG.debug_mode:
             print(
                 Fore.RED + "Error: ",
                 f"API Bad gateway. Waiting {backoff} seconds..." + Fore.RESET,
             )
-        time.sleep(backoff)
-    if response is None:
-        logger.typewriter_log(
-            "FAILED TO GET RESPONSE FROM OPENAI",
-            Fore.RED,
-            "Auto-GPT has failed to get a response from OpenAI's services. "
-            + f"Try running Auto-GPT again, and if the problem the persists try running it with `{Fore.CYAN}--debug{Fore.RESET}`.",
+        return backoff
+
+    def content(self, response) -> str:
+        """Return the content of the response, or give up if there is none"""
+        if response is None:
+            logger.typewriter_log(
+                "FAILED TO GET RESPONSE FROM OPENAI",
+                Fore.RED,
+                "Auto-GPT has failed to get a response from OpenAI's services. "
+                + f"Try running Auto-GPT again, and if the problem the persists try running it with `{Fore.CYAN}--debug{Fore.RESET}`.",
+            )
+            logger.double_check()
+            if CFG.debug_mode:
+                raise RuntimeError(
+                    f"Failed to get response after {self.num_retries} retries"
+                )
+            else:
+                quit(1)
+
+        return response.choices[0].message["content"]
+
+
+def _read_stream(
+    response: Iterable, on_chunk: Callable[[str], bool | None] | None
+) -> tuple[str, bool]:
+    """Join the pieces of a streamed response, passing each one to on_chunk
+
+    Returns:
+        tuple[str, bool]: The content read, and whether the whole response was read
+
+    Raises:
+        APIError: If the connection broke before the end of the stream, as a bad
+            gateway to retry
+    """
+    pieces = []
+    try:
+        for event in response:
+            if not event["choices"]:
+                continue
+            piece = event["choices"][0]["delta"].get("content")
+            if not piece:
+                continue
+            pieces.append(piece)
+            if on_chunk is not None and on_chunk(piece):
+                # The rest is not wanted, and would hold the connection until read
+                close_response()
+                return "".join(pieces), False
+    except requests.exceptions.RequestException as e:
+        raise APIError(f"The stream was interrupted: {e}", http_status=502) from e
+    return "".join(pieces), True
+
+
+def get_completion_cache() -> CompletionCache | None:
+    """Return the persistent completion cache, or None if it is disabled"""
+    global _completion_cache
+    if not CFG.completion_cache:
+        return None
+    if _completion_cache is None:
+        _completion_cache = CompletionCache(
+            CFG.completion_cache_file,
+            CFG.completion_cache_max_mb * 1024 * 1024,
+            CFG.completion_cache_ttl,
         )
-        logger.double_check()
-        if CFG.debug_mode:
-            raise RuntimeError(f"Failed to get response after {num_retries} retries")
-        else:
-            quit(1)
+    return _completion_cache
+
+
+def chat_completion_coalescing() -> CoalescingMetrics:
+    """Return how many chat completions shared the call of an identical one"""
+    return _chat_completion_flights.metrics
+
+
+def _cached_completion(
+    messages: list, model: str | None, temperature: float, max_tokens: int | None
+) -> tuple[str | None, str | None]:
+    # Only deterministic completions are worth replaying
+    cache = get_completion_cache()
+    if cache is None or temperature != 0:
+        return None, None
+    key = completion_key(model, messages, temperature, max_tokens)
+    cached = cache.get(key)
+    if CFG.debug_mode:
+        logger.debug(cache.report())
+    return key, cached
+
+
+def _store_completion(key: str | None, content: str) -> str:
+    if key is not None:
+        get_completion_cache().put(key, content)
+    return content
+
+
+def _chat_completion_kwargs(
+    messages: list,
+    model: str | None,
+    temperature: float,
+    max_tokens: int | None,
+    endpoint: Endpoint,
+) -> dict:
+    kwargs = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        **endpoint.request_kwargs(model),
+    }
+    if CFG.llm_request_timeout:
+        kwargs["request_timeout"] = CFG.llm_request_timeout
+    return kwargs
+
+
+def _log_chat_completion(
+    model: str | None, temperature: float, max_tokens: int | None
+) -> None:
+    if CFG.debug_mode:
+        print(
+            Fore.GREEN
+            + f"Creating chat completion with model {model}, temperature {temperature},"
+            f" max_tokens {max_tokens}" + Fore.RESET
+        )
+
+
+def _concurrency_limit() -> AdaptiveSemaphore:
+    # Semaphores belong to the event loop they were first used on
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = AdaptiveSemaphore(
+            lambda: get_rate_limiter().concurrency(CFG.llm_max_concurrency)
+        )
+    return _semaphores[loop]
+
 
-    return response.choices[0].message["content"]
+def _estimate_request_tokens(messages: list, max_tokens: int | None) -> int:
+    # The token limits count the completion as max_tokens long
+    return estimate_tokens(message["content"] for message in messages) + (
+        max_tokens or 0
+    )
 
 
 def create_embedding_with_ada(text) -> list:
     """Create an embedding with text-ada-002 using the OpenAI SDK"""
-    num_retries = 10
-    for attempt in range(num_retries):
-        backoff = 2 ** (attempt + 2)
-        try:
-            if CFG.use_azure:
-                return openai.Embedding.create(
-                    input=[text],
-                    engine=CFG.get_azure_deployment_id_for_model(
-                        "text-embedding-ada-002"
-                    ),
-                )["data"][0]["embedding"]
-            else:
-                return openai.Embedding.create(
-                    input=[text], model="text-embedding-ada-002"
-                )["data"][0]["embedding"]
-        except RateLimitError:
-            pass
-        except APIError as e:
-            if e.http_status == 502:
-                pass
-            else:
-                raise
-            if attempt == num_retries - 1:
-                raise
-        if CFG.debug_mode:
-            print(
-                Fore.RED + "Error: ",
-                f"API Bad gateway. Waiting {backoff} seconds..." + Fore.RESET,
-            )
-        time.sleep(backoff)
+    return embed(text)
+
+
+def create_embeddings_with_ada(texts: list[str]) -> list[list[float]]:
+    """Create the embeddings of several texts with text-ada-002"""
+    return embed_many(texts)
@@ -1,24 +1,17 @@
 """Base class for memory providers."""
 import abc
 
-import openai
-
-from autogpt.config import AbstractSingleton, Config
-
-cfg = Config()
+from autogpt.config import AbstractSingleton
+from autogpt.embeddings import embed, embed_many
 
 
 def get_ada_embedding(text):
     text = text.replace("\n", " ")
-    if cfg.use_azure:
-        return openai.Embedding.create(
-            input=[text],
-            engine=cfg.get_azure_deployment_id_for_model("text-embedding-ada-002"),
-        )["data"][0]["embedding"]
-    else:
-        return openai.Embedding.create(input=[text], model="text-embedding-ada-002")[
-            "data"
-        ][0]["embedding"]
+    return embed(text)
+
+
+def get_ada_embeddings(texts):
+    return embed_many([text.replace("\n", " ") for text in texts])
 
 
 class MemoryProviderSingleton(AbstractSingleton):
@@ -26,6 +19,10 @@ class MemoryProviderSingleton(AbstractSingleton):
     def add(self, data):
         pass
 
+    @abc.abstractmethod
+    def add_many(self, data):
+        pass
+
     @abc.abstractmethod
     def get(self, data):
         pass
@@ -1,29 +1,32 @@
 from __future__ import annotations
 
 import dataclasses
-import os
-from typing import Any, List
+from typing import Any, Sequence
 
 import numpy as np
-import orjson
 
-from autogpt.llm_utils import create_embedding_with_ada
+from autogpt.embeddings import embed, embed_many, embedding_dimension, embedding_model
 from autogpt.memory.base import MemoryProviderSingleton
+from autogpt.memory.local_ivf import IVFIndex
+from autogpt.memory.local_storage import LocalStorage
 
-EMBED_DIM = 1536
-SAVE_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SERIALIZE_DATACLASS
 
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the k highest scores, best first
 
-def create_default_embeddings():
-    return np.zeros((0, EMBED_DIM)).astype(np.float32)
+    Uses a partial selection, which is O(n), and only sorts the k winners.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    candidates = np.argpartition(scores, len(scores) - k)[-k:]
+    return candidates[np.argsort(scores[candidates])[::-1]]
 
 
 @dataclasses.dataclass
 class CacheContent:
-    texts: List[str] = dataclasses.field(default_factory=list)
-    embeddings: np.ndarray = dataclasses.field(
-        default_factory=create_default_embeddings
-    )
+    texts: Sequence[str]
+    embeddings: np.ndarray
 
 
 class LocalCache(MemoryProviderSingleton):
@@ -38,26 +41,25 @@ class LocalCache(MemoryProviderSingleton):
         Returns:
             None
         """
-        self.filename = f"{cfg.memory_index}.json"
-        if os.path.exists(self.filename):
-            try:
-                with open(self.filename, "w+b") as f:
-                    file_content = f.read()
-                    if not file_content.strip():
-                        file_content = b"{}"
-                        f.write(file_content)
-
-                    loaded = orjson.loads(file_content)
-                    self.data = CacheContent(**loaded)
-            except orjson.JSONDecodeError:
-                print(f"Error: The file '{self.filename}' is not in JSON format.")
-                self.data = CacheContent()
-        else:
-            print(
-                f"Warning: The file '{self.filename}' does not exist. "
-                "Local memory would not be saved to a file."
-            )
-            self.data = CacheContent()
+        # With a quantized store, the best k * rerank candidates are re-scored
+        # against a float32 copy of the vectors
+        self.rerank = cfg.local_memory_rerank
+        self.storage = LocalStorage(
+            cfg.memory_index,
+            embedding_dimension(),
+            precision=cfg.local_memory_precision,
+            model=embedding_model(),
+            keep_full_precision=self.rerank > 0,
+        )
+        self.storage.migrate_json(f"{cfg.memory_index}.json")
+        texts, embeddings = self.storage.load()
+        # Texts are read lazily from the log and embeddings are memory-mapped
+        self.data = CacheContent(texts=texts, embeddings=embeddings)
+
+        self.index = None
+        if cfg.local_memory_index == "ivf":
+            self.index = IVFIndex(cfg.memory_index, nprobe=cfg.local_memory_nprobe)
+            self.index.load(self.storage.decoded_embeddings)
 
     def add(self, text: str):
         """
@@ -71,32 +73,48 @@ class LocalCache(MemoryProviderSingleton):
         """
         if "Command Error:" in text:
             return ""
-        self.data.texts.append(text)
 
-        embedding = create_embedding_with_ada(text)
+        embedding = embed(text)
 
         vector = np.array(embedding).astype(np.float32)
-        vector = vector[np.newaxis, :]
-        self.data.embeddings = np.concatenate(
-            [
-                self.data.embeddings,
-                vector,
-            ],
-            axis=0,
-        )
-
-        with open(self.filename, "wb") as f:
-            out = orjson.dumps(self.data, option=SAVE_OPTIONS)
-            f.write(out)
+        self.storage.append(text, vector)
+        self.data.embeddings = self.storage.embeddings
+        if self.index is not None:
+            self.index.update(self.storage.decoded_embeddings)
         return text
 
+    def add_many(self, texts: list[str]) -> list[str]:
+        """
+        Add several texts at once, embedding them in batched requests
+
+        Args:
+            texts: The texts to add
+
+        Returns: The texts that were added
+        """
+        texts = [text for text in texts if "Command Error:" not in text]
+        if not texts:
+            return []
+
+        embeddings = embed_many(texts)
+
+        for text, embedding in zip(texts, embeddings):
+            self.storage.append(text, np.array(embedding, dtype=np.float32))
+        self.data.embeddings = self.storage.embeddings
+        if self.index is not None:
+            self.index.update(self.storage.decoded_embeddings)
+        return texts
+
     def clear(self) -> str:
         """
         Clears the redis server.
 
         Returns: A message indicating that the memory has been cleared.
         """
-        self.data = CacheContent()
+        self.storage.clear()
+        self.data = CacheContent(self.storage.texts, self.storage.embeddings)
+        if self.index is not None:
+            self.index.clear()
         return "Obliviated"
 
     def get(self, data: str) -> list[Any] | None:
@@ -121,11 +139,52 @@ class LocalCache(MemoryProviderSingleton):
 
         Returns: List[str]
         """
-        embedding = create_embedding_with_ada(text)
+        embedding = embed(text)
+
+        return self._search(np.array(embedding, dtype=np.float32), k)
+
+    def get_relevant_batch(self, texts: list[str], k: int) -> list[list[Any]]:
+        """
+        Find the top-k memories for several queries at once, scoring all of them
+            with a single matrix-matrix product
 
-        scores = np.dot(self.data.embeddings, embedding)
+        Args:
+            texts: The queries
+            k: The number of memories to return for each query
 
-        top_k_indices = np.argsort(scores)[-k:][::-1]
+        Returns: The list of relevant texts for each query, in query order
+        """
+        if not texts:
+            return []
+        queries = np.array(embed_many(texts), dtype=np.float32)
+        if self.index is not None and self.index.trained:
+            return [self._search(query, k) for query in queries]
+
+        scores = self.storage.score(queries.T)
+
+        return [
+            self._search(query, k, scores[:, column])
+            for column, query in enumerate(queries)
+        ]
+
+    def _search(
+        self, query: np.ndarray, k: int, scores: np.ndarray | None = None
+    ) -> list[Any]:
+        """Find the texts of the k rows closest to a query embedding, scoring
+        only the candidates of the approximate index when there is one"""
+        candidates = None
+        if scores is None:
+            if self.index is not None:
+                candidates = self.index.candidates(query)
+            scores = self.storage.score(query, candidates)
+
+        exact = self.storage.full_vectors is not None
+        top_k_indices = top_k(scores, k * self.rerank if exact else k)
+        if candidates is not None:
+            top_k_indices = candidates[top_k_indices]
+        if exact:
+            exact_scores = self.storage.exact_score(query, top_k_indices)
+            top_k_indices = top_k_indices[top_k(exact_scores, k)]
 
         return [self.data.texts[i] for i in top_k_indices]
 
@@ -133,4 +192,4 @@ class LocalCache(MemoryProviderSingleton):
         """
         Returns: The stats of the local cache.
         """
-        return len(self.data.texts), self.data.embeddings.shape
+        return len(self.data.texts), (len(self.data.embeddings), self.storage.dim)
@@ -0,0 +1,216 @@
+"""Inverted file (IVF) approximate nearest-neighbour index for the local memory.
+
+The vectors are clustered with spherical k-means and each vector is filed under
+its closest centroid. A query only scores the vectors filed under its ``nprobe``
+closest centroids, trading a little recall for a search cost that grows with
+``nprobe * n / nlist`` instead of ``n``.
+
+The index is built incrementally: nothing happens until the memory holds
+``min_train_size`` vectors, after which new vectors are assigned as they are
+added. Once the memory has grown by ``RETRAIN_FACTOR`` since the last training
+the index is stale, and the clustering is retrained when the index is next
+loaded so the lists stay balanced. Retraining clusters a sample of the vectors
+and reassigns all of them, which takes seconds on large memories, so it is never
+done while vectors are added; call ``train`` to retrain sooner.
+
+Two files are kept next to the vector store:
+
+* ``{prefix}.ivf.npz``: the centroids and the size they were trained on
+* ``{prefix}.ivf.assignments``: append-only int32 list id of each vector
+"""
+from __future__ import annotations
+
+import os
+from array import array
+from typing import List
+
+import numpy as np
+
+RETRAIN_FACTOR = 4
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLES_PER_LIST = 32
+ASSIGN_CHUNK_SIZE = 8192
+
+
+class IVFIndex:
+    """Incrementally built inverted file index over a growing embedding matrix"""
+
+    def __init__(self, prefix: str, nprobe: int = 16, min_train_size: int = 4096):
+        """Initialize the index
+
+        Args:
+            prefix (str): The path prefix shared with the vector store
+            nprobe (int): The number of lists scanned per query. Higher values
+                give better recall at the cost of latency.
+            min_train_size (int): The number of vectors needed before the index
+                is trained. Smaller memories are searched exhaustively.
+        """
+        self.centroids_filename = f"{prefix}.ivf.npz"
+        self.assignments_filename = f"{prefix}.ivf.assignments"
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.centroids: np.ndarray | None = None
+        self.trained_size = 0
+        self.lists: List[array] = []
+        self.count = 0
+        self._assignments_file = None
+
+    @property
+    def trained(self) -> bool:
+        """Whether the index has centroids to search with"""
+        return self.centroids is not None
+
+    @property
+    def stale(self) -> bool:
+        """Whether the memory outgrew the clustering the index was trained on"""
+        return self.trained and self.count >= RETRAIN_FACTOR * self.trained_size
+
+    def load(self, embeddings: np.ndarray) -> None:
+        """Load the persisted index, retraining it if it is stale, and assign any
+        vector it is missing
+
+        Args:
+            embeddings (np.ndarray): The embedding matrix of the memory, or a
+                float32 view over it
+        """
+        self.close()
+        if os.path.exists(self.centroids_filename):
+            with np.load(self.centroids_filename) as saved:
+                self.centroids = saved["centroids"]
+                self.trained_size = int(saved["trained_size"])
+            assignments = np.fromfile(self.assignments_filename, dtype=np.int32)
+            if len(assignments) > len(embeddings):
+                assignments = assignments[: len(embeddings)]
+                os.truncate(self.assignments_filename, assignments.nbytes)
+            self._build_lists(assignments)
+            self._assignments_file = open(self.assignments_filename, "ab")
+        self.update(embeddings)
+        if self.stale:
+            self.train(embeddings)
+
+    def update(self, embeddings: np.ndarray) -> None:
+        """Bring the index up to date after vectors were added to the memory
+
+        The first training happens here, on ``min_train_size`` vectors. Later
+        vectors are assigned to the existing centroids, even once the index is
+        stale.
+
+        Args:
+            embeddings (np.ndarray): The embedding matrix of the memory
+        """
+        size = len(embeddings)
+        if not self.trained and size >= self.min_train_size:
+            self.train(embeddings)
+        elif self.trained and self.count < size:
+            assignments = self._assign(embeddings, self.count)
+            self._assignments_file.write(assignments.tobytes())
+            self._assignments_file.flush()
+            for i, list_id in enumerate(assignments, start=self.count):
+                self.lists[list_id].append(i)
+            self.count = size
+
+    def train(self, embeddings: np.ndarray) -> None:
+        """Cluster the embeddings and file every vector under its closest centroid
+
+        Args:
+            embeddings (np.ndarray): The embedding matrix of the memory
+        """
+        self.close()
+        nlist = max(1, int(np.sqrt(len(embeddings))))
+        self.centroids = _spherical_kmeans(embeddings, nlist)
+        self.trained_size = len(embeddings)
+        assignments = self._assign(embeddings)
+
+        tmp_filename = f"{self.assignments_filename}.tmp"
+        assignments.tofile(tmp_filename)
+        os.replace(tmp_filename, self.assignments_filename)
+        with open(f"{self.centroids_filename}.tmp", "wb") as f:
+            np.savez(f, centroids=self.centroids, trained_size=self.trained_size)
+        os.replace(f"{self.centroids_filename}.tmp", self.centroids_filename)
+
+        self._build_lists(assignments)
+        self._assignments_file = open(self.assignments_filename, "ab")
+
+    def candidates(self, query: np.ndarray) -> np.ndarray | None:
+        """Return the rows worth scoring for a query
+
+        Args:
+            query (np.ndarray): The query embedding
+
+        Returns:
+            np.ndarray | None: The candidate row indices, or None when the index
+                is not trained and every row has to be scored
+        """
+        if not self.trained:
+            return None
+        centroid_scores = np.dot(self.centroids, query)
+        nprobe = min(self.nprobe, len(centroid_scores))
+        probed = np.argpartition(centroid_scores, len(centroid_scores) - nprobe)
+        return np.concatenate(
+            [np.frombuffer(self.lists[i], dtype=np.int64) for i in probed[-nprobe:]]
+        )
+
+    def clear(self) -> None:
+        """Remove the index and its files"""
+        self.close()
+        for filename in (self.centroids_filename, self.assignments_filename):
+            if os.path.exists(filename):
+                os.remove(filename)
+        self.centroids = None
+        self.trained_size = 0
+        self.lists = []
+        self.count = 0
+
+    def close(self) -> None:
+        """Close the assignments file"""
+        if self._assignments_file is not None:
+            self._assignments_file.close()
+            self._assignments_file = None
+
+    def _assign(self, embeddings, start: int = 0) -> np.ndarray:
+        # Slicing chunk by chunk keeps decoded views of quantized stores small
+        return np.concatenate(
+            [
+                np.argmax(
+                    np.dot(embeddings[i : i + ASSIGN_CHUNK_SIZE], self.centroids.T),
+                    axis=1,
+                ).astype(np.int32)
+                for i in range(start, len(embeddings), ASSIGN_CHUNK_SIZE)
+            ]
+            or [np.empty(0, dtype=np.int32)]
+        )
+
+    def _build_lists(self, assignments: np.ndarray) -> None:
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+        self.lists = [
+            array("q", order[start:end].astype(np.int64).tobytes())
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        self.count = len(assignments)
+
+
+def _spherical_kmeans(embeddings: np.ndarray, nlist: int) -> np.ndarray:
+    """Cluster a sample of the embeddings by cosine similarity"""
+    rng = np.random.default_rng(0)
+    sample_size = min(len(embeddings), nlist * KMEANS_SAMPLES_PER_LIST)
+    sample = np.asarray(
+        embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))],
+        dtype=np.float32,
+    )
+    sample /= np.linalg.norm(sample, axis=1, keepdims=True) + 1e-12
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)]
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(np.dot(sample, centroids.T), axis=1)
+        counts = np.bincount(assignments, minlength=nlist)
+        starts = np.cumsum(counts) - counts
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(
+            sample[np.argsort(assignments, kind="stable")], starts[~empty], axis=0
+        )
+        # Re-seed empty lists with random sample points
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-12)
+    return centroids.astype(np.float32)
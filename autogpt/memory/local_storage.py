@@ -0,0 +1,439 @@
+"""Append-only on-disk storage engine for the local memory provider.
+
+A store is made of four files sharing the ``memory_index`` prefix:
+
+* ``{prefix}.texts``: append-only log of length-prefixed UTF-8 records
+* ``{prefix}.offsets``: uint64 end offset of each record in the text log
+* ``{prefix}.vectors``: fixed-stride vector rows, one per text record
+* ``{prefix}.meta.json``: format version, vector dimension and precision, and the
+  embedding model the vectors come from
+
+The vectors are stored in float32, float16 or int8 (see ``local_vectors``). A
+quantized store can also keep a float32 copy in ``{prefix}.vectors.full`` that
+is only read to re-rank the best candidates of a search exactly. A copy started on
+a store that was already quantized is decoded from its vectors, so it is only as
+exact as them for the memories stored until then.
+
+Adding a memory appends one vector row, one text record and one offset, so the
+cost of an add no longer depends on how many memories are already stored. The
+offset is written last and acts as the commit marker: on load, the number of
+memories is the number of committed offsets that also have a vector row, and any
+torn tail left behind by a crash is truncated away.
+
+Loading does not parse anything: the vector file is memory-mapped and texts are
+only read from the log when they are looked up, so a large store is searchable
+as soon as it is opened and the matrix is never copied into process memory.
+
+The vector file is preallocated with a capacity that doubles whenever it is full,
+so ingesting n memories only remaps the file O(log n) times instead of copying
+the matrix on every add. ``embeddings`` is a view over the filled prefix and the
+rows past it are unused capacity. Loading compacts the store by truncating the
+vector files to their filled rows, so the capacity allocated by a previous run
+is reclaimed; the first add after loading allocates it again.
+"""
+from __future__ import annotations
+
+import os
+import struct
+from array import array
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+from autogpt.memory.local_vectors import DecodedView, VectorFile
+
+STORAGE_VERSION = 2
+# The embedding model of the memories of the previous JSON storage format
+JSON_STORAGE_MODEL = "text-embedding-ada-002"
+RECORD_HEADER = struct.Struct("<I")
+
+
+class TextLog(Sequence):
+    """Lazily read sequence over the records of a text log"""
+
+    def __init__(self, filename: str, offsets: array) -> None:
+        """Initialize the text log
+
+        Args:
+            filename (str): The path of the text log
+            offsets (array): The end offset of each committed record
+        """
+        self.filename = filename
+        self.offsets = offsets
+        self._file = open(filename, "rb")
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("text log index out of range")
+        start = self.offsets[index - 1] if index else 0
+        self._file.seek(start + RECORD_HEADER.size)
+        length = self.offsets[index] - start - RECORD_HEADER.size
+        return self._file.read(length).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        self._file.seek(0)
+        content = self._file.read(self.offsets[-1] if self.offsets else 0)
+        start = 0
+        for end in self.offsets:
+            yield content[start + RECORD_HEADER.size : end].decode("utf-8")
+            start = end
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, TextLog)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"TextLog({self.filename!r}, {len(self)} records)"
+
+    def close(self) -> None:
+        """Close the underlying file"""
+        self._file.close()
+
+
+class LocalStorage:
+    """Append-only text log plus memory-mapped fixed-stride vector file"""
+
+    def __init__(
+        self,
+        prefix: str,
+        dim: int,
+        precision: str = "float32",
+        keep_full_precision: bool = False,
+        model: str | None = None,
+    ) -> None:
+        """Initialize the storage
+
+        Args:
+            prefix (str): The path prefix shared by the store files
+            dim (int): The dimension of the stored vectors
+            precision (str): The precision the vectors are stored in
+            keep_full_precision (bool): Whether a quantized store also keeps a
+                float32 copy of the vectors for exact re-ranking
+            model (str, optional): The embedding model of the vectors. A store
+                written by another model is refused. Defaults to None, any model.
+        """
+        self.dim = dim
+        self.precision = precision
+        self.model = model
+        self.texts_filename = f"{prefix}.texts"
+        self.offsets_filename = f"{prefix}.offsets"
+        self.vectors_filename = f"{prefix}.vectors"
+        self.full_vectors_filename = f"{prefix}.vectors.full"
+        self.meta_filename = f"{prefix}.meta.json"
+        self.vectors = VectorFile(self.vectors_filename, dim, precision)
+        self.full_vectors = None
+        if keep_full_precision and precision != "float32":
+            self.full_vectors = VectorFile(self.full_vectors_filename, dim)
+        self.texts: TextLog | None = None
+        self.embeddings = self.vectors.view(0)
+        self._texts_file = None
+        self._offsets_file = None
+
+    @property
+    def capacity(self) -> int:
+        """The number of vector rows allocated in the vector file"""
+        return self.vectors.capacity
+
+    @property
+    def decoded_embeddings(self):
+        """The embeddings as float32, decoded on access for quantized stores"""
+        if self.precision == "float32":
+            return self.embeddings
+        return DecodedView(self.vectors, self.embeddings)
+
+    def exists(self) -> bool:
+        """Check whether the store files exist on disk
+
+        Returns:
+            bool: True if the store has been created
+        """
+        return all(
+            os.path.exists(filename)
+            for filename in (
+                self.texts_filename,
+                self.vectors_filename,
+                self.meta_filename,
+            )
+        )
+
+    def load(self) -> Tuple[TextLog, np.ndarray]:
+        """Open the memories on disk, creating an empty store if needed
+
+        Returns:
+            Tuple[TextLog, np.ndarray]: The texts and their memory-mapped embeddings
+        """
+        self.close()
+        if not self.exists():
+            self._write([], np.zeros((0, self.dim), dtype=np.float32))
+
+        meta = orjson.loads(_read_bytes(self.meta_filename) or b"{}")
+        if meta.get("dim", self.dim) != self.dim:
+            raise ValueError(
+                f"The local memory store has dimension {meta['dim']},"
+                f" expected {self.dim}."
+            )
+        stored_model = meta.get("model")
+        if stored_model and self.model and stored_model != self.model:
+            raise ValueError(
+                f"The local memory store was embedded with {stored_model},"
+                f" not {self.model}. Use another MEMORY_INDEX or the same"
+                " EMBEDDING_PROVIDER."
+            )
+        if meta.get("version", 1) < 2 or not os.path.exists(self.offsets_filename):
+            # Stores written before the offsets index existed need one scan
+            _write_atomic(self.offsets_filename, _scan_offsets(self.texts_filename))
+            self._write_meta()
+        stored_precision = meta.get("precision", "float32")
+        if stored_precision != self.precision:
+            self._convert(stored_precision)
+        elif self.model and not stored_model:
+            # Stores written before the model was recorded
+            self._write_meta()
+        if self.full_vectors is None:
+            if os.path.exists(self.full_vectors_filename):
+                os.remove(self.full_vectors_filename)
+        elif not os.path.exists(self.full_vectors_filename):
+            self.vectors.map(self.vectors.rows_on_disk())
+            self.full_vectors.write_all(self.vectors.decode(self.vectors.view(None)))
+            if self.vectors.rows_on_disk():
+                # The float32 vectors were lost when the store was quantized
+                print(
+                    f"Warning: the float32 copy of the {self.precision} local memory"
+                    " is decoded from its quantized vectors, so re-ranking is only"
+                    " approximate for the memories already stored until they are"
+                    " embedded again."
+                )
+
+        offsets = array("Q")
+        offsets.frombytes(_read_bytes(self.offsets_filename))
+        texts_nbytes = os.path.getsize(self.texts_filename)
+        count = min(len(offsets), self.vectors.rows_on_disk())
+        if self.full_vectors is not None:
+            count = min(count, self.full_vectors.rows_on_disk())
+        while count and offsets[count - 1] > texts_nbytes:
+            count -= 1
+        self._truncate(offsets, count)
+
+        self.texts = TextLog(self.texts_filename, offsets)
+        self._texts_file = open(self.texts_filename, "ab")
+        self._offsets_file = open(self.offsets_filename, "ab")
+        for vector_file in self._vector_files():
+            vector_file.map(vector_file.rows_on_disk())
+        self.embeddings = self.vectors.view(count)
+        return self.texts, self.embeddings
+
+    def append(self, text: str, vector: np.ndarray) -> None:
+        """Append a single memory to the store
+
+        Args:
+            text (str): The text of the memory
+            vector (np.ndarray): The embedding of the text
+        """
+        offsets = self.texts.offsets
+        count = len(offsets)
+        for vector_file in self._vector_files():
+            vector_file.write_row(count, vector)
+
+        record = _encode_record(text)
+        self._texts_file.write(record)
+        self._texts_file.flush()
+        end = (offsets[-1] if offsets else 0) + len(record)
+        self._offsets_file.write(struct.pack("<Q", end))
+        self._offsets_file.flush()
+        offsets.append(end)
+        self.embeddings = self.vectors.view(count + 1)
+
+    def score(self, queries: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """Score the stored vectors against one or several queries
+
+        Args:
+            queries (np.ndarray): A query of shape (dim,) or queries of shape
+                (dim, m)
+            rows (np.ndarray, optional): The rows to score. Defaults to all.
+
+        Returns:
+            np.ndarray: The scores, of shape (n,) or (n, m)
+        """
+        stored = self.embeddings if rows is None else self.embeddings[rows]
+        return self.vectors.score(stored, queries)
+
+    def exact_score(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Score rows against a query with the float32 copy of a quantized store
+
+        Args:
+            query (np.ndarray): The query embedding
+            rows (np.ndarray): The rows to score
+
+        Returns:
+            np.ndarray: The scores of the rows
+        """
+        return np.dot(self.full_vectors.view(len(self.texts))[rows], query)
+
+    def clear(self) -> None:
+        """Remove every memory from the store"""
+        self.close()
+        self._write([], np.zeros((0, self.dim), dtype=np.float32))
+        self.load()
+
+    def close(self) -> None:
+        """Release the open files and memory map of the store"""
+        for f in (self.texts, self._texts_file, self._offsets_file):
+            if f is not None:
+                f.close()
+        self.texts = self._texts_file = self._offsets_file = None
+        for vector_file in self._vector_files():
+            vector_file.close()
+        self.embeddings = self.vectors.view(0)
+
+    def migrate_json(self, filename: str) -> bool:
+        """Import a memory file written by the previous JSON storage format
+
+        The JSON file is renamed with a ``.migrated`` suffix once imported so that
+        the migration only happens once. A file whose vectors do not have the
+        dimension of the store is left as is. The memories are recorded as
+        embedded with text-embedding-ada-002, the only model of that format, so
+        that a store of another model refuses them on load.
+
+        Args:
+            filename (str): The path of the JSON memory file
+
+        Returns:
+            bool: True if memories were imported
+        """
+        if not os.path.exists(filename) or self.exists():
+            return False
+
+        content = _read_bytes(filename)
+        if not content.strip():
+            return False
+        try:
+            loaded = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            print(f"Error: The file '{filename}' is not in JSON format.")
+            return False
+
+        texts = loaded.get("texts", [])
+        embeddings = np.array(loaded.get("embeddings", []), dtype=np.float32)
+        if texts and embeddings.shape != (len(texts), self.dim):
+            print(
+                f"Error: The memories in '{filename}' have {embeddings.shape[-1]}"
+                f" dimensions, not {self.dim}, and were not migrated."
+            )
+            return False
+        self._write(texts, embeddings.reshape(len(texts), self.dim), JSON_STORAGE_MODEL)
+        os.replace(filename, f"{filename}.migrated")
+        print(f"Migrated {len(texts)} memories from '{filename}'.")
+        return True
+
+    def _vector_files(self) -> List[VectorFile]:
+        if self.full_vectors is None:
+            return [self.vectors]
+        return [self.vectors, self.full_vectors]
+
+    def _convert(self, stored_precision: str) -> None:
+        """Re-encode the vector file written with another precision"""
+        source = VectorFile(self.full_vectors_filename, self.dim)
+        if stored_precision == "float32" or not os.path.exists(source.filename):
+            source = VectorFile(self.vectors_filename, self.dim, stored_precision)
+        source.map(source.rows_on_disk())
+        embeddings = source.decode(source.view(None))
+        source.close()
+        for vector_file in self._vector_files():
+            vector_file.write_all(embeddings)
+        self._write_meta()
+        print(
+            f"Converted the local memory from {stored_precision} to"
+            f" {self.precision} precision."
+        )
+
+    def _truncate(self, offsets: array, count: int) -> None:
+        """Drop the torn tail left behind by an interrupted add, and the unused
+        capacity of the vector files
+        """
+        del offsets[count:]
+        truncated = [
+            (self.offsets_filename, count * offsets.itemsize),
+            (self.texts_filename, offsets[-1] if offsets else 0),
+        ]
+        truncated.extend(
+            (vector_file.filename, count * vector_file.row_nbytes)
+            for vector_file in self._vector_files()
+        )
+        for filename, nbytes in truncated:
+            if os.path.getsize(filename) != nbytes:
+                os.truncate(filename, nbytes)
+
+    def _write(
+        self, texts: List[str], embeddings: np.ndarray, model: str | None = None
+    ) -> None:
+        """Rewrite the store so that it holds exactly the given memories
+
+        The files are written next to the store and moved into place, so an
+        interrupted rewrite leaves the previous store untouched. The memories
+        come from the embedding model of the store unless another one is given.
+        """
+        records = [_encode_record(text) for text in texts]
+        offsets = array("Q")
+        end = 0
+        for record in records:
+            end += len(record)
+            offsets.append(end)
+        for vector_file in self._vector_files():
+            vector_file.write_all(embeddings)
+        _write_atomic(self.texts_filename, b"".join(records))
+        _write_atomic(self.offsets_filename, offsets.tobytes())
+        self._write_meta(model)
+
+    def _write_meta(self, model: str | None = None) -> None:
+        meta = {
+            "version": STORAGE_VERSION,
+            "dim": self.dim,
+            "precision": self.precision,
+        }
+        model = model or self.model
+        if model:
+            meta["model"] = model
+        _write_atomic(self.meta_filename, orjson.dumps(meta))
+
+
+def _encode_record(text: str) -> bytes:
+    encoded = text.encode("utf-8")
+    return RECORD_HEADER.pack(len(encoded)) + encoded
+
+
+def _scan_offsets(filename: str) -> bytes:
+    """Compute the end offset of each complete record of a text log"""
+    content = _read_bytes(filename)
+    offsets = array("Q")
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(content):
+        (length,) = RECORD_HEADER.unpack_from(content, offset)
+        end = offset + RECORD_HEADER.size + length
+        if end > len(content):
+            break
+        offsets.append(end)
+        offset = end
+    return offsets.tobytes()
+
+
+def _read_bytes(filename: str) -> bytes:
+    if not os.path.exists(filename):
+        return b""
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def _write_atomic(filename: str, content: bytes) -> None:
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(content)
+    os.replace(tmp_filename, filename)
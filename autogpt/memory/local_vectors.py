@@ -0,0 +1,188 @@
+"""Memory-mapped vector files for the local memory provider.
+
+A vector file holds fixed-stride rows in one of the following precisions:
+
+* ``float32``: 4 bytes per dimension, exact
+* ``float16``: 2 bytes per dimension
+* ``int8``: 1 byte per dimension plus one float32 scale per row, each row being
+  scaled so that its largest component maps to 127
+
+The file is preallocated with a capacity that doubles whenever it is full, so
+ingesting n vectors only remaps the file O(log n) times. Scoring a quantized
+file decodes it in chunks, so the resident set stays proportional to the stored
+size rather than to the float32 size.
+"""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+MIN_CAPACITY = 1024
+SCORE_CHUNK_SIZE = 4096
+
+
+class VectorFile:
+    """Growable memory-mapped file of fixed-stride vectors"""
+
+    def __init__(self, filename: str, dim: int, precision: str = "float32") -> None:
+        """Initialize the vector file
+
+        Args:
+            filename (str): The path of the file
+            dim (int): The dimension of the vectors
+            precision (str): One of PRECISIONS
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(
+                f"Unknown vector precision '{precision}',"
+                f" expected one of {', '.join(PRECISIONS)}."
+            )
+        self.filename = filename
+        self.dim = dim
+        self.precision = precision
+        if precision == "int8":
+            self.row_dtype = np.dtype(
+                [("codes", np.int8, (dim,)), ("scale", np.float32)]
+            )
+            self.row_shape: tuple = ()
+        else:
+            self.row_dtype = np.dtype(precision)
+            self.row_shape = (dim,)
+        self.row_nbytes = self.row_dtype.itemsize * int(np.prod(self.row_shape))
+        self.rows: np.memmap | None = None
+
+    @property
+    def capacity(self) -> int:
+        """The number of rows allocated in the file"""
+        return 0 if self.rows is None else len(self.rows)
+
+    def rows_on_disk(self) -> int:
+        """The number of complete rows the file currently holds"""
+        if not os.path.exists(self.filename):
+            return 0
+        return os.path.getsize(self.filename) // self.row_nbytes
+
+    def map(self, capacity: int) -> None:
+        """Map the file, growing it to the given number of rows if needed
+
+        Args:
+            capacity (int): The number of rows to map
+        """
+        self.close()
+        if os.path.getsize(self.filename) < capacity * self.row_nbytes:
+            os.truncate(self.filename, capacity * self.row_nbytes)
+        if capacity == 0:
+            # mmap cannot map an empty file
+            return
+        self.rows = np.memmap(
+            self.filename,
+            dtype=self.row_dtype,
+            mode="r+",
+            shape=(capacity,) + self.row_shape,
+        )
+
+    def view(self, count: int) -> np.ndarray:
+        """Return the first rows of the file
+
+        Args:
+            count (int): The number of rows in use
+
+        Returns:
+            np.ndarray: A view over the rows, in their stored representation
+        """
+        if self.rows is None:
+            return np.zeros((0,) + self.row_shape, dtype=self.row_dtype)
+        return self.rows[:count]
+
+    def write_row(self, index: int, vector: np.ndarray) -> None:
+        """Store a vector at the given row, growing the file when it is full
+
+        Args:
+            index (int): The row to write
+            vector (np.ndarray): The float32 vector to store
+        """
+        if index >= self.capacity:
+            self.map(max(MIN_CAPACITY, 2 * self.capacity, index + 1))
+        self.rows[index] = self.encode(np.asarray(vector)[np.newaxis, :])[0]
+
+    def write_all(self, vectors: np.ndarray) -> None:
+        """Replace the content of the file with the given vectors
+
+        Args:
+            vectors (np.ndarray): The float32 vectors to store
+        """
+        self.close()
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, "wb") as f:
+            f.write(self.encode(vectors).tobytes())
+        os.replace(tmp_filename, self.filename)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Convert float32 vectors to the stored representation"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if self.precision != "int8":
+            return vectors.astype(self.row_dtype)
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        rows = np.empty(len(vectors), dtype=self.row_dtype)
+        rows["codes"] = np.rint(vectors / scales[:, np.newaxis])
+        rows["scale"] = scales
+        return rows
+
+    def decode(self, rows: np.ndarray) -> np.ndarray:
+        """Convert stored rows back to float32 vectors"""
+        if self.precision != "int8":
+            return np.asarray(rows, dtype=np.float32)
+        return rows["codes"].astype(np.float32) * rows["scale"][:, np.newaxis]
+
+    def score(self, rows: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Compute the dot product of stored rows with one or several queries
+
+        Args:
+            rows (np.ndarray): Rows in their stored representation
+            queries (np.ndarray): A query of shape (dim,) or queries of shape
+                (dim, m)
+
+        Returns:
+            np.ndarray: The scores, of shape (n,) or (n, m)
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.precision == "float32":
+            return np.dot(rows, queries)
+        scores = np.empty((len(rows),) + queries.shape[1:], dtype=np.float32)
+        for start in range(0, len(rows), SCORE_CHUNK_SIZE):
+            chunk = rows[start : start + SCORE_CHUNK_SIZE]
+            if self.precision == "int8":
+                chunk_scores = np.dot(chunk["codes"].astype(np.float32), queries)
+                scale = chunk["scale"]
+                chunk_scores *= scale if queries.ndim == 1 else scale[:, np.newaxis]
+            else:
+                chunk_scores = np.dot(chunk.astype(np.float32), queries)
+            scores[start : start + len(chunk)] = chunk_scores
+        return scores
+
+    def flush(self) -> None:
+        """Write the mapped rows back to disk"""
+        if self.rows is not None:
+            self.rows.flush()
+
+    def close(self) -> None:
+        """Release the memory map"""
+        self.flush()
+        self.rows = None
+
+
+class DecodedView:
+    """Read-only float32 view over rows stored in a lower precision"""
+
+    def __init__(self, vector_file: VectorFile, rows: np.ndarray) -> None:
+        self.vector_file = vector_file
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index) -> np.ndarray:
+        return self.vector_file.decode(self.rows[index])
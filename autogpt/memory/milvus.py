@@ -1,7 +1,12 @@
 """ Milvus memory storage provider."""
 from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections
 
-from autogpt.memory.base import MemoryProviderSingleton, get_ada_embedding
+from autogpt.embeddings import embedding_dimension
+from autogpt.memory.base import (
+    MemoryProviderSingleton,
+    get_ada_embedding,
+    get_ada_embeddings,
+)
 
 
 class MilvusMemory(MemoryProviderSingleton):
@@ -17,7 +22,11 @@ class MilvusMemory(MemoryProviderSingleton):
         connections.connect(address=cfg.milvus_addr)
         fields = [
             FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="embeddings", dtype=DataType.FLOAT_VECTOR, dim=1536),
+            FieldSchema(
+                name="embeddings",
+                dtype=DataType.FLOAT_VECTOR,
+                dim=embedding_dimension(),
+            ),
             FieldSchema(name="raw_text", dtype=DataType.VARCHAR, max_length=65535),
         ]
 
@@ -56,6 +65,22 @@ class MilvusMemory(MemoryProviderSingleton):
         )
         return _text
 
+    def add_many(self, data) -> list[str]:
+        """Add the embeddings of several texts into memory with one insert.
+
+        Args:
+            data (list[str]): The raw texts to construct embedding indexes.
+
+        Returns:
+            list[str]: log of each insert.
+        """
+        embeddings = get_ada_embeddings(data)
+        result = self.collection.insert([embeddings, data])
+        return [
+            f"Inserting data into memory at primary key: {key}:\n data: {item}"
+            for key, item in zip(result.primary_keys, data)
+        ]
+
     def get(self, data):
         """Return the most relevant data in memory.
         Args:
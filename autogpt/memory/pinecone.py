@@ -1,7 +1,7 @@
 import pinecone
 from colorama import Fore, Style
 
-from autogpt.llm_utils import create_embedding_with_ada
+from autogpt.embeddings import embed, embed_many, embedding_dimension
 from autogpt.logs import logger
 from autogpt.memory.base import MemoryProviderSingleton
 
@@ -11,7 +11,7 @@ class PineconeMemory(MemoryProviderSingleton):
         pinecone_api_key = cfg.pinecone_api_key
         pinecone_region = cfg.pinecone_region
         pinecone.init(api_key=pinecone_api_key, environment=pinecone_region)
-        dimension = 1536
+        dimension = embedding_dimension()
         metric = "cosine"
         pod_type = "p1"
         table_name = "auto-gpt"
@@ -44,13 +44,28 @@ class PineconeMemory(MemoryProviderSingleton):
         self.index = pinecone.Index(table_name)
 
     def add(self, data):
-        vector = create_embedding_with_ada(data)
+        vector = embed(data)
         # no metadata here. We may wish to change that long term.
         self.index.upsert([(str(self.vec_num), vector, {"raw_text": data})])
         _text = f"Inserting data into memory at index: {self.vec_num}:\n data: {data}"
         self.vec_num += 1
         return _text
 
+    def add_many(self, data):
+        vectors = embed_many(data)
+        first = self.vec_num
+        self.index.upsert(
+            [
+                (str(first + i), vector, {"raw_text": item})
+                for i, (item, vector) in enumerate(zip(data, vectors))
+            ]
+        )
+        self.vec_num += len(data)
+        return [
+            f"Inserting data into memory at index: {first + i}:\n data: {item}"
+            for i, item in enumerate(data)
+        ]
+
     def get(self, data):
         return self.get_relevant(data, 1)
 
@@ -64,7 +79,7 @@ class PineconeMemory(MemoryProviderSingleton):
         :param data: The data to compare to.
         :param num_relevant: The number of relevant data to return. Defaults to 5
         """
-        query_embedding = create_embedding_with_ada(data)
+        query_embedding = embed(data)
         results = self.index.query(
             query_embedding, top_k=num_relevant, include_metadata=True
         )
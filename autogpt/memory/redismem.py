@@ -10,18 +10,21 @@ from redis.commands.search.field import TextField, VectorField
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
 from redis.commands.search.query import Query
 
-from autogpt.llm_utils import create_embedding_with_ada
+from autogpt.embeddings import embed, embed_many, embedding_dimension
 from autogpt.logs import logger
 from autogpt.memory.base import MemoryProviderSingleton
 
-SCHEMA = [
-    TextField("data"),
-    VectorField(
-        "embedding",
-        "HNSW",
-        {"TYPE": "FLOAT32", "DIM": 1536, "DISTANCE_METRIC": "COSINE"},
-    ),
-]
+
+def create_schema(dimension: int) -> list:
+    """Return the fields of the memory index for embeddings of a dimension"""
+    return [
+        TextField("data"),
+        VectorField(
+            "embedding",
+            "HNSW",
+            {"TYPE": "FLOAT32", "DIM": dimension, "DISTANCE_METRIC": "COSINE"},
+        ),
+    ]
 
 
 class RedisMemory(MemoryProviderSingleton):
@@ -37,7 +40,7 @@ class RedisMemory(MemoryProviderSingleton):
         redis_host = cfg.redis_host
         redis_port = cfg.redis_port
         redis_password = cfg.redis_password
-        self.dimension = 1536
+        self.dimension = embedding_dimension()
         self.redis = redis.Redis(
             host=redis_host,
             port=redis_port,
@@ -67,7 +70,7 @@ class RedisMemory(MemoryProviderSingleton):
             self.redis.flushall()
         try:
             self.redis.ft(f"{cfg.memory_index}").create_index(
-                fields=SCHEMA,
+                fields=create_schema(self.dimension),
                 definition=IndexDefinition(
                     prefix=[f"{cfg.memory_index}:"], index_type=IndexType.HASH
                 ),
@@ -88,7 +91,7 @@ class RedisMemory(MemoryProviderSingleton):
         """
         if "Command Error:" in data:
             return ""
-        vector = create_embedding_with_ada(data)
+        vector = embed(data)
         vector = np.array(vector).astype(np.float32).tobytes()
         data_dict = {b"data": data, "embedding": vector}
         pipe = self.redis.pipeline()
@@ -101,6 +104,36 @@ class RedisMemory(MemoryProviderSingleton):
         pipe.execute()
         return _text
 
+    def add_many(self, data: list[str]) -> list[str]:
+        """
+        Adds several data points to the memory with a single pipeline.
+
+        Args:
+            data: The data to add.
+
+        Returns: Messages indicating that the data has been added.
+        """
+        data = [item for item in data if "Command Error:" not in item]
+        if not data:
+            return []
+        vectors = embed_many(data)
+        pipe = self.redis.pipeline()
+        texts = []
+        for item, vector in zip(data, vectors):
+            data_dict = {
+                b"data": item,
+                "embedding": np.array(vector).astype(np.float32).tobytes(),
+            }
+            pipe.hset(f"{self.cfg.memory_index}:{self.vec_num}", mapping=data_dict)
+            texts.append(
+                f"Inserting data into memory at index: {self.vec_num}:\n"
+                f"data: {item}"
+            )
+            self.vec_num += 1
+        pipe.set(f"{self.cfg.memory_index}-vec_num", self.vec_num)
+        pipe.execute()
+        return texts
+
     def get(self, data: str) -> list[Any] | None:
         """
         Gets the data from the memory that is most relevant to the given data.
@@ -130,7 +163,7 @@ class RedisMemory(MemoryProviderSingleton):
 
         Returns: A list of the most relevant data.
         """
-        query_embedding = create_embedding_with_ada(data)
+        query_embedding = embed(data)
         base_query = f"*=>[KNN {num_relevant} @embedding $vector AS vector_score]"
         query = (
             Query(base_query)
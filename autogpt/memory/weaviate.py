@@ -6,7 +6,11 @@ from weaviate.embedded import EmbeddedOptions
 from weaviate.util import generate_uuid5
 
 from autogpt.config import Config
-from autogpt.memory.base import MemoryProviderSingleton, get_ada_embedding
+from autogpt.memory.base import (
+    MemoryProviderSingleton,
+    get_ada_embedding,
+    get_ada_embeddings,
+)
 
 
 def default_schema(weaviate_index):
@@ -86,6 +90,25 @@ class WeaviateMemory(MemoryProviderSingleton):
 
         return f"Inserting data into memory at uuid: {doc_uuid}:\n data: {data}"
 
+    def add_many(self, data):
+        vectors = get_ada_embeddings(data)
+        texts = []
+
+        with self.client.batch as batch:
+            for item, vector in zip(data, vectors):
+                doc_uuid = generate_uuid5(item, self.index)
+                batch.add_data_object(
+                    uuid=doc_uuid,
+                    data_object={"raw_text": item},
+                    class_name=self.index,
+                    vector=vector,
+                )
+                texts.append(
+                    f"Inserting data into memory at uuid: {doc_uuid}:\n data: {item}"
+                )
+
+        return texts
+
     def get(self, data):
         return self.get_relevant(data, 1)
 
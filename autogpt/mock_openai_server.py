@@ -0,0 +1,239 @@
+"""A local stand-in for the OpenAI API, for tests and offline benchmarks.
+
+Point ``openai.api_base``, or ``OPENAI_API_BASE``, at ``server.url`` to send
+chat completion and embedding requests to it. It answers them from a session
+recording (see ``autogpt.llm_recording``), or with a fixed reply, after a
+configurable latency, streaming when asked to. Like the real API it answers with
+``x-ratelimit-*`` headers, rejects the requests over its request limit with a 429
+and a ``retry-after``, and counts what it received.
+
+Run ``python -m autogpt.mock_openai_server --recording llm_recording.jsonl`` to
+serve a recording to a full Auto-GPT run.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Tuple, Type
+
+import click
+
+from autogpt.llm_recording import LLMRecording, ReplayMissError, recording_key
+
+
+class MockOpenAIServer:
+    """An OpenAI API running on localhost in a background thread"""
+
+    def __init__(
+        self,
+        requests_per_period: int = 1000,
+        period: float = 60.0,
+        reply: str = "ok",
+        recording: LLMRecording | None = None,
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the server
+
+        Args:
+            requests_per_period (int): The request limit of the server
+            period (float): The number of seconds it takes to refill the limit,
+                which the headers report as a minute
+            reply (str): The content of every chat completion, without a recording
+            recording (LLMRecording, optional): The recording answering the
+                requests. Requests missing from it get a 404.
+            latency (float): The number of seconds before every response
+            host (str): The address to listen on
+            port (int): The port to listen on, 0 for any free port
+            clock (Callable[[], float]): The clock refilling the request limit
+        """
+        self.limit = requests_per_period
+        self.period = period
+        self.reply = reply
+        self.recording = recording
+        self.latency = latency
+        self.clock = clock
+        self.received = 0
+        self.throttled = 0
+        self.failures: List[Tuple[int, Dict[str, str]]] = []
+        self._level = float(requests_per_period)
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def fail_next(self, status: int, headers: Dict[str, str] | None = None) -> None:
+        """Answer the next request with an error"""
+        self.failures.append((status, headers or {}))
+
+    def __enter__(self) -> MockOpenAIServer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _admit(self) -> Tuple[int, Dict[str, str]]:
+        """Take a request from the bucket, returning the status and the headers"""
+        with self._lock:
+            self.received += 1
+            if self.failures:
+                return self.failures.pop(0)
+            now = self.clock()
+            rate = self.limit / self.period
+            self._level = min(self.limit, self._level + (now - self._updated) * rate)
+            self._updated = now
+            headers = {"x-ratelimit-limit-requests": str(self.limit)}
+            if self._level < 1:
+                self.throttled += 1
+                headers["x-ratelimit-remaining-requests"] = "0"
+                headers["retry-after"] = f"{(1 - self._level) / rate:.3f}"
+                return 429, headers
+            self._level -= 1
+            headers["x-ratelimit-remaining-requests"] = str(int(self._level))
+            return 200, headers
+
+    def _completion(self, request: Dict[str, Any]) -> str:
+        if self.recording is None:
+            return self.reply
+        return self.recording.completion(
+            recording_key(
+                request.get("model"),
+                request["messages"],
+                request.get("temperature"),
+                request.get("max_tokens"),
+            )
+        )
+
+    def _embeddings(self, request: Dict[str, Any]) -> List[List[float]]:
+        inputs = request["input"]
+        if self.recording is None:
+            return [[float(len(text))] for text in inputs]
+        return self.recording.embeddings(request["model"], inputs)
+
+    def _handler(self) -> Type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                request = json.loads(
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                )
+                status, headers = server._admit()
+                if server.latency:
+                    time.sleep(server.latency)
+                if status != 200:
+                    self.send_json(
+                        status,
+                        headers,
+                        {"error": {"message": "Rate limit reached", "type": "x"}},
+                    )
+                    return
+                try:
+                    if self.path.endswith("/embeddings"):
+                        body = {
+                            "data": [
+                                {"index": i, "embedding": embedding}
+                                for i, embedding in enumerate(
+                                    server._embeddings(request)
+                                )
+                            ]
+                        }
+                    else:
+                        content = server._completion(request)
+                        if request.get("stream"):
+                            self.send_stream(headers, content)
+                            return
+                        body = {
+                            "choices": [
+                                {"message": {"role": "assistant", "content": content}}
+                            ]
+                        }
+                except ReplayMissError as e:
+                    self.send_json(
+                        404, headers, {"error": {"message": str(e), "type": "x"}}
+                    )
+                    return
+                self.send_json(200, headers, body)
+
+            def send_json(
+                self, status: int, headers: Dict[str, str], body: Dict[str, Any]
+            ) -> None:
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_stream(self, headers: Dict[str, str], content: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                # One event per word, as the API sends one per token or so
+                words = content.split(" ")
+                pieces = [{"content": words[0]}]
+                pieces += [{"content": " " + word} for word in words[1:]]
+                for delta in [{"role": "assistant"}, *pieces, {}]:
+                    event = {"choices": [{"index": 0, "delta": delta}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+@click.command()
+@click.option(
+    "--recording",
+    type=click.Path(exists=True, dir_okay=False),
+    help="The session recording to serve, made with LLM_RECORDING=record",
+)
+@click.option("--reply", default="ok", help="The reply without a recording")
+@click.option("--latency", default=0.0, help="Seconds before every response")
+@click.option("--rpm", default=3500, help="Requests accepted per minute")
+@click.option("--host", default="127.0.0.1", help="The address to listen on")
+@click.option("--port", default=8080, help="The port to listen on")
+def main(
+    recording: str | None,
+    reply: str,
+    latency: float,
+    rpm: int,
+    host: str,
+    port: int,
+) -> None:
+    """Serve chat completions and embeddings like the OpenAI API"""
+    server = MockOpenAIServer(
+        requests_per_period=rpm,
+        reply=reply,
+        recording=LLMRecording(recording, "replay") if recording else None,
+        latency=latency,
+        host=host,
+        port=port,
+    )
+    with server:
+        print(f"Serving on {server.url}, set OPENAI_API_BASE to it. Ctrl+C to stop.")
+        try:
+            server._thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""The choice between the fast and the smart model for each call.
+
+Every call site names the model it prefers, ``FAST_LLM_MODEL`` for the agent loop
+and the summaries, ``SMART_LLM_MODEL`` for the AI functions, and the router
+keeps to it unless the request is better served by the other one:
+
+- the prompt and the completion do not fit in the context of the preferred model,
+  but fit in the other's
+- the recent error rate of the preferred model, throttling included, is over
+  ``MODEL_ROUTER_MAX_ERROR_RATE`` while the other's is not
+- the recent latency of the preferred model is over
+  ``MODEL_ROUTER_LATENCY_BUDGET`` and the other one was measured faster
+
+Recent means over the last ``window`` seconds, so a model left aside is tried
+again once its failures are forgotten. A request timing out after
+``LLM_REQUEST_TIMEOUT`` is retried on the other model. Every decision is appended
+as a JSON line to ``MODEL_ROUTER_LOG`` for offline analysis.
+"""
+from __future__ import annotations
+
+import collections
+import dataclasses
+import json
+import os
+import threading
+import time
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from autogpt.config import Config
+from autogpt.llm_models import token_limit
+
+_router: ModelRouter | None = None
+
+
+@dataclasses.dataclass
+class ModelStats:
+    """What was observed of the recent requests to a model"""
+
+    requests: int = 0
+    latency: float = 0.0
+    error_rate: float = 0.0
+
+
+@dataclasses.dataclass
+class RoutingDecision:
+    """The model chosen for a call, and why"""
+
+    call_site: str
+    preferred: str
+    model: str
+    reason: str
+    prompt_tokens: int
+    max_tokens: int
+
+
+class ModelRouter:
+    """Pick the model of each call from its size and the health of the models"""
+
+    def __init__(
+        self,
+        cfg: Config,
+        log_file: str | None = None,
+        window: float = 300.0,
+        min_requests: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the router
+
+        Args:
+            cfg (Config): The config holding the models, their token limits and
+                the routing settings, read on every call
+            log_file (str, optional): The JSON lines file the decisions are
+                appended to. Defaults to None, not logging them.
+            window (float): The number of seconds the requests are remembered
+            min_requests (int): The number of recent requests to a model needed
+                to judge its latency and error rate
+            clock (Callable[[], float]): The clock timing the window
+        """
+        self.cfg = cfg
+        self.log_file = log_file
+        self.window = window
+        self.min_requests = min_requests
+        self.clock = clock
+        self.decisions: Dict[str, int] = collections.Counter()
+        self._outcomes: Dict[str, Deque[Tuple[float, float, bool]]] = {}
+        self._lock = threading.Lock()
+
+    def route(
+        self, call_site: str, preferred: str, prompt_tokens: int, max_tokens: int = 0
+    ) -> str:
+        """Choose the model of a call
+
+        Args:
+            call_site (str): What the call is for, in the log
+            preferred (str): The model the call site would use
+            prompt_tokens (int): The estimated size of the prompt
+            max_tokens (int): The number of tokens kept for the completion
+
+        Returns:
+            str: The model to send the call to
+        """
+        other = self.alternative(preferred)
+        model, reason = preferred, "preferred"
+        if other is not None:
+            needed = prompt_tokens + max_tokens
+            stats, other_stats = self.stats(preferred), self.stats(other)
+            max_error_rate = self.cfg.model_router_max_error_rate
+            latency_budget = self.cfg.model_router_latency_budget
+            if needed > self.token_limit(preferred) and needed <= self.token_limit(
+                other
+            ):
+                model, reason = other, "context"
+            elif (
+                stats.requests >= self.min_requests
+                and stats.error_rate > max_error_rate
+                and other_stats.error_rate <= max_error_rate
+            ):
+                model, reason = other, "errors"
+            elif (
+                latency_budget
+                and stats.requests >= self.min_requests
+                and stats.latency > latency_budget
+                and other_stats.requests >= self.min_requests
+                and other_stats.latency < stats.latency
+                and needed <= self.token_limit(other)
+            ):
+                model, reason = other, "latency"
+        self._log(
+            RoutingDecision(
+                call_site, preferred, model, reason, prompt_tokens, max_tokens
+            )
+        )
+        return model
+
+    def fallback(self, model: str, call_site: str = "retry") -> Optional[str]:
+        """Choose the model retrying a request that timed out, if any"""
+        other = self.alternative(model)
+        if other is None or not self.cfg.model_router_fallback:
+            return None
+        self._log(RoutingDecision(call_site, model, other, "timeout", 0, 0))
+        return other
+
+    def alternative(self, model: str) -> Optional[str]:
+        """The other model a call preferring this one can be routed to"""
+        fast, smart = self.cfg.fast_llm_model, self.cfg.smart_llm_model
+        if fast == smart:
+            return None
+        return {fast: smart, smart: fast}.get(model)
+
+    def token_limit(self, model: str) -> float:
+        """The configured token limit of a model, capped to its context size"""
+        limits = {
+            self.cfg.fast_llm_model: self.cfg.fast_token_limit,
+            self.cfg.smart_llm_model: self.cfg.smart_token_limit,
+        }
+        return token_limit(model, limits.get(model, float("inf")))
+
+    def record(self, model: str, latency: float, failed: bool = False) -> None:
+        """Record the outcome of a request to a model
+
+        Args:
+            model (str): The model of the request
+            latency (float): The number of seconds until the response
+            failed (bool): Whether the request failed or was throttled
+        """
+        with self._lock:
+            outcomes = self._outcomes.setdefault(model, collections.deque())
+            outcomes.append((self.clock(), latency, failed))
+
+    def stats(self, model: str) -> ModelStats:
+        """Summarize the recent requests to a model"""
+        with self._lock:
+            outcomes = self._outcomes.get(model, collections.deque())
+            expired = self.clock() - self.window
+            while outcomes and outcomes[0][0] < expired:
+                outcomes.popleft()
+            if not outcomes:
+                return ModelStats()
+            succeeded = [latency for _, latency, failed in outcomes if not failed]
+            return ModelStats(
+                requests=len(outcomes),
+                latency=sum(succeeded) / len(succeeded) if succeeded else 0.0,
+                error_rate=1 - len(succeeded) / len(outcomes),
+            )
+
+    def report(self) -> str:
+        """Describe the decisions made so far"""
+        return "Model routing: " + ", ".join(
+            f"{count} {reason}" for reason, count in sorted(self.decisions.items())
+        )
+
+    def _log(self, decision: RoutingDecision) -> None:
+        with self._lock:
+            self.decisions[decision.reason] += 1
+        if not self.log_file:
+            return
+        stats = self.stats(decision.preferred)
+        entry = {
+            "time": time.time(),
+            **dataclasses.asdict(decision),
+            "latency": round(stats.latency, 3),
+            "error_rate": round(stats.error_rate, 3),
+        }
+        with self._lock:
+            directory = os.path.dirname(self.log_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def get_model_router() -> ModelRouter:
+    """Return the model router shared by every LLM call"""
+    global _router
+    if _router is None:
+        cfg = Config()
+        _router = ModelRouter(cfg, cfg.model_router_log or None)
+    return _router
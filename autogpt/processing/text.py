@@ -3,20 +3,35 @@ from typing import Dict, Generator, Optional
 
 from selenium.webdriver.remote.webdriver import WebDriver
 
+from autogpt.budget import get_budget
 from autogpt.config import Config
-from autogpt.llm_utils import create_chat_completion
+from autogpt.llm_utils import (
+    acreate_chat_completion,
+    create_chat_completion,
+    route_model,
+    run_concurrently,
+)
 from autogpt.memory import get_memory
+from autogpt.model_router import get_model_router
+from autogpt.token_counter import count_string_tokens
 
 CFG = Config()
 MEMORY = get_memory(CFG)
 
+# Tokens of a summary request kept for the question and the summary
+SUMMARY_RESERVED_TOKENS = 1000
 
-def split_text(text: str, max_length: int = 8192) -> Generator[str, None, None]:
+
+def split_text(
+    text: str, max_length: int = 8192, model: Optional[str] = None
+) -> Generator[str, None, None]:
     """Split text into chunks of a maximum length
 
     Args:
         text (str): The text to split
         max_length (int, optional): The maximum length of each chunk. Defaults to 8192.
+        model (str, optional): The model whose tokens measure the length. Defaults
+            to None, measuring it in characters.
 
     Yields:
         str: The next chunk of text
@@ -29,13 +44,16 @@ def split_text(text: str, max_length: int = 8192) -> Generator[str, None, None]:
     current_chunk = []
 
     for paragraph in paragraphs:
-        if current_length + len(paragraph) + 1 <= max_length:
+        length = (
+            len(paragraph) if model is None else count_string_tokens(paragraph, model)
+        ) + 1
+        if current_length + length <= max_length:
             current_chunk.append(paragraph)
-            current_length += len(paragraph) + 1
+            current_length += length
         else:
             yield "\n".join(current_chunk)
             current_chunk = [paragraph]
-            current_length = len(paragraph) + 1
+            current_length = length
 
     if current_chunk:
         yield "\n".join(current_chunk)
@@ -61,44 +79,70 @@ def summarize_text(
     text_length = len(text)
     print(f"Text length: {text_length} characters")
 
-    summaries = []
-    chunks = list(split_text(text))
-    scroll_ratio = 1 / len(chunks)
-
-    for i, chunk in enumerate(chunks):
-        if driver:
-            scroll_to_percentage(driver, scroll_ratio * i)
-        print(f"Adding chunk {i + 1} / {len(chunks)} to memory")
+    chunks = list(split_text(text, max_chunk_tokens(), CFG.fast_llm_model))
 
-        memory_to_add = f"Source: {url}\n" f"Raw content part#{i + 1}: {chunk}"
+    print(f"Adding {len(chunks)} chunks to memory")
+    MEMORY.add_many(
+        [
+            f"Source: {url}\n" f"Raw content part#{i + 1}: {chunk}"
+            for i, chunk in enumerate(chunks)
+        ]
+    )
 
-        MEMORY.add(memory_to_add)
+    # The page follows the summaries, scrolled past the chunks summarized in order
+    summarized = [False] * len(chunks)
 
-        print(f"Summarizing chunk {i + 1} / {len(chunks)}")
+    async def summarize_chunk(i: int, chunk: str) -> str:
         messages = [create_message(chunk, question)]
-
-        summary = create_chat_completion(
-            model=CFG.fast_llm_model,
+        summary = await acreate_chat_completion(
+            model=route_model(
+                "summarize", CFG.fast_llm_model, [m["content"] for m in messages]
+            ),
             messages=messages,
+            max_tokens=get_budget().summary_tokens(),
         )
-        summaries.append(summary)
-        print(f"Added chunk {i + 1} summary to memory")
-
-        memory_to_add = f"Source: {url}\n" f"Content summary part#{i + 1}: {summary}"
-
-        MEMORY.add(memory_to_add)
+        print(f"Summarized chunk {i + 1} / {len(chunks)}")
+        summarized[i] = True
+        if driver and all(summarized[:i]):
+            done = summarized.index(False) if False in summarized else len(chunks)
+            scroll_to_percentage(driver, done / len(chunks))
+        return summary
+
+    # The chunks are independent, so their summaries are requested concurrently
+    summaries = run_concurrently(
+        summarize_chunk(i, chunk) for i, chunk in enumerate(chunks)
+    )
 
+    MEMORY.add_many(
+        [
+            f"Source: {url}\n" f"Content summary part#{i + 1}: {summary}"
+            for i, summary in enumerate(summaries)
+        ]
+    )
     print(f"Summarized {len(chunks)} chunks.")
 
     combined_summary = "\n".join(summaries)
     messages = [create_message(combined_summary, question)]
 
     return create_chat_completion(
-        model=CFG.fast_llm_model,
+        model=route_model(
+            "summarize", CFG.fast_llm_model, [m["content"] for m in messages]
+        ),
         messages=messages,
+        max_tokens=get_budget().summary_tokens(),
     )
 
 
+def max_chunk_tokens() -> int:
+    """The number of tokens of the chunks summarized
+
+    A summary request then fits in the context of the fast model, along with its
+    question and its answer.
+    """
+    limit = get_model_router().token_limit(CFG.fast_llm_model)
+    return int(limit) - SUMMARY_RESERVED_TOKENS
+
+
 def scroll_to_percentage(driver: WebDriver, ratio: float) -> None:
     """Scroll to a percentage of the page
 
@@ -0,0 +1,297 @@
+"""Client-side rate limiting of the OpenAI API.
+
+OpenAI limits the requests and the tokens sent per minute, per model, and Azure
+per deployment. Every response carries the limits and what is left of them in
+``x-ratelimit-*`` headers, and a throttled request carries a ``retry-after``.
+
+The limiter keeps a token bucket per limit and per model and deployment, fed by
+those headers, and tells callers how long to wait before sending a request so
+that it does not come back with a 429. Until the headers of a model have been
+seen, its requests are not delayed.
+
+It also sets how many requests run at the same time, halving the concurrency
+when a request is throttled and growing it back slowly on success.
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Mapping, Optional, Tuple
+
+RateLimitKey = Tuple[Optional[str], Optional[str]]
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+_limiter: RateLimiter | None = None
+
+
+class TokenBucket:
+    """A budget refilled at a constant rate, up to its capacity
+
+    Reservations may overdraw the bucket, in which case the caller waits for
+    the debt to be refilled. This queues the callers in the order they came.
+    """
+
+    def __init__(self, capacity: float, period: float, now: float) -> None:
+        """Initialize a full bucket
+
+        Args:
+            capacity (float): The size of the bucket
+            period (float): The number of seconds it takes to refill it
+            now (float): The current time
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.level = capacity
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take an amount from the bucket
+
+        Args:
+            amount (float): The amount to take
+            now (float): The current time
+
+        Returns:
+            float: The number of seconds to wait before using the amount
+        """
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def update(
+        self, capacity: float, remaining: float, period: float, now: float
+    ) -> None:
+        """Adjust the bucket to the limits reported by the server"""
+        self._refill(now)
+        self.capacity = capacity
+        self.rate = capacity / period
+        # What is left server side can only be lower than the local estimate,
+        # e.g. when other clients share the key
+        self.level = min(self.level, remaining)
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class _ModelLimits:
+    """The buckets of one model or deployment"""
+
+    def __init__(self) -> None:
+        self.requests: TokenBucket | None = None
+        self.tokens: TokenBucket | None = None
+        self.blocked_until = 0.0
+
+
+class RateLimiter:
+    """Schedule requests under the rate limits reported by the API"""
+
+    def __init__(
+        self, period: float = 60.0, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """Initialize the limiter
+
+        Args:
+            period (float): The number of seconds the reported limits apply to
+            clock (Callable[[], float]): The clock measuring time
+        """
+        self.period = period
+        self.clock = clock
+        self.throttled_requests = 0
+        self._limits: Dict[RateLimitKey, _ModelLimits] = {}
+        self._window: float | None = None
+        self._last_concurrency = 1
+        self._lock = threading.Lock()
+
+    def reserve(self, key: RateLimitKey, tokens: int) -> float:
+        """Account for a request about to be sent
+
+        Args:
+            key (RateLimitKey): The model and deployment the request is sent to
+            tokens (int): The estimated number of tokens of the request
+
+        Returns:
+            float: The number of seconds to wait before sending it
+        """
+        with self._lock:
+            now = self.clock()
+            limits = self._limits.setdefault(key, _ModelLimits())
+            delay = max(0.0, limits.blocked_until - now)
+            if limits.requests is not None:
+                delay = max(delay, limits.requests.reserve(1, now))
+            if limits.tokens is not None:
+                delay = max(delay, limits.tokens.reserve(tokens, now))
+            return delay
+
+    def observe(self, key: RateLimitKey, headers: Mapping[str, str]) -> None:
+        """Learn from the headers of a successful response
+
+        Args:
+            key (RateLimitKey): The model and deployment the request was sent to
+            headers (Mapping[str, str]): The headers of the response, if known
+        """
+        with self._lock:
+            self._update(key, headers)
+            if self._window is not None:
+                # Additive increase, about one more request per window of
+                # successful ones
+                self._window += 1 / self._window
+
+    def throttled(self, key: RateLimitKey, headers: Mapping[str, str]) -> float | None:
+        """Learn from a request rejected with a 429
+
+        Args:
+            key (RateLimitKey): The model and deployment the request was sent to
+            headers (Mapping[str, str]): The headers of the error response
+
+        Returns:
+            float | None: The number of seconds the server asked to wait, if any
+        """
+        with self._lock:
+            self.throttled_requests += 1
+            headers = self._update(key, headers)
+            self._window = max(1.0, self._last_concurrency / 2)
+            retry_after = _retry_after(headers)
+            if retry_after is not None:
+                limits = self._limits[key]
+                limits.blocked_until = max(
+                    limits.blocked_until, self.clock() + retry_after
+                )
+            return retry_after
+
+    def concurrency(self, max_concurrency: int) -> int:
+        """The number of requests to run at the same time
+
+        Args:
+            max_concurrency (int): The configured maximum
+
+        Returns:
+            int: The maximum, or less after requests were throttled
+        """
+        with self._lock:
+            if self._window is not None and self._window >= max_concurrency:
+                # Fully recovered
+                self._window = None
+            if self._window is None:
+                self._last_concurrency = max_concurrency
+            else:
+                self._last_concurrency = max(1, int(self._window))
+            return self._last_concurrency
+
+    def _update(self, key: RateLimitKey, headers: Mapping[str, str]) -> dict:
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        limits = self._limits.setdefault(key, _ModelLimits())
+        now = self.clock()
+        for kind in ("requests", "tokens"):
+            try:
+                limit = float(headers[f"x-ratelimit-limit-{kind}"])
+                remaining = float(headers[f"x-ratelimit-remaining-{kind}"])
+            except (KeyError, ValueError):
+                continue
+            if limit <= 0:
+                continue
+            bucket = getattr(limits, kind)
+            if bucket is None:
+                bucket = TokenBucket(limit, self.period, now)
+                setattr(limits, kind, bucket)
+            bucket.update(limit, remaining, self.period, now)
+        return headers
+
+
+class AdaptiveSemaphore:
+    """An asyncio semaphore whose number of slots can change while in use
+
+    Like asyncio semaphores, it belongs to the event loop it is first used on.
+    """
+
+    def __init__(self, slots: Callable[[], int]) -> None:
+        """Initialize the semaphore
+
+        Args:
+            slots (Callable[[], int]): Returns the current number of slots
+        """
+        self.slots = slots
+        self.in_use = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def locked(self) -> bool:
+        """Whether acquiring would wait"""
+        return self.in_use >= self.slots()
+
+    async def acquire(self) -> None:
+        """Wait for a free slot and take it"""
+        while self.locked():
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                self._waiters.remove(waiter)
+        self.in_use += 1
+
+    def release(self) -> None:
+        """Free a slot"""
+        self.in_use -= 1
+        # The number of slots may have changed, let every waiter check again
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+
+def parse_duration(value: str) -> float | None:
+    """Parse a duration of the rate limit headers, such as "6m0s" or "20ms"
+
+    Returns:
+        float | None: The number of seconds, or None if it cannot be parsed
+    """
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def estimate_tokens(texts) -> int:
+    """Estimate the tokens of a request the way the rate limits count them
+
+    The limits count about four characters per token, so there is no need to
+    run the tokenizer.
+    """
+    return sum(len(text) for text in texts) // 4
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the rate limiter shared by every OpenAI call"""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
+
+
+def _retry_after(headers: Mapping[str, str]) -> float | None:
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if "retry-after" in headers:
+        return parse_duration(headers["retry-after"])
+    # Otherwise wait for the exhausted limit to be reset
+    for kind in ("requests", "tokens"):
+        reset = headers.get(f"x-ratelimit-reset-{kind}")
+        if reset is not None and headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+            return parse_duration(reset)
+    return None
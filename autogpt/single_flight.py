@@ -0,0 +1,141 @@
+"""Coalescing of identical requests made at the same time.
+
+When several callers, threads or tasks, make the same request while a first one
+is still in flight, they wait for its result instead of sending their own.
+Nothing is kept once the request is over: this is not a cache, it only
+removes the duplicates of requests that overlap in time.
+"""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass
+class CoalescingMetrics:
+    """Counters of the requests that went through a single-flight group"""
+
+    requests: int = 0
+    coalesced: int = 0
+
+    @property
+    def coalesced_rate(self) -> float:
+        """The share of the requests that shared the call of another"""
+        return self.coalesced / self.requests if self.requests else 0.0
+
+
+class _Call:
+    """A synchronous call in flight"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class _Flight:
+    """An asynchronous call in flight"""
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Share one call between the identical requests in flight"""
+
+    def __init__(self, name: str) -> None:
+        """Initialize the group
+
+        Args:
+            name (str): What the requests are, for reports
+        """
+        self.name = name
+        self.metrics = CoalescingMetrics()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._flights: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, Dict[Hashable, _Flight]
+        ] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable[[], T]) -> T:
+        """Call a function, or wait for the call in flight with the same key
+
+        Args:
+            key (Hashable): What identifies the request
+            function (Callable[[], T]): Makes the request
+
+        Returns:
+            T: The result of the call, shared with the other callers
+        """
+        with self._lock:
+            self.metrics.requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.metrics.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> T:
+        """Await a coroutine, or the one in flight with the same key
+
+        The call runs in its own task, so a caller being cancelled does not
+        cancel it for the others. It is cancelled once every caller is gone.
+
+        Args:
+            key (Hashable): What identifies the request
+            function (Callable[[], Awaitable[T]]): Makes the request
+
+        Returns:
+            T: The result of the call, shared with the other callers
+        """
+        # Tasks belong to the event loop they were created on
+        loop = asyncio.get_running_loop()
+        flights = self._flights.setdefault(loop, {})
+        flight = flights.get(key)
+        with self._lock:
+            self.metrics.requests += 1
+            self.metrics.coalesced += flight is not None
+        if flight is None:
+            flight = flights[key] = _Flight(asyncio.ensure_future(function()))
+            flight.task.add_done_callback(lambda _: flights.pop(key, None))
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                flight.task.cancel()
+                # Let the call clean up, e.g. free its concurrency slot
+                await asyncio.wait([flight.task])
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def report(self) -> str:
+        """Describe the requests coalesced so far"""
+        return (
+            f"Coalesced {self.name}: {self.metrics.coalesced} of"
+            f" {self.metrics.requests} requests"
+            f" ({self.metrics.coalesced_rate:.0%})"
+        )
@@ -45,6 +45,12 @@ class Spinner:
             exc_value (Exception): The exception value.
             exc_traceback (Exception): The exception traceback.
         """
+        self.stop()
+
+    def stop(self) -> None:
+        """Stop the spinner before the end of its block, e.g. to print something"""
+        if not self.running:
+            return
         self.running = False
         if self.spinner_thread is not None:
             self.spinner_thread.join()
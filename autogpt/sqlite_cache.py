@@ -0,0 +1,126 @@
+"""Disk-backed LRU caches in a SQLite table, capped in bytes.
+
+Each cache is a table keyed by ``key`` with a ``last_used`` column, whose values
+count towards the size cap. The total size of the values is read once when the
+cache is opened, then kept up to date as entries are inserted, replaced, deleted
+and evicted, so storing an entry does not scan the table.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from typing import Iterable, Sequence, Tuple
+
+
+class SQLiteLRUCache:
+    """Base of the caches evicting their least recently used entries
+
+    Subclasses set the table, the statements creating it and the SQL expression
+    of the size of a value, then store their rows with ``_insert``.
+    """
+
+    table: str
+    schema: Tuple[str, ...]
+    # The size of the value of a row, in bytes
+    size_expression: str
+
+    def __init__(self, filename: str, max_size: int) -> None:
+        """Open the cache, creating the file if needed
+
+        Args:
+            filename (str): The path of the SQLite file
+            max_size (int): The maximum total size of the values, in bytes
+        """
+        self.filename = filename
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cnx = sqlite3.connect(filename, check_same_thread=False)
+        for statement in self.schema:
+            self._cnx.execute(statement)
+        self._cnx.commit()
+        self._size = self._cnx.execute(
+            f"SELECT COALESCE(SUM({self.size_expression}), 0) FROM {self.table}"
+        ).fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        """The share of lookups answered by the cache since it was opened"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def size(self) -> int:
+        """The total size of the cached values, in bytes"""
+        with self._lock:
+            return self._size
+
+    def close(self) -> None:
+        """Close the database"""
+        with self._lock:
+            self._cnx.close()
+
+    def _insert(self, rows: Sequence[tuple], sizes: Sequence[int]) -> None:
+        """Insert or replace rows, keyed by their first column, and evict
+
+        Args:
+            rows (Sequence[tuple]): The rows, in the column order of the table
+            sizes (Sequence[int]): The size of the value of each row
+        """
+        if not rows:
+            return
+        # The last row of a key wins, as it would in the table
+        latest = {row[0]: (row, size) for row, size in zip(rows, sizes)}
+        self._size -= self._stored_size(latest)
+        self._cnx.executemany(
+            f"INSERT OR REPLACE INTO {self.table}"
+            f" VALUES ({', '.join('?' * len(rows[0]))})",
+            [row for row, _ in latest.values()],
+        )
+        self._size += sum(size for _, size in latest.values())
+        self._evict()
+
+    def _delete(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        self._size -= self._stored_size(keys)
+        self._cnx.executemany(
+            f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in keys]
+        )
+
+    def _touch(self, keys: Iterable[str], now: float) -> None:
+        self._cnx.executemany(
+            f"UPDATE {self.table} SET last_used = ? WHERE key = ?",
+            [(now, key) for key in keys],
+        )
+
+    def _evict(self) -> None:
+        excess = self._size - self.max_size
+        if excess <= 0:
+            return
+        # Walk the entries from the least recently used one until enough
+        # bytes are freed
+        freed = 0
+        evicted = []
+        for key, size in self._cnx.execute(
+            f"SELECT key, {self.size_expression} FROM {self.table}"
+            " ORDER BY last_used"
+        ):
+            evicted.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._cnx.executemany(f"DELETE FROM {self.table} WHERE key = ?", evicted)
+        self._size -= freed
+
+    def _stored_size(self, keys: Iterable[str]) -> int:
+        """The size of the values stored under some keys"""
+        keys = list(keys)
+        size = 0
+        for i in range(0, len(keys), 500):
+            chunk = keys[i : i + 500]
+            size += self._cnx.execute(
+                f"SELECT COALESCE(SUM({self.size_expression}), 0) FROM {self.table}"
+                f" WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchone()[0]
+        return size
@@ -0,0 +1,190 @@
+"""A ledger of the LLM calls of a run: latency, token usage and cost.
+
+Every chat completion and embedding request sent to the API is recorded with:
+
+- the function that asked for it and the command being executed, if any
+- its model, prompt and completion tokens, and estimated cost
+- its wall time and number of retries
+
+The calls are appended as JSON lines to ``LLM_LEDGER_FILE``, and totalled by
+command, call site and model for the summary printed at the end of the run.
+Calls answered by a cache, by another identical call or by a replayed recording
+cost nothing and are not recorded.
+
+Tokens are counted by the API when it reports them. The streamed completions and
+the embeddings are estimated at four characters per token.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import dataclasses
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+from autogpt.config import Config
+from autogpt.llm_models import get_model_info
+
+_ledger: LLMLedger | None = None
+
+_command: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "command", default=None
+)
+
+
+@dataclasses.dataclass
+class LLMCall:
+    """One request to the API, retries included"""
+
+    kind: str
+    model: Optional[str]
+    call_site: str
+    command: Optional[str]
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+    retries: int = 0
+    estimated: bool = False
+
+    @property
+    def cost(self) -> float:
+        """The estimated price of the call, in US dollars"""
+        prompt_price, completion_price = model_prices(self.model)
+        return (
+            self.prompt_tokens * prompt_price
+            + self.completion_tokens * completion_price
+        ) / 1000
+
+
+@dataclasses.dataclass
+class LedgerTotals:
+    """The sums of a group of calls"""
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    latency: float = 0.0
+    retries: int = 0
+
+    def add(self, call: LLMCall) -> None:
+        self.calls += 1
+        self.prompt_tokens += call.prompt_tokens
+        self.completion_tokens += call.completion_tokens
+        self.cost += call.cost
+        self.latency += call.latency
+        self.retries += call.retries
+
+
+class LLMLedger:
+    """Record the LLM calls of a run and total them"""
+
+    def __init__(self, filename: str | None = None) -> None:
+        """Initialize the ledger
+
+        Args:
+            filename (str, optional): The JSON lines file the calls are appended
+                to. Defaults to None, keeping only the totals.
+        """
+        self.filename = filename
+        self.total = LedgerTotals()
+        self.by_command: Dict[str, LedgerTotals] = {}
+        self.by_call_site: Dict[str, LedgerTotals] = {}
+        self.by_model: Dict[str, LedgerTotals] = {}
+        self._lock = threading.Lock()
+
+    def record(self, call: LLMCall) -> None:
+        """Add a call to the ledger"""
+        with self._lock:
+            self.total.add(call)
+            for totals, key in (
+                (self.by_command, call.command or "agent"),
+                (self.by_call_site, call.call_site),
+                (self.by_model, call.model or "default"),
+            ):
+                totals.setdefault(key, LedgerTotals()).add(call)
+            if not self.filename:
+                return
+            entry = {
+                "time": time.time(),
+                **dataclasses.asdict(call),
+                "cost": round(call.cost, 6),
+            }
+            directory = os.path.dirname(self.filename)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.filename, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def summary(self) -> str:
+        """Describe where the tokens, the money and the time went"""
+        with self._lock:
+            lines = [
+                f"LLM calls: {self.total.calls}, {self.total.prompt_tokens} prompt"
+                f" and {self.total.completion_tokens} completion tokens,"
+                f" ${self.total.cost:.4f}, {self.total.latency:.1f} s,"
+                f" {self.total.retries} retries"
+            ]
+            for title, groups in (
+                ("command", self.by_command),
+                ("call site", self.by_call_site),
+                ("model", self.by_model),
+            ):
+                lines.append(f"By {title}:")
+                for name, totals in sorted(
+                    groups.items(), key=lambda item: item[1].cost, reverse=True
+                ):
+                    lines.append(
+                        f"  {name}: {totals.calls} calls,"
+                        f" {totals.prompt_tokens + totals.completion_tokens} tokens,"
+                        f" ${totals.cost:.4f}, {totals.latency:.1f} s"
+                    )
+            return "\n".join(lines)
+
+
+def model_prices(model: str | None) -> Tuple[float, float]:
+    """The prices of a model per 1000 prompt and completion tokens, 0 if unknown"""
+    info = get_model_info(model)
+    return info.prompt_price, info.completion_price
+
+
+@contextlib.contextmanager
+def llm_command(name: str) -> Iterator[None]:
+    """Attribute the LLM calls made in the block to a command"""
+    token = _command.set(name)
+    try:
+        yield
+    finally:
+        _command.reset(token)
+
+
+def current_command() -> Optional[str]:
+    """The command the LLM calls are made for, None in the agent loop"""
+    return _command.get()
+
+
+def call_site(*skip: str) -> str:
+    """The name of the first function up the stack outside some modules
+
+    Args:
+        *skip (str): The names of the modules making the call, e.g. __name__
+
+    Returns:
+        str: The name of the function that called into the modules
+    """
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_globals.get("__name__") in skip:
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else "unknown"
+
+
+def get_ledger() -> LLMLedger:
+    """Return the ledger of the LLM calls of this run"""
+    global _ledger
+    if _ledger is None:
+        _ledger = LLMLedger(Config().llm_ledger_file or None)
+    return _ledger
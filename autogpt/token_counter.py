@@ -1,10 +1,104 @@
-"""Functions for counting the number of tokens in a message or string."""
+"""Functions for counting the number of tokens in a message or string.
+
+The encodings are read from ``TIKTOKEN_CACHE_DIR``, and only downloaded when
+missing from it. Running ``python -m autogpt.token_counter`` where the network is
+available fills the directory, which can then be copied to offline machines, as
+the Docker image does.
+"""
 from __future__ import annotations
 
+import functools
+import threading
+from typing import Dict, Iterable, Tuple
+
+import click
+import requests
 import tiktoken
 
+from autogpt.config import Config
+from autogpt.llm_models import DEFAULT_MODEL, MODELS, get_model_info, is_known_model
 from autogpt.logs import logger
 
+CFG = Config()
+
+# The number of messages whose token counts are remembered, a few long histories
+MESSAGE_TOKENS_CACHE_SIZE = 4096
+
+# tiktoken looks the encoding of a model up by name on every call
+_encodings: Dict[str, tiktoken.Encoding] = {}
+# Held while an encoding is built, so that a warm-up in progress is waited for
+_encodings_lock = threading.Lock()
+
+
+class EncodingUnavailableError(RuntimeError):
+    """An encoding neither in the cache directory nor downloadable"""
+
+
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """Return the encoding of a model, built once per process
+
+    Args:
+        model (str): The name of the model
+
+    Returns:
+        tiktoken.Encoding: Its encoding, cl100k_base if the model is unknown
+
+    Raises:
+        EncodingUnavailableError: If the encoding is not cached and the network is
+            unavailable
+    """
+    encoding = _encodings.get(model)
+    if encoding is not None:
+        return encoding
+    with _encodings_lock:
+        encoding = _encodings.get(model)
+        if encoding is None:
+            if not is_known_model(model):
+                logger.warn(
+                    f"Warning: model {model} not found. Using cl100k_base encoding."
+                )
+            encoding = _load_encoding(get_model_info(model).encoding)
+            _encodings[model] = encoding
+    return encoding
+
+
+def warm_up_encodings(models: Iterable[str]) -> threading.Thread:
+    """Build the encodings of some models in the background
+
+    The first count of tokens then does not wait for the encoding to be read,
+    or downloaded, unless the warm-up is still in progress.
+
+    Args:
+        models (Iterable[str]): The names of the models
+
+    Returns:
+        threading.Thread: The thread building the encodings
+    """
+
+    def warm_up() -> None:
+        for model in models:
+            try:
+                get_encoding(model)
+            except EncodingUnavailableError as e:
+                logger.warn(str(e))
+
+    thread = threading.Thread(target=warm_up, name="encodings warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def _load_encoding(name: str) -> tiktoken.Encoding:
+    # tiktoken looks for the file in TIKTOKEN_CACHE_DIR, set by the config, before
+    # downloading it
+    try:
+        return tiktoken.get_encoding(name)
+    except requests.exceptions.RequestException as e:
+        raise EncodingUnavailableError(
+            f"The {name} encoding is not in {CFG.tiktoken_cache_dir} and"
+            " could not be downloaded. Run `python -m autogpt.token_counter` with"
+            " network access to cache it."
+        ) from e
+
 
 def count_message_tokens(
     messages: list[dict[str, str]], model: str = "gpt-3.5-turbo-0301"
@@ -12,6 +106,9 @@ def count_message_tokens(
     """
     Returns the number of tokens used by a list of messages.
 
+    The overheads of the chat markup are read from the model table, see
+    autogpt.llm_models.
+
     Args:
         messages (list): A list of messages, each of which is a dictionary
             containing the role and content of the message.
@@ -21,43 +118,26 @@ def count_message_tokens(
     Returns:
         int: The number of tokens used by the list of messages.
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        logger.warn("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    if model == "gpt-3.5-turbo":
-        # !Note: gpt-3.5-turbo may change over time.
-        # Returning num tokens assuming gpt-3.5-turbo-0301.")
-        return count_message_tokens(messages, model="gpt-3.5-turbo-0301")
-    elif model == "gpt-4":
-        # !Note: gpt-4 may change over time. Returning num tokens assuming gpt-4-0314.")
-        return count_message_tokens(messages, model="gpt-4-0314")
-    elif model == "gpt-3.5-turbo-0301":
-        tokens_per_message = (
-            4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-        )
-        tokens_per_name = -1  # if there's a name, the role is omitted
-    elif model == "gpt-4-0314":
-        tokens_per_message = 3
-        tokens_per_name = 1
-    else:
-        raise NotImplementedError(
-            f"num_tokens_from_messages() is not implemented for model {model}.\n"
-            " See https://github.com/openai/openai-python/blob/main/chatml.md for"
-            " information on how messages are converted to tokens."
-        )
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":
-                num_tokens += tokens_per_name
+    # The messages of a history are counted again on every step, but encoded once
+    num_tokens = sum(
+        _count_message_tokens(tuple(message.items()), model) for message in messages
+    )
     num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
     return num_tokens
 
 
+@functools.lru_cache(maxsize=MESSAGE_TOKENS_CACHE_SIZE)
+def _count_message_tokens(items: Tuple[Tuple[str, str], ...], model: str) -> int:
+    info = get_model_info(model)
+    encoding = get_encoding(model)
+    num_tokens = info.tokens_per_message
+    for key, value in items:
+        num_tokens += len(encoding.encode(value))
+        if key == "name":
+            num_tokens += info.tokens_per_name
+    return num_tokens
+
+
 def count_string_tokens(string: str, model_name: str) -> int:
     """
     Returns the number of tokens in a text string.
@@ -69,5 +149,24 @@ def count_string_tokens(string: str, model_name: str) -> int:
     Returns:
         int: The number of tokens in the text string.
     """
-    encoding = tiktoken.encoding_for_model(model_name)
-    return len(encoding.encode(string))
+    return len(get_encoding(model_name).encode(string))
+
+
+@click.command()
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    help="The directory to cache the encodings in, TIKTOKEN_CACHE_DIR by default",
+)
+def main(cache_dir):
+    """Download the encodings of the known models for offline use"""
+    if cache_dir:
+        CFG.set_tiktoken_cache_dir(cache_dir)
+    names = {info.encoding for info in MODELS.values()} | {DEFAULT_MODEL.encoding}
+    for name in sorted(names):
+        _load_encoding(name)
+        print(f"Cached the {name} encoding in {CFG.tiktoken_cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
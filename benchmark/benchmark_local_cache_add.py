@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from autogpt.config import Config
+from autogpt.memory.local_storage import LocalStorage
+
+EMBED_DIM = Config().embedding_dim
+
+
+def benchmark_local_cache_add(
+    num_memories: int = 100000,
+    report_every: int = 10000,
+    baseline_memories: int = 4000,
+):
+    # Measure the add throughput of the local memory store while it grows, and
+    # compare it with growing the matrix through np.concatenate on every add.
+    # The baseline is quadratic, so it only runs over the first few thousand adds.
+    vectors = np.random.rand(report_every, EMBED_DIM).astype(np.float32)
+
+    print("Benchmark Version: 1.0.0")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = LocalStorage(os.path.join(tmp_dir, "auto-gpt"), EMBED_DIM)
+        storage.load()
+        for added in range(0, num_memories, report_every):
+            start = time.perf_counter()
+            for i in range(report_every):
+                storage.append(f"Memory number {added + i}", vectors[i])
+            elapsed = time.perf_counter() - start
+            print(
+                f"Store: {added + report_every} memories,"
+                f" {report_every / elapsed:.0f} adds/s"
+            )
+        storage.close()
+
+    embeddings = np.zeros((0, EMBED_DIM), dtype=np.float32)
+    step = baseline_memories // 4
+    for added in range(0, baseline_memories, step):
+        start = time.perf_counter()
+        for i in range(step):
+            vector = vectors[i % report_every][np.newaxis, :]
+            embeddings = np.concatenate([embeddings, vector])
+        elapsed = time.perf_counter() - start
+        print(f"np.concatenate: {added + step} memories, {step / elapsed:.0f} adds/s")
+
+
+# Run the benchmark.
+if __name__ == "__main__":
+    benchmark_local_cache_add(*[int(arg) for arg in sys.argv[1:4]])
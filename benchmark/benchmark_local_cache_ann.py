@@ -0,0 +1,80 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from autogpt.config import Config
+from autogpt.memory.local import top_k
+from autogpt.memory.local_ivf import IVFIndex
+
+EMBED_DIM = Config().embedding_dim
+
+
+def clustered_embeddings(count: int, clusters: int, rng) -> np.ndarray:
+    # Random vectors are all nearly orthogonal in high dimensions, which is not
+    # what real embeddings look like, so draw them around topic centers instead.
+    centers = rng.normal(size=(clusters, EMBED_DIM)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=count)]
+    vectors += rng.normal(scale=1.5, size=(count, EMBED_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def percentile_ms(latencies, percentile):
+    return np.percentile(latencies, percentile) * 1000
+
+
+def benchmark_local_cache_ann(num_memories: int = 50000, num_queries: int = 200):
+    # Compare recall@10 and query latency of the IVF index with the exact search.
+    k = 10
+    rng = np.random.default_rng(0)
+    embeddings = clustered_embeddings(num_memories + num_queries, 1024, rng)
+    embeddings, queries = embeddings[:num_memories], embeddings[num_memories:]
+
+    exact_results = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        exact_results.append(top_k(np.dot(embeddings, query), k))
+        latencies.append(time.perf_counter() - start)
+
+    print("Benchmark Version: 1.0.0")
+    print(f"Memories: {num_memories} x {EMBED_DIM} dimensions, {num_queries} queries")
+    print(
+        f"exact: recall@{k} 1.000,"
+        f" p50 {percentile_ms(latencies, 50):.2f} ms,"
+        f" p99 {percentile_ms(latencies, 99):.2f} ms"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = IVFIndex(os.path.join(tmp_dir, "auto-gpt"))
+        start = time.perf_counter()
+        index.load(embeddings)
+        print(
+            f"ivf: trained {len(index.centroids)} lists in {time.perf_counter() - start:.1f} s"
+        )
+
+        for nprobe in (4, 8, 16, 32, 64):
+            index.nprobe = nprobe
+            hits = 0
+            latencies = []
+            for query, exact in zip(queries, exact_results):
+                start = time.perf_counter()
+                candidates = index.candidates(query)
+                scores = np.dot(embeddings[candidates], query)
+                result = candidates[top_k(scores, k)]
+                latencies.append(time.perf_counter() - start)
+                hits += len(np.intersect1d(result, exact))
+            print(
+                f"ivf nprobe={nprobe}: recall@{k} {hits / (k * num_queries):.3f},"
+                f" p50 {percentile_ms(latencies, 50):.2f} ms,"
+                f" p99 {percentile_ms(latencies, 99):.2f} ms"
+            )
+        index.close()
+
+
+# Run the benchmark.
+if __name__ == "__main__":
+    benchmark_local_cache_ann(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from autogpt.config import Config
+from autogpt.memory.local import top_k
+from autogpt.memory.local_storage import LocalStorage
+from benchmark.benchmark_local_cache_ann import clustered_embeddings, percentile_ms
+
+EMBED_DIM = Config().embedding_dim
+
+
+def benchmark_local_cache_quantization(
+    num_memories: int = 50000, num_queries: int = 200, rerank: int = 4
+):
+    # Compare the size, query latency and recall@10 of float16 and int8 vector
+    # storage with float32, with and without exact re-ranking of a shortlist.
+    k = 10
+    rng = np.random.default_rng(0)
+    embeddings = clustered_embeddings(num_memories + num_queries, 1024, rng)
+    embeddings, queries = embeddings[:num_memories], embeddings[num_memories:]
+    exact_results = [top_k(np.dot(embeddings, query), k) for query in queries]
+
+    print("Benchmark Version: 1.0.0")
+    print(f"Memories: {num_memories} x {EMBED_DIM} dimensions, {num_queries} queries")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for precision in ("float32", "float16", "int8"):
+            prefix = os.path.join(tmp_dir, precision)
+            storage = LocalStorage(prefix, EMBED_DIM, precision, True)
+            storage._write([""] * num_memories, embeddings)
+            storage.load()
+            nbytes = os.path.getsize(storage.vectors_filename)
+            print(f"{precision}: {nbytes / num_memories:.0f} bytes per vector")
+
+            for shortlist in (k, k * rerank) if precision != "float32" else (k,):
+                hits = 0
+                latencies = []
+                for query, exact in zip(queries, exact_results):
+                    start = time.perf_counter()
+                    result = top_k(storage.score(query), shortlist)
+                    if shortlist > k:
+                        result = result[top_k(storage.exact_score(query, result), k)]
+                    latencies.append(time.perf_counter() - start)
+                    hits += len(np.intersect1d(result, exact))
+                label = f"rerank={shortlist // k}" if shortlist > k else "no rerank"
+                print(
+                    f"  {label}: recall@{k} {hits / (k * num_queries):.3f},"
+                    f" p50 {percentile_ms(latencies, 50):.2f} ms,"
+                    f" p99 {percentile_ms(latencies, 99):.2f} ms"
+                )
+            storage.close()
+
+
+# Run the benchmark.
+if __name__ == "__main__":
+    benchmark_local_cache_quantization(*[int(arg) for arg in sys.argv[1:4]])
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import orjson
+
+from autogpt.config import Config
+from autogpt.memory.local_storage import LocalStorage
+
+EMBED_DIM = Config().embedding_dim
+
+
+def benchmark_local_cache_startup(num_memories: int = 20000):
+    # Compare the cold start of the previous JSON file format with the
+    # memory-mapped store, for the same set of random memories.
+    texts = [f"Memory number {i}: " + "lorem ipsum " * 20 for i in range(num_memories)]
+    embeddings = np.random.rand(num_memories, EMBED_DIM).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_filename = os.path.join(tmp_dir, "auto-gpt.json")
+        with open(json_filename, "wb") as f:
+            f.write(
+                orjson.dumps(
+                    {"texts": texts, "embeddings": embeddings},
+                    option=orjson.OPT_SERIALIZE_NUMPY,
+                )
+            )
+
+        storage = LocalStorage(os.path.join(tmp_dir, "auto-gpt"), EMBED_DIM)
+        storage.migrate_json(json_filename)
+        storage.close()
+
+        with open(f"{json_filename}.migrated", "rb") as f:
+            start = time.perf_counter()
+            loaded = orjson.loads(f.read())
+            json_embeddings = np.array(loaded["embeddings"], dtype=np.float32)
+            json_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        mapped_texts, mapped_embeddings = storage.load()
+        mmap_time = time.perf_counter() - start
+
+        query = np.random.rand(EMBED_DIM).astype(np.float32)
+        start = time.perf_counter()
+        best = int(np.argmax(np.dot(mapped_embeddings, query)))
+        first_query_time = time.perf_counter() - start
+        assert best == int(np.argmax(np.dot(json_embeddings, query)))
+        assert mapped_texts[best] == texts[best]
+        storage.close()
+
+    print("Benchmark Version: 1.0.0")
+    print(f"Memories: {num_memories} x {EMBED_DIM} dimensions")
+    print(f"JSON cold start: {json_time * 1000:.1f} ms")
+    print(f"Memory-mapped cold start: {mmap_time * 1000:.1f} ms")
+    print(f"First query over the memory-mapped store: {first_query_time * 1000:.1f} ms")
+
+
+# Run the benchmark.
+if __name__ == "__main__":
+    benchmark_local_cache_startup(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,64 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from autogpt.embeddings import EmbeddingClient, HashingEmbeddingBackend
+from autogpt.memory.local import top_k
+from autogpt.memory.local_storage import LocalStorage
+
+
+def random_texts(count: int, words_per_text: int, vocabulary_size: int = 5000):
+    rng = random.Random(0)
+    vocabulary = [f"word{i}" for i in range(vocabulary_size)]
+    return [" ".join(rng.choices(vocabulary, k=words_per_text)) for _ in range(count)]
+
+
+def benchmark_local_embeddings(
+    num_memories: int = 10000, words_per_text: int = 200, dimension: int = 1536
+):
+    # Embed, store and search memories end to end without any network access.
+    client = EmbeddingClient(HashingEmbeddingBackend(dimension))
+    texts = random_texts(num_memories, words_per_text)
+
+    print("Benchmark Version: 1.0.0")
+    start = time.perf_counter()
+    vectors = np.array(client.embed_many(texts), dtype=np.float32)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Embedded {num_memories} texts of {words_per_text} words"
+        f" in {dimension} dimensions: {num_memories / elapsed:.0f} texts/s"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = LocalStorage(os.path.join(tmp_dir, "auto-gpt"), dimension)
+        storage.load()
+        start = time.perf_counter()
+        for text, vector in zip(texts, vectors):
+            storage.append(text, vector)
+        elapsed = time.perf_counter() - start
+        print(f"Stored {num_memories} memories: {num_memories / elapsed:.0f} adds/s")
+
+        # A query sharing most of its words with a memory should find it
+        hits = 0
+        queries = [
+            " ".join(text.split()[: words_per_text // 2]) for text in texts[:100]
+        ]
+        start = time.perf_counter()
+        for i, query in enumerate(queries):
+            best = top_k(storage.score(np.array(client.embed(query))), 1)
+            hits += int(best[0] == i)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Searched {len(queries)} queries: {elapsed / len(queries) * 1000:.2f} ms"
+            f" per query, {hits}/{len(queries)} found their source memory"
+        )
+        storage.close()
+
+
+# Run the benchmark.
+if __name__ == "__main__":
+    benchmark_local_embeddings(*[int(arg) for arg in sys.argv[1:4]])
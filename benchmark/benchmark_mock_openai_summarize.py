@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+# Run offline: the memory and the embeddings must not reach any API
+os.environ.setdefault("MEMORY_BACKEND", "no_memory")
+os.environ.setdefault("EMBEDDING_PROVIDER", "local")
+os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+
+import openai  # noqa: E402
+
+from autogpt.config import Config  # noqa: E402
+from autogpt.mock_openai_server import MockOpenAIServer  # noqa: E402
+from autogpt.processing.text import (  # noqa: E402
+    max_chunk_tokens,
+    split_text,
+    summarize_text,
+)
+
+
+def benchmark_mock_openai_summarize(num_chunks: int = 16, latency_ms: int = 200):
+    # Summarize a page against a local stand-in of the API answering every request
+    # after a fixed latency, to measure what summarize_text adds on top of it.
+    cfg = Config()
+    latency = latency_ms / 1000
+    # Distinct chunks, as identical requests would share a call
+    text = "".join(
+        f"Paragraph {i}: " + "The quick brown fox jumps over the lazy dog. " * 20 + "\n"
+        for i in range(num_chunks * 8)
+    )
+    chunks = len(list(split_text(text, max_chunk_tokens(), cfg.fast_llm_model)))
+
+    with MockOpenAIServer(reply="A summary.", latency=latency) as server:
+        openai.api_base = server.url
+        print("Benchmark Version: 1.0.0")
+        start = time.perf_counter()
+        summarize_text("https://example.com", text, "What is this page about?")
+        elapsed = time.perf_counter() - start
+
+    # Chunks are summarized LLM_MAX_CONCURRENCY at a time, then once together
+    rounds = -(-chunks // cfg.llm_max_concurrency) + 1
+    ideal = rounds * latency
+    print(
+        f"Summarized {chunks} chunks with {latency_ms} ms of latency"
+        f" in {elapsed:.2f} s, {elapsed - ideal:.2f} s over the {ideal:.2f} s"
+        " spent waiting for the API"
+    )
+
+
+# Run the benchmark.
+if __name__ == "__main__":
+    benchmark_mock_openai_summarize(*[int(arg) for arg in sys.argv[1:3]])
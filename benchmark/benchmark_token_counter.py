@@ -0,0 +1,62 @@
+import random
+import sys
+import time
+from unittest.mock import patch
+
+from autogpt import token_counter
+from autogpt.token_counter import count_message_tokens
+
+
+def random_history(num_messages: int, words_per_message: int):
+    rng = random.Random(0)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    return [
+        {
+            "role": "user" if i % 2 else "assistant",
+            "content": " ".join(rng.choices(vocabulary, k=words_per_message)),
+        }
+        for i in range(num_messages)
+    ]
+
+
+def count_history(history, model):
+    # What chat_with_ai does on every step: count the messages one at a time
+    return sum(count_message_tokens([message], model) for message in history)
+
+
+def benchmark_token_counter(
+    num_messages: int = 1000, words_per_message: int = 100, steps: int = 10
+):
+    # Count a growing history step after step, as the agent loop does, with and
+    # without the memoized per-message counts.
+    model = "gpt-3.5-turbo"
+    history = random_history(num_messages + 2 * steps, words_per_message)
+    count_history(history[:1], model)  # Build the encoding outside of the timings
+
+    print("Benchmark Version: 1.0.0")
+    for name, cached in (("uncached", False), ("cached", True)):
+        token_counter._count_message_tokens.cache_clear()
+        count = token_counter._count_message_tokens
+        with patch.object(
+            token_counter,
+            "_count_message_tokens",
+            count if cached else count.__wrapped__,
+        ):
+            start = time.perf_counter()
+            count_history(history[:num_messages], model)
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            for step in range(1, steps + 1):
+                # Every step adds a user input and a reply
+                count_history(history[: num_messages + 2 * step], model)
+            elapsed = (time.perf_counter() - start) / steps
+        print(
+            f"{name}: first count of {num_messages} messages in {first * 1000:.1f} ms,"
+            f" then {elapsed * 1000:.2f} ms per step"
+        )
+    print(f"Cache: {token_counter._count_message_tokens.cache_info()}")
+
+
+# Run the benchmark.
+if __name__ == "__main__":
+    benchmark_token_counter(*[int(arg) for arg in sys.argv[1:4]])
@@ -3,6 +3,7 @@ import logging
 
 from autogpt.commands.file_operations import ingest_file, search_files
 from autogpt.config import Config
+from autogpt.embeddings import get_embedding_client
 from autogpt.memory import get_memory
 
 cfg = Config()
@@ -91,6 +92,8 @@ def main() -> None:
             " inside the auto_gpt_workspace directory as input."
         )
 
+    print(get_embedding_client().report())
+
 
 if __name__ == "__main__":
     main()
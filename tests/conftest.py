@@ -0,0 +1,32 @@
+"""Keep the files written by the tests out of the working tree"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Set before autogpt is imported, as its config and memory are read on import
+_files = tempfile.mkdtemp(prefix="autogpt-tests-")
+for name, filename in (
+    ("MEMORY_INDEX", "auto-gpt"),
+    ("EMBEDDING_CACHE_FILE", "embedding_cache.sqlite3"),
+    ("COMPLETION_CACHE_FILE", "completion_cache.sqlite3"),
+    ("LLM_LEDGER_FILE", "llm_ledger.jsonl"),
+    ("MODEL_ROUTER_LOG", "model_router.jsonl"),
+    ("LLM_RECORDING_FILE", "llm_recording.jsonl"),
+):
+    os.environ[name] = os.path.join(_files, filename)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_files, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def fresh_llm_state():
+    """Give every test its own ledger, router and budget"""
+    from autogpt import budget, model_router, telemetry
+
+    budget._budget = model_router._router = telemetry._ledger = None
+    yield
+    budget._budget = model_router._router = telemetry._ledger = None
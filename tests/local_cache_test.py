@@ -2,6 +2,7 @@
 """Tests for LocalCache class"""
 import os
 import sys
+import tempfile
 import unittest
 
 import pytest
@@ -9,7 +10,7 @@ import pytest
 from autogpt.memory.local import LocalCache
 
 
-def mock_config() -> dict:
+def mock_config(memory_index: str) -> dict:
     """Mock the Config class"""
     return type(
         "MockConfig",
@@ -18,7 +19,11 @@ def mock_config() -> dict:
             "debug_mode": False,
             "continuous_mode": False,
             "speak_mode": False,
-            "memory_index": "auto-gpt",
+            "memory_index": memory_index,
+            "local_memory_index": "flat",
+            "local_memory_nprobe": 16,
+            "local_memory_precision": "float32",
+            "local_memory_rerank": 4,
         },
     )
 
@@ -27,9 +32,19 @@ def mock_config() -> dict:
 class TestLocalCache(unittest.TestCase):
     """Tests for LocalCache class"""
 
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Keep the cache files out of the working directory"""
+        # LocalCache is a singleton, so the directory is shared by the tests
+        cls.directory = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.directory.cleanup()
+
     def setUp(self) -> None:
         """Set up the test environment"""
-        self.cfg = mock_config()
+        self.cfg = mock_config(os.path.join(self.directory.name, "auto-gpt"))
         self.cache = LocalCache(self.cfg)
 
     def test_add(self) -> None:
@@ -1,3 +1,4 @@
+import os
 from unittest import TestCase
 
 from autogpt.config import Config
@@ -82,3 +83,12 @@ class TestConfig(TestCase):
         """
         self.config.set_debug_mode(True)
         self.assertTrue(self.config.debug_mode)
+
+    def test_tiktoken_cache_dir_does_not_depend_on_the_working_directory(self):
+        """
+        Test if the tokenizer cache directory is absolute and passed to tiktoken.
+        """
+        self.assertTrue(os.path.isabs(self.config.tiktoken_cache_dir))
+        self.assertEqual(
+            os.environ["TIKTOKEN_CACHE_DIR"], self.config.tiktoken_cache_dir
+        )
@@ -1,7 +1,16 @@
 import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
 
 import tests.context
-from autogpt.token_counter import count_message_tokens, count_string_tokens
+from autogpt import token_counter
+from autogpt.token_counter import (
+    EncodingUnavailableError,
+    count_message_tokens,
+    count_string_tokens,
+    warm_up_encodings,
+)
 
 
 class TestTokenCounter(unittest.TestCase):
@@ -22,14 +31,6 @@ class TestTokenCounter(unittest.TestCase):
     def test_count_message_tokens_empty_input(self):
         self.assertEqual(count_message_tokens([]), 3)
 
-    def test_count_message_tokens_invalid_model(self):
-        messages = [
-            {"role": "user", "content": "Hello"},
-            {"role": "assistant", "content": "Hi there!"},
-        ]
-        with self.assertRaises(KeyError):
-            count_message_tokens(messages, model="invalid_model")
-
     def test_count_message_tokens_gpt_4(self):
         messages = [
             {"role": "user", "content": "Hello"},
@@ -51,13 +52,61 @@ class TestTokenCounter(unittest.TestCase):
             {"role": "user", "content": "Hello"},
             {"role": "assistant", "content": "Hi there!"},
         ]
-        with self.assertRaises(NotImplementedError):
-            count_message_tokens(messages, model="invalid_model")
+        # Counted as the gpt-4 messages
+        self.assertEqual(count_message_tokens(messages, model="invalid_model"), 15)
 
     def test_count_string_tokens_gpt_4(self):
         string = "Hello, world!"
         self.assertEqual(count_string_tokens(string, model_name="gpt-4-0314"), 4)
 
 
+class TestTokenCounterCaching(unittest.TestCase):
+    def setUp(self):
+        token_counter._count_message_tokens.cache_clear()
+        self.addCleanup(token_counter._count_message_tokens.cache_clear)
+        self.encoding = MagicMock()
+        self.encoding.encode.side_effect = lambda text: text.split()
+        for patcher in (
+            patch.dict(token_counter._encodings, clear=True),
+            patch("tiktoken.get_encoding", return_value=self.encoding),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_messages_are_encoded_once(self):
+        history = [
+            {"role": "user", "content": "one two three"},
+            {"role": "assistant", "content": "four five"},
+        ]
+        self.assertEqual(count_message_tokens(history, "gpt-4"), 16)
+        history.append({"role": "user", "content": "six"})
+        self.assertEqual(count_message_tokens(history, "gpt-4"), 21)
+        # Two values of each of the three messages
+        self.assertEqual(self.encoding.encode.call_count, 6)
+
+    def test_encodings_are_warmed_up_in_the_background(self):
+        warm_up_encodings(["gpt-4", "gpt-3.5-turbo"]).join()
+        self.assertEqual(set(token_counter._encodings), {"gpt-4", "gpt-3.5-turbo"})
+        token_counter.tiktoken.get_encoding.assert_called_with("cl100k_base")
+
+    def test_missing_encodings_are_reported_offline(self):
+        with patch(
+            "tiktoken.get_encoding", side_effect=requests.exceptions.ConnectionError
+        ):
+            with self.assertRaises(EncodingUnavailableError):
+                count_string_tokens("a", "gpt-4")
+            # The warm-up only warns
+            warm_up_encodings(["gpt-4"]).join()
+
+    def test_unknown_models_are_counted(self):
+        self.assertEqual(count_string_tokens("a b c", "my-finetune"), 3)
+
+    def test_encodings_are_built_once_per_model(self):
+        count_string_tokens("a b", "gpt-4-0314")
+        count_string_tokens("c d", "gpt-4-0314")
+        count_message_tokens([{"role": "user", "content": "e"}], "gpt-4-0314")
+        self.assertEqual(token_counter.tiktoken.get_encoding.call_count, 1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,180 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import openai
+
+from autogpt import api_endpoints, embeddings, llm_utils
+from autogpt.api_endpoints import Endpoint, EndpointPool
+from autogpt.config.config import parse_api_keys
+from autogpt.embeddings import EmbeddingClient, OpenAIEmbeddingBackend
+from autogpt.mock_openai_server import MockOpenAIServer
+from autogpt.rate_limiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def patch_asyncio_sleep(self, test):
+        """Make asyncio.sleep move the clock instead of waiting"""
+        real_sleep = asyncio.sleep
+
+        async def sleep(delay, result=None):
+            self.now += delay
+            return await real_sleep(0, result)
+
+        patcher = patch("asyncio.sleep", sleep)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+class TestEndpointPool(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.a = Endpoint("a", weight=2)
+        self.b = Endpoint("b")
+        self.pool = EndpointPool([self.a, self.b], RateLimiter(), clock=self.clock)
+
+    def pick(self, count):
+        return [self.pool.acquire("gpt-4", 0)[0].name for _ in range(count)]
+
+    def test_requests_follow_the_weights(self):
+        self.assertEqual(self.pick(6), ["a", "b", "a", "a", "b", "a"])
+
+    def test_failed_endpoints_sit_out_their_cooldown(self):
+        self.pool.failed(self.a, 10)
+        self.assertEqual(self.pick(3), ["b", "b", "b"])
+        self.assertTrue(self.pool.healthy("gpt-4"))
+        self.clock.now = 11
+        self.assertIn("a", self.pick(3))
+
+    def test_the_first_to_recover_is_used_when_all_failed(self):
+        self.pool.failed(self.a, 10)
+        self.pool.failed(self.b, 5)
+        self.assertFalse(self.pool.healthy("gpt-4"))
+        self.assertEqual(self.pick(1), ["b"])
+
+    def test_endpoints_have_their_own_rate_limits(self):
+        headers = {
+            "x-ratelimit-limit-requests": "60",
+            "x-ratelimit-remaining-requests": "0",
+        }
+        self.pool.succeeded(self.a, "gpt-4", headers)
+        self.assertGreater(self.pool.limiter.reserve(("gpt-4", "a"), 0), 0)
+        self.assertEqual(self.pool.limiter.reserve(("gpt-4", "b"), 0), 0)
+
+    def test_azure_endpoints_only_serve_their_deployments(self):
+        azure = Endpoint(
+            "azure",
+            api_base="https://example.openai.azure.com",
+            deployments={"gpt-4": "gpt4-deployment"}.get,
+        )
+        pool = EndpointPool([azure], RateLimiter())
+        endpoint, _ = pool.acquire("gpt-4", 0)
+        self.assertEqual(
+            endpoint.request_kwargs("gpt-4"),
+            {
+                "api_base": "https://example.openai.azure.com",
+                "deployment_id": "gpt4-deployment",
+            },
+        )
+        with self.assertRaises(ValueError):
+            pool.acquire("gpt-3.5-turbo", 0)
+
+    def test_api_keys_are_parsed_with_weights(self):
+        self.assertEqual(parse_api_keys("sk-a, sk-b:3,"), [("sk-a", 1), ("sk-b", 3)])
+
+
+class TestFailover(unittest.TestCase):
+    def setUp(self):
+        for patcher in (
+            patch.object(openai, "api_key", "sk-test"),
+            patch.object(llm_utils.CFG, "completion_cache", False),
+            patch.object(llm_utils.CFG, "llm_max_concurrency", 8),
+            patch.object(llm_utils.logger, "double_check"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.clock = FakeClock()
+        self.servers = []
+        for _ in range(2):
+            server = MockOpenAIServer(
+                requests_per_period=10, period=0.5, clock=self.clock
+            ).__enter__()
+            self.addCleanup(server.__exit__)
+            self.servers.append(server)
+
+    def use_pool(self):
+        pool = EndpointPool(
+            [Endpoint(f"key-{i}", api_base=s.url) for i, s in enumerate(self.servers)],
+            RateLimiter(period=0.5, clock=self.clock),
+            clock=self.clock,
+        )
+        patcher = patch.object(api_endpoints, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return pool
+
+    def test_throttled_requests_fail_over_without_waiting(self):
+        self.use_pool()
+        self.servers[0].fail_next(429, {"retry-after": "30"})
+
+        with patch("time.sleep") as sleep:
+            reply = llm_utils.create_chat_completion([], model="gpt-4")
+
+        self.assertEqual(reply, "ok")
+        self.assertEqual([s.received for s in self.servers], [1, 1])
+        sleep.assert_not_called()
+
+    def test_synchronous_responses_feed_their_headers_to_the_pool(self):
+        pool = self.use_pool()
+        backend = OpenAIEmbeddingBackend(pool)
+        with patch.object(pool, "succeeded", wraps=pool.succeeded) as succeeded:
+            llm_utils.create_chat_completion([], model="gpt-4")
+            with patch.object(embeddings, "count_string_tokens", return_value=1):
+                EmbeddingClient(backend).embed_many(["a", "b"])
+
+        self.assertEqual(
+            [call.args[1] for call in succeeded.call_args_list],
+            ["gpt-4", "text-embedding-ada-002"],
+        )
+        for call in succeeded.call_args_list:
+            self.assertEqual(call.args[2]["x-ratelimit-limit-requests"], "10")
+
+    def test_requests_go_on_without_the_sessions_of_the_sdk(self):
+        self.use_pool()
+        with patch.object(api_endpoints, "api_requestor", object()):
+            api_endpoints.capture_response_headers()
+            self.assertEqual(api_endpoints.response_headers(), {})
+            reply = llm_utils.create_chat_completion([], model="gpt-4")
+
+        self.assertEqual(reply, "ok")
+
+    def test_throughput_adds_up_across_endpoints(self):
+        self.clock.patch_asyncio_sleep(self)
+        # One request at a time, so that every response reports what is left
+        concurrency = patch.object(llm_utils.CFG, "llm_max_concurrency", 1)
+        concurrency.start()
+        self.addCleanup(concurrency.stop)
+        self.use_pool()
+
+        replies = llm_utils.run_concurrently(
+            llm_utils.acreate_chat_completion(
+                [{"role": "user", "content": str(i)}], model="gpt-4"
+            )
+            for i in range(40)
+        )
+
+        self.assertEqual(replies, ["ok"] * 40)
+        self.assertEqual([s.received for s in self.servers], [20, 20])
+        self.assertEqual([s.throttled for s in self.servers], [0, 0])
+        # Each endpoint waits for 10 requests to refill, 1.5s for a single one
+        self.assertAlmostEqual(self.clock.now, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from autogpt import budget, llm_utils, model_router, telemetry
+from autogpt.agent import agent
+from autogpt.budget import BudgetExceededError, BudgetManager
+from autogpt.model_router import ModelRouter
+from autogpt.telemetry import LLMCall, LLMLedger, current_command
+from tests.unit.test_llm_utils import response
+
+
+def config(**overrides):
+    return SimpleNamespace(
+        **{
+            "fast_llm_model": "gpt-3.5-turbo",
+            "smart_llm_model": "gpt-4",
+            "fast_token_limit": 4000,
+            "smart_token_limit": 8000,
+            "model_router_max_error_rate": 0.5,
+            "model_router_latency_budget": 0,
+            "model_router_fallback": True,
+            "llm_budget_tokens": 0,
+            "llm_budget_dollars": 0,
+            "llm_command_budget_tokens": 0,
+            "llm_command_budget_dollars": 0,
+            "llm_budget_degrade_at": 0.8,
+            "llm_budget_summary_tokens": 300,
+            **overrides,
+        }
+    )
+
+
+def spend(ledger, prompt_tokens, model="gpt-4"):
+    ledger.record(
+        LLMCall("chat", model, "test", current_command(), prompt_tokens, 0, 0.1)
+    )
+
+
+class TestBudgetManager(unittest.TestCase):
+    def setUp(self):
+        self.ledger = LLMLedger()
+
+    def test_run_budget_degrades_then_stops(self):
+        manager = BudgetManager(config(llm_budget_dollars=1.0), self.ledger)
+        self.assertEqual(manager.model("gpt-4"), "gpt-4")
+        self.assertIsNone(manager.summary_tokens())
+
+        spend(self.ledger, 30000)  # $0.90
+        self.assertEqual(manager.model("gpt-4"), "gpt-3.5-turbo")
+        self.assertEqual(manager.summary_tokens(), 300)
+        manager.check()
+
+        spend(self.ledger, 5000)
+        self.assertTrue(manager.exhausted)
+        with self.assertRaises(BudgetExceededError):
+            manager.check()
+
+    def test_command_budget_is_counted_from_its_start(self):
+        manager = BudgetManager(config(llm_command_budget_tokens=1000), self.ledger)
+        spend(self.ledger, 5000)
+        with manager.command("browse_website"):
+            self.assertFalse(manager.degraded)
+            spend(self.ledger, 1000)
+            self.assertTrue(manager.exhausted)
+            self.assertIn("100% of the command", manager.describe())
+        self.assertFalse(manager.exhausted)
+        self.assertEqual(list(self.ledger.by_command), ["agent", "browse_website"])
+
+    def test_unlimited_by_default(self):
+        manager = BudgetManager(config(), self.ledger)
+        spend(self.ledger, 10**7)
+        self.assertFalse(manager.degraded)
+        manager.check()
+
+
+class TestBudgetedCompletions(unittest.TestCase):
+    def setUp(self):
+        self.ledger = LLMLedger()
+        cfg = config(llm_budget_tokens=100)
+        self.manager = BudgetManager(cfg, self.ledger)
+        for patcher in (
+            patch.object(llm_utils.CFG, "completion_cache", False),
+            patch.object(telemetry, "_ledger", self.ledger),
+            patch.object(budget, "_budget", self.manager),
+            patch.object(model_router, "_router", ModelRouter(cfg)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_calls_move_to_the_cheaper_model_then_stop(self):
+        self.assertEqual(llm_utils.route_model("test", "gpt-4", ["hi"]), "gpt-4")
+        spend(self.ledger, 90)
+        self.assertEqual(
+            llm_utils.route_model("test", "gpt-4", ["hi"]), "gpt-3.5-turbo"
+        )
+
+        spend(self.ledger, 10)
+        with patch("openai.ChatCompletion.create", return_value=response("hi")) as c:
+            with self.assertRaises(BudgetExceededError):
+                llm_utils.create_chat_completion([{"role": "user", "content": "hi"}])
+        c.assert_not_called()
+
+
+class TestBudgetedAgent(unittest.TestCase):
+    def test_the_loop_stops_when_a_call_of_the_step_is_over_budget(self):
+        manager = BudgetManager(config(), LLMLedger())
+        loop = agent.Agent("test", None, [], 0, "prompt", "next")
+        with patch.object(budget, "_budget", manager), patch.object(
+            agent, "chat_with_ai", return_value="not json"
+        ), patch.object(
+            agent,
+            "fix_json_using_multiple_techniques",
+            side_effect=BudgetExceededError("LLM budget exhausted"),
+        ), patch.object(
+            agent, "execute_command"
+        ) as execute:
+            loop.start_interaction_loop()
+        execute.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,30 @@
 # Generated by CodiumAI
+import contextlib
 import time
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
-from autogpt.chat import create_chat_message, generate_context
+from autogpt import chat
+from autogpt.chat import chat_with_ai, create_chat_message, pack_context
+from autogpt.context_window import ContextWindow
+
+
+def count_words():
+    """Count the words of the messages instead of their tokens"""
+    count_messages = patch(
+        "autogpt.token_counter.count_message_tokens",
+        side_effect=lambda messages, model: sum(
+            len(message["content"].split()) for message in messages
+        ),
+    )
+    count_string = patch(
+        "autogpt.token_counter.count_string_tokens",
+        side_effect=lambda string, model: len(string.split()),
+    )
+    stack = contextlib.ExitStack()
+    stack.count_messages = stack.enter_context(count_messages)
+    stack.count_string = stack.enter_context(count_string)
+    return stack
 
 
 class TestChat(unittest.TestCase):
@@ -17,25 +38,26 @@ class TestChat(unittest.TestCase):
         result = create_chat_message("", "")
         self.assertEqual(result, {"role": "", "content": ""})
 
-    # Tests the behavior of the generate_context function when all input parameters are empty.
+    # Tests the behavior of the pack_context function when all input parameters are empty.
     @patch("time.strftime")
-    def test_generate_context_empty_inputs(self, mock_strftime):
+    def test_pack_context_empty_inputs(self, mock_strftime):
         # Mock the time.strftime function to return a fixed value
         mock_strftime.return_value = "Sat Apr 15 00:00:00 2023"
         # Arrange
         prompt = ""
         relevant_memory = ""
-        full_message_history = []
+        context_window = ContextWindow([])
         model = "gpt-3.5-turbo-0301"
 
         # Act
-        result = generate_context(prompt, relevant_memory, full_message_history, model)
+        with count_words():
+            context, packer = pack_context(
+                prompt, "", relevant_memory, context_window, 1000, model
+            )
 
         # Assert
-        expected_result = (
-            -1,
-            47,
-            3,
+        self.assertEqual(
+            context,
             [
                 {"role": "system", "content": ""},
                 {
@@ -44,17 +66,18 @@ class TestChat(unittest.TestCase):
                 },
                 {
                     "role": "system",
-                    "content": f"This reminds you of these events from your past:\n\n\n",
+                    "content": "This reminds you of these events from your past:\n\n\n",
                 },
+                {"role": "user", "content": ""},
             ],
         )
-        self.assertEqual(result, expected_result)
+        self.assertEqual(packer.tokens, 11 + 9)
 
-    # Tests that the function successfully generates a current_context given valid inputs.
-    def test_generate_context_valid_inputs(self):
+    # Tests that the function successfully packs a current_context given valid inputs.
+    def test_pack_context_valid_inputs(self):
         # Given
         prompt = "What is your favorite color?"
-        relevant_memory = "You once painted your room blue."
+        relevant_memory = ["You once painted your room blue."]
         full_message_history = [
             create_chat_message("user", "Hi there!"),
             create_chat_message("assistant", "Hello! How can I assist you today?"),
@@ -68,19 +91,121 @@ class TestChat(unittest.TestCase):
         model = "gpt-3.5-turbo-0301"
 
         # When
-        result = generate_context(prompt, relevant_memory, full_message_history, model)
+        with count_words():
+            context, packer = pack_context(
+                prompt,
+                "Tell me another one.",
+                relevant_memory,
+                ContextWindow(full_message_history),
+                2048,
+                model,
+            )
 
         # Then
-        self.assertIsInstance(result[0], int)
-        self.assertIsInstance(result[1], int)
-        self.assertIsInstance(result[2], int)
-        self.assertIsInstance(result[3], list)
-        self.assertGreaterEqual(result[0], 0)
-        self.assertGreaterEqual(result[1], 0)
-        self.assertGreaterEqual(result[2], 0)
-        self.assertGreaterEqual(
-            len(result[3]), 3
-        )  # current_context should have at least 3 messages
-        self.assertLessEqual(
-            result[1], 2048
-        )  # token limit for GPT-3.5-turbo-0301 is 2048 tokens
+        self.assertEqual(context[3:-1], full_message_history)
+        self.assertIn(repr(relevant_memory), context[2]["content"])
+        self.assertEqual(context[-1]["content"], "Tell me another one.")
+        self.assertLessEqual(packer.tokens, 2048)
+
+    # An empty list of memories is shown as such, as it always was
+    def test_pack_context_without_relevant_memories(self):
+        with count_words():
+            context, _ = pack_context("", "", [], ContextWindow([]), 1000, "gpt-4")
+        self.assertIn("past:\n[]\n", context[2]["content"])
+
+    # Tests that the context is packed within the configured allocations.
+    def test_chat_with_ai_packs_the_context(self):
+        memory = MagicMock()
+        memory.get_relevant.return_value = ["first memory", "second memory"]
+        history = [create_chat_message("user", "a b c d e")] * 100
+
+        with count_words(), patch.object(
+            chat.cfg, "smart_llm_model", chat.cfg.fast_llm_model
+        ), patch.object(chat.cfg, "context_response_tokens", 100), patch.object(
+            chat.cfg, "context_memory_tokens", 25
+        ), patch.object(
+            chat, "create_chat_completion", return_value="reply"
+        ) as create:
+            chat_with_ai("prompt", "go on", history, memory, 300)
+
+        messages = create.call_args.kwargs["messages"]
+        self.assertIn("['first memory']", messages[2]["content"])
+        self.assertEqual(messages[-1], create_chat_message("user", "go on"))
+        # 200 tokens to send: 21 of prompts, 3 of memory, 2 of input, 34 messages
+        self.assertEqual(len(messages), 38)
+        self.assertEqual(create.call_args.kwargs["max_tokens"], 300 - 196)
+        self.assertEqual(history[-1], create_chat_message("assistant", "reply"))
+
+    def chat_with_fast_and_smart_models(self, prompt, history, memories=()):
+        memory = MagicMock()
+        memory.get_relevant.return_value = list(memories)
+        with count_words() as self.counts, patch.object(
+            chat.cfg, "fast_llm_model", "gpt-3.5-turbo"
+        ), patch.object(chat.cfg, "smart_llm_model", "gpt-4"), patch.object(
+            chat.cfg, "fast_token_limit", 300
+        ), patch.object(
+            chat.cfg, "smart_token_limit", 1000
+        ), patch.object(
+            chat.cfg, "context_response_tokens", 100
+        ), patch.object(
+            chat, "create_chat_completion", return_value="reply"
+        ) as create:
+            chat_with_ai(prompt, "go on", history, memory, 300)
+        return create.call_args.kwargs
+
+    # Tests that a history too long for the fast model is trimmed to fit in it.
+    def test_chat_with_ai_trims_a_long_history_for_the_fast_model(self):
+        history = [create_chat_message("user", "a b c d e")] * 100
+
+        kwargs = self.chat_with_fast_and_smart_models("prompt", history)
+
+        self.assertEqual(kwargs["model"], "gpt-3.5-turbo")
+        # 200 tokens to send: 24 of prompts, memories and input, 35 messages
+        self.assertEqual(len(kwargs["messages"]), 39)
+
+    # Tests that a prompt too long for the fast model moves the call to the smart one.
+    def test_chat_with_ai_routes_a_long_prompt_to_the_smart_model(self):
+        history = [create_chat_message("user", "a b c d e")] * 100
+
+        kwargs = self.chat_with_fast_and_smart_models("word " * 250, history)
+
+        self.assertEqual(kwargs["model"], "gpt-4")
+        # The whole history fits in the 900 tokens to send to gpt-4
+        self.assertEqual(len(kwargs["messages"]), 104)
+
+    # Tests that every relevant memory is tokenized once per step.
+    def test_chat_with_ai_counts_each_memory_once(self):
+        history = [create_chat_message("user", "a b c d e")] * 100
+
+        self.chat_with_fast_and_smart_models(
+            "prompt", history, ["first", "second", "third"]
+        )
+
+        self.assertEqual(self.counts.count_string.call_count, 3)
+
+    # Tests that a step only counts its own messages, however long the history.
+    def test_chat_with_ai_counts_a_bounded_number_of_messages_per_step(self):
+        memory = MagicMock()
+        memory.get_relevant.return_value = ["first memory"]
+        history = []
+        context_window = ContextWindow(history)
+
+        with count_words() as counts, patch.object(
+            chat.cfg, "context_response_tokens", 100
+        ), patch.object(chat, "create_chat_completion", return_value="a b c d e"):
+            for step in range(100):
+                counts.count_messages.reset_mock()
+                chat_with_ai(
+                    "prompt",
+                    "go on",
+                    history,
+                    memory,
+                    300,
+                    context_window=context_window,
+                )
+                # The 4 messages of every step, and the 2 of the previous one
+                self.assertLessEqual(counts.count_messages.call_count, 6)
+
+        self.assertEqual(len(history), 200)
+        # The oldest messages left the window
+        self.assertGreater(context_window.start, 0)
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from autogpt.completion_cache import CompletionCache, completion_key
+
+
+class TestCompletionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, "completions.sqlite3")
+        self.cache = CompletionCache(self.filename, max_size=10, ttl=60)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_key_covers_every_parameter(self):
+        messages = [{"role": "user", "content": "hi"}]
+        key = completion_key("gpt-4", messages, 0, None)
+        self.assertEqual(key, completion_key("gpt-4", list(messages), 0, None))
+        self.assertNotEqual(key, completion_key("gpt-3.5-turbo", messages, 0, None))
+        self.assertNotEqual(key, completion_key("gpt-4", messages, 0, 100))
+        self.assertNotEqual(
+            key, completion_key("gpt-4", [{"role": "user", "content": "ho"}], 0, None)
+        )
+
+    def test_hits_and_misses_are_counted(self):
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.put("a", "12345")
+        self.assertEqual(self.cache.get("a"), "12345")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(self.cache.hit_rate, 0.5)
+
+    def test_entries_expire(self):
+        self.cache.put("a", "12345")
+        with patch("time.time", return_value=10**10):
+            self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_expired_entries_are_dropped_when_storing(self):
+        self.cache.put("a", "12345")
+        with patch("time.time", return_value=10**10):
+            self.cache.put("b", "1234567")
+        self.assertEqual(self.cache.size(), 7)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.put("a", "12345")
+        self.cache.put("b", "12345")
+        self.cache.get("a")
+        self.cache.put("c", "12345")
+
+        self.assertEqual(self.cache.get("a"), "12345")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("c"), "12345")
+
+    def test_entries_persist(self):
+        self.cache.put("a", "12345")
+        self.cache.close()
+        self.cache = CompletionCache(self.filename, max_size=10, ttl=60)
+        self.assertEqual(self.cache.get("a"), "12345")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import random
+import unittest
+from unittest.mock import patch
+
+from autogpt.chat import create_chat_message
+from autogpt.context_window import ContextPacker, ContextWindow
+
+
+def count_message_tokens(messages, model):
+    return sum(len(message["content"].split()) for message in messages)
+
+
+def count_string_tokens(string, model):
+    return len(string.split())
+
+
+def naive_fit(history, token_budget):
+    # What chat_with_ai did: walk back from the most recent message
+    included, tokens = [], 0
+    for message in reversed(history):
+        message_tokens = count_message_tokens([message], None)
+        if tokens + message_tokens > token_budget:
+            break
+        included.insert(0, message)
+        tokens += message_tokens
+    return included
+
+
+@patch("autogpt.token_counter.count_message_tokens", wraps=count_message_tokens)
+class TestContextWindow(unittest.TestCase):
+    def test_matches_walking_the_whole_history(self, _):
+        rng = random.Random(0)
+        history = []
+        window = ContextWindow(history)
+        for _ in range(200):
+            history.append(create_chat_message("user", "word " * rng.randint(1, 20)))
+            budget = rng.randint(0, 150)
+            self.assertEqual(window.fit(budget, "gpt-4"), naive_fit(history, budget))
+            self.assertEqual(
+                window.tokens, count_message_tokens(window.fit(budget, "gpt-4"), None)
+            )
+
+    def test_only_new_messages_are_counted(self, count):
+        history = [create_chat_message("user", "a b")] * 100
+        window = ContextWindow(history)
+        window.fit(1000, "gpt-4")
+        history.append(create_chat_message("assistant", "c"))
+        count.reset_mock()
+        self.assertEqual(len(window.fit(1000, "gpt-4")), 101)
+        self.assertEqual(count.call_count, 1)
+
+        # Another model counts differently
+        window.fit(1000, "gpt-3.5-turbo")
+        self.assertEqual(count.call_count, 102)
+
+        # Each model keeps its counts
+        history.append(create_chat_message("assistant", "d"))
+        self.assertEqual(window.fit(5, "gpt-4"), naive_fit(history, 5))
+        self.assertEqual(count.call_count, 103)
+
+        # And its window, which switching back resumes from
+        self.assertEqual((window.start, window.tokens), (99, 4))
+        window.fit(1000, "gpt-3.5-turbo")
+        self.assertEqual(count.call_count, 104)
+        self.assertEqual((window.start, window.tokens), (0, 202))
+
+    def test_the_newest_message_alone_may_not_fit(self, _):
+        history = [create_chat_message("user", "a b c")]
+        window = ContextWindow(history)
+        self.assertEqual(window.fit(2, "gpt-4"), [])
+        self.assertEqual(window.tokens, 0)
+
+
+@patch("autogpt.token_counter.count_string_tokens", wraps=count_string_tokens)
+@patch("autogpt.token_counter.count_message_tokens", wraps=count_message_tokens)
+class TestContextPacker(unittest.TestCase):
+    def test_the_best_texts_fitting_their_allocation_are_selected(self, *_):
+        packer = ContextPacker(100, "gpt-4")
+        packer.add(create_chat_message("system", "one two three"))
+        # 2, 4 and 3 tokens once separated
+        texts = ["a", "b c d", "e f"]
+        self.assertEqual(packer.select(texts, 5), ["a", "e f"])
+        self.assertEqual(packer.select(texts, 5, scores=[0, 2, 1]), ["b c d"])
+        self.assertEqual(packer.tokens, 3 + 5 + 4)
+
+    def test_each_text_is_counted_once(self, count_message, count_string):
+        packer = ContextPacker(1000, "gpt-4")
+        packer.select(["a"] * 50, 1000)
+        self.assertEqual(count_string.call_count, 50)
+
+        history = [create_chat_message("user", "a b")] * 10
+        self.assertEqual(len(packer.fit_history(ContextWindow(history))), 10)
+        self.assertEqual(count_message.call_count, 10)
+        self.assertEqual(packer.tokens, 120)
+
+    def test_the_history_gets_what_is_left(self, *_):
+        packer = ContextPacker(10, "gpt-4")
+        packer.add(create_chat_message("system", "a b c d e f"))
+        history = [create_chat_message("user", "a b")] * 10
+        self.assertEqual(len(packer.fit_history(ContextWindow(history))), 2)
+        self.assertEqual(packer.remaining, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from autogpt.embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, "embeddings.sqlite3")
+        # Room for two embeddings of four float32
+        self.cache = EmbeddingCache(self.filename, max_size=32)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_get_many_reports_misses_and_hits(self):
+        self.assertEqual(self.cache.get_many("ada", ["a", "b"]), [None, None])
+        self.cache.put_many("ada", ["a"], [[1.0, 2.0, 3.0, 4.0]])
+
+        self.assertEqual(
+            self.cache.get_many("ada", ["a", "b"]), [[1.0, 2.0, 3.0, 4.0], None]
+        )
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+        self.assertEqual(self.cache.hit_rate, 0.25)
+
+    def test_keys_include_the_model(self):
+        self.cache.put_many("ada", ["a"], [[1.0, 2.0, 3.0, 4.0]])
+        self.assertEqual(self.cache.get_many("other", ["a"]), [None])
+
+    def test_entries_persist(self):
+        self.cache.put_many("ada", ["a"], [[1.0, 2.0, 3.0, 4.0]])
+        self.cache.close()
+        self.cache = EmbeddingCache(self.filename, max_size=32)
+        self.assertEqual(self.cache.get_many("ada", ["a"]), [[1.0, 2.0, 3.0, 4.0]])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.put_many("ada", ["a"], [[1.0] * 4])
+        self.cache.put_many("ada", ["b"], [[2.0] * 4])
+        self.cache.get_many("ada", ["a"])
+        self.cache.put_many("ada", ["c"], [[3.0] * 4])
+
+        self.assertEqual(
+            self.cache.get_many("ada", ["a", "b", "c"]), [[1.0] * 4, None, [3.0] * 4]
+        )
+        self.assertEqual(self.cache.size(), 32)
+
+    def test_the_size_is_kept_without_scanning_the_table(self):
+        self.cache.put_many("ada", ["a", "a"], [[1.0] * 2, [1.0] * 3])
+        self.cache.put_many("ada", ["a", "b"], [[1.0] * 4, [1.0] * 2])
+        self.assertEqual(self.cache.size(), 24)
+        self.cache.close()
+
+        self.cache = EmbeddingCache(self.filename, max_size=32)
+        self.assertEqual(self.cache.size(), 24)
+        self.cache.put_many("ada", ["c"], [[1.0] * 4])
+        self.assertEqual(self.cache.size(), 24)
+        self.assertEqual(
+            self.cache.get_many("ada", ["a", "b", "c"]), [None, [1.0] * 2, [1.0] * 4]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
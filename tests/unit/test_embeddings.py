@@ -0,0 +1,169 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from openai.error import APIError, RateLimitError
+
+from autogpt import embeddings
+from autogpt.embedding_cache import EmbeddingCache
+from autogpt.embeddings import (
+    EmbeddingBackend,
+    EmbeddingClient,
+    HashingEmbeddingBackend,
+    OpenAIEmbeddingBackend,
+    batch_embedding_inputs,
+)
+from autogpt.memory.base import get_ada_embedding, get_ada_embeddings
+
+
+def count_words(text, model_name):
+    return len(text.split())
+
+
+class FakeBackend(EmbeddingBackend):
+    """Embed a text as its length, failing with the queued errors first"""
+
+    model = "fake"
+    dimension = 1
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.requests = []
+
+    def create(self, texts, endpoint=None):
+        self.requests.append(texts)
+        if self.errors:
+            raise self.errors.pop(0)
+        return [[float(len(text))] for text in texts]
+
+
+@patch.object(embeddings, "count_string_tokens", side_effect=count_words)
+class TestEmbeddingBatches(unittest.TestCase):
+    def test_batches_respect_token_limit(self, _):
+        texts = ["a b", "c d e", "f", "g h i j"]
+        self.assertEqual(
+            list(batch_embedding_inputs(texts, max_tokens=5, max_inputs=10)),
+            [["a b", "c d e"], ["f", "g h i j"]],
+        )
+
+    def test_batches_respect_input_limit(self, _):
+        texts = ["a", "b", "c"]
+        self.assertEqual(
+            list(batch_embedding_inputs(texts, max_tokens=100, max_inputs=2)),
+            [["a", "b"], ["c"]],
+        )
+
+    def test_oversized_text_is_sent_alone(self, _):
+        texts = ["a", "b c d e f", "g"]
+        self.assertEqual(
+            list(batch_embedding_inputs(texts, max_tokens=3, max_inputs=10)),
+            [["a"], ["b c d e f"], ["g"]],
+        )
+
+
+@patch.object(embeddings, "count_string_tokens", side_effect=count_words)
+class TestEmbeddingClient(unittest.TestCase):
+    def test_openai_embeddings_are_returned_in_input_order(self, _):
+        def create(input, **kwargs):
+            data = [
+                {"index": i, "embedding": [float(len(text))]}
+                for i, text in enumerate(input)
+            ]
+            return {"data": data[::-1]}
+
+        client = EmbeddingClient(OpenAIEmbeddingBackend())
+        with patch("openai.Embedding.create", side_effect=create) as mock:
+            self.assertEqual(
+                client.embed_many(["a", "bb", "ccc"]), [[1.0], [2.0], [3.0]]
+            )
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(client.metrics.requests, 1)
+        self.assertEqual(client.metrics.texts, 3)
+
+    def test_cached_embeddings_are_not_requested_again(self, _):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = EmbeddingCache(os.path.join(tmp_dir, "cache.sqlite3"), 1024)
+            backend = FakeBackend()
+            client = EmbeddingClient(backend, cache)
+
+            client.embed_many(["a", "bb", "a"])
+            embedded = client.embed_many(["bb", "a", "a"])
+
+            self.assertEqual(embedded, [[2.0], [1.0], [1.0]])
+            self.assertEqual(backend.requests, [["a", "bb"]])
+            cache.close()
+
+    def test_transient_errors_are_retried_with_jitter(self, _):
+        backend = FakeBackend(
+            [RateLimitError("slow down"), APIError("bad gateway", http_status=502)]
+        )
+        waits = []
+        client = EmbeddingClient(backend, backoff_base=1.0, sleep=waits.append)
+
+        self.assertEqual(client.embed("abc"), [3.0])
+        self.assertEqual(len(backend.requests), 3)
+        self.assertEqual(client.metrics.retries, 2)
+        self.assertTrue(0 <= waits[0] <= 1.0 and 0 <= waits[1] <= 2.0)
+
+    def test_other_errors_are_raised(self, _):
+        backend = FakeBackend([APIError("bad request", http_status=400)])
+        client = EmbeddingClient(backend, sleep=lambda _: None)
+        with self.assertRaises(APIError):
+            client.embed("abc")
+        self.assertEqual(len(backend.requests), 1)
+
+    def test_retries_are_bounded(self, _):
+        backend = FakeBackend([RateLimitError("slow down")] * 3)
+        client = EmbeddingClient(backend, max_retries=3, sleep=lambda _: None)
+        with self.assertRaises(RateLimitError):
+            client.embed("abc")
+        self.assertEqual(len(backend.requests), 3)
+
+
+class TestHashingEmbeddingBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = HashingEmbeddingBackend(dimension=256)
+
+    def test_embeddings_are_deterministic_unit_vectors(self):
+        first, second = self.backend.create(["The cat sat", "the  CAT sat!"])
+        self.assertEqual(len(first), 256)
+        self.assertEqual(first, second)
+        self.assertAlmostEqual(float(np.linalg.norm(first)), 1.0, places=5)
+
+    def test_shared_words_are_closer(self):
+        cat, kitten, stocks = np.array(
+            self.backend.create(
+                [
+                    "the cat sat on the mat",
+                    "a cat sat on a mat",
+                    "stock markets fell sharply today",
+                ]
+            )
+        )
+        self.assertGreater(np.dot(cat, kitten), np.dot(cat, stocks))
+
+    def test_empty_text(self):
+        self.assertEqual(self.backend.create([""]), [[0.0] * 256])
+
+    def test_client_needs_no_token_counting(self):
+        client = EmbeddingClient(self.backend)
+        with patch.object(embeddings, "count_string_tokens") as count:
+            self.assertEqual(len(client.embed_many(["a", "b", "c"])), 3)
+        count.assert_not_called()
+        self.assertEqual(client.metrics.requests, 1)
+
+
+class TestAdaEmbeddings(unittest.TestCase):
+    def test_newlines_are_replaced_before_embedding(self):
+        with patch("autogpt.memory.base.embed") as embed:
+            get_ada_embedding("a\nb")
+        embed.assert_called_once_with("a b")
+        with patch("autogpt.memory.base.embed_many") as embed_many:
+            get_ada_embeddings(["a\nb", "c"])
+        embed_many.assert_called_once_with(["a b", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import unittest
+
+from autogpt.json_fixes.incremental import IncrementalJSONParser
+from autogpt.promptgenerator import PromptGenerator
+
+
+def feed_in_pieces(parser, text, size):
+    completed = []
+    for i in range(0, len(text), size):
+        completed.extend(parser.feed(text[i : i + size]))
+    return completed
+
+
+class TestIncrementalJSONParser(unittest.TestCase):
+    def setUp(self):
+        self.reply = PromptGenerator().response_format
+
+    def test_members_are_returned_as_soon_as_complete(self):
+        text = json.dumps(self.reply, indent=4)
+        parser = IncrementalJSONParser()
+        command_start = text.index('"command"')
+
+        completed = feed_in_pieces(parser, text[:command_start], 3)
+        self.assertEqual(completed, [("thoughts", self.reply["thoughts"])])
+        self.assertFalse(parser.done)
+
+        completed = feed_in_pieces(parser, text[command_start:], 3)
+        self.assertEqual(completed, [("command", self.reply["command"])])
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.members, self.reply)
+
+    def test_strings_can_hold_json_syntax(self):
+        reply = {"thoughts": {"text": 'a "quoted" {brace}, [bracket]: \\ done'}}
+        parser = IncrementalJSONParser()
+        self.assertEqual(
+            feed_in_pieces(parser, json.dumps(reply), 1),
+            [("thoughts", reply["thoughts"])],
+        )
+        self.assertTrue(parser.done)
+
+    def test_text_around_the_object_is_ignored(self):
+        parser = IncrementalJSONParser()
+        completed = parser.feed('Sure [1]: {"command": {"name": "x"}} Hope it helps')
+        self.assertEqual(completed, [("command", {"name": "x"})])
+        self.assertTrue(parser.done)
+
+    def test_invalid_members_are_skipped(self):
+        parser = IncrementalJSONParser()
+        completed = parser.feed('{"thoughts": {text: "hi"}, "command": "none"}')
+        self.assertEqual(completed, [("command", "none")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import openai
+
+from autogpt import chat, llm_recording, llm_utils, rate_limiter
+from autogpt.chat import create_chat_message
+from autogpt.embeddings import RecordingEmbeddingBackend
+from autogpt.llm_recording import (
+    CURRENT_TIME_PREFIX,
+    LLMRecording,
+    ReplayMissError,
+    recording_key,
+)
+from autogpt.mock_openai_server import MockOpenAIServer
+from autogpt.rate_limiter import RateLimiter
+from tests.unit.test_chat import count_words
+from tests.unit.test_embeddings import FakeBackend
+from tests.unit.test_llm_utils import response
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+class TestLLMRecording(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "recording.jsonl")
+        patcher = patch.object(llm_utils.CFG, "completion_cache", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def use(self, mode):
+        recording = LLMRecording(self.filename, mode)
+        patcher = patch.object(llm_recording, "_recording", recording)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(llm_utils.CFG, "llm_recording", mode)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return recording
+
+    def test_completions_are_replayed_in_order_without_the_api(self):
+        self.use("record")
+        with patch(
+            "openai.ChatCompletion.create",
+            side_effect=[response("first"), response("second")],
+        ):
+            for _ in range(2):
+                llm_utils.create_chat_completion(MESSAGES, model="gpt-4")
+
+        self.use("replay")
+        with patch("openai.ChatCompletion.create") as create:
+            replies = [
+                llm_utils.create_chat_completion(MESSAGES, model="gpt-4")
+                for _ in range(3)
+            ]
+        self.assertEqual(replies, ["first", "second", "second"])
+        create.assert_not_called()
+        with self.assertRaises(ReplayMissError):
+            llm_utils.create_chat_completion(MESSAGES, model="gpt-3.5-turbo")
+
+    def test_agent_steps_are_replayed_at_another_time(self):
+        memory = MagicMock()
+        memory.get_relevant.return_value = ["a memory"]
+
+        def step(history):
+            return chat.chat_with_ai("prompt", "go on", history, memory, 4000)
+
+        self.use("record")
+        with count_words(), patch(
+            "time.strftime", return_value="Sat Apr 15 00:00:00 2023"
+        ), patch("openai.ChatCompletion.create", return_value=response("reply")):
+            recorded = [step([]), step([create_chat_message("user", "hi")])]
+
+        self.use("replay")
+        with count_words(), patch(
+            "time.strftime", return_value="Sat Apr 15 00:00:01 2023"
+        ), patch("openai.ChatCompletion.create") as create:
+            replayed = [step([]), step([create_chat_message("user", "hi")])]
+
+        self.assertEqual(replayed, recorded)
+        create.assert_not_called()
+
+    def test_embeddings_are_replayed_whatever_the_batches(self):
+        RecordingEmbeddingBackend(FakeBackend(), self.use("record")).create(["a", "bb"])
+
+        replay = RecordingEmbeddingBackend(FakeBackend(), self.use("replay"))
+        self.assertEqual(replay.create(["bb"]), [[2.0]])
+        self.assertIsNone(replay.endpoints)
+        with self.assertRaises(ReplayMissError):
+            replay.create(["ccc"])
+
+
+class TestMockOpenAIServer(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        recording = LLMRecording(os.path.join(directory.name, "r.jsonl"), "record")
+        key = recording_key("gpt-4", MESSAGES, 0, None)
+        recording.record_completion(key, "gpt-4", "Hello there")
+        timed_messages = [
+            {"role": "system", "content": f"{CURRENT_TIME_PREFIX}Sat Apr 15"},
+            *MESSAGES,
+        ]
+        key = recording_key("gpt-4", timed_messages, 0, None)
+        recording.record_completion(key, "gpt-4", "Good day")
+        server = MockOpenAIServer(
+            recording=LLMRecording(recording.filename, "replay"), latency=0.01
+        ).__enter__()
+        self.addCleanup(server.__exit__)
+        for patcher in (
+            patch.object(openai, "api_key", "sk-test"),
+            patch.object(openai, "api_base", server.url),
+            patch.object(llm_utils.CFG, "use_azure", False),
+            patch.object(llm_utils.CFG, "completion_cache", False),
+            patch.object(rate_limiter, "_limiter", RateLimiter()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_recordings_are_served(self):
+        reply = llm_utils.create_chat_completion(MESSAGES, "gpt-4", temperature=0)
+        self.assertEqual(reply, "Hello there")
+
+    def test_recordings_are_served_at_another_time(self):
+        messages = [
+            {"role": "system", "content": f"{CURRENT_TIME_PREFIX}Sun Apr 16"},
+            *MESSAGES,
+        ]
+        reply = llm_utils.create_chat_completion(messages, "gpt-4", temperature=0)
+        self.assertEqual(reply, "Good day")
+
+    def test_recordings_are_streamed(self):
+        pieces = []
+        reply = llm_utils.create_chat_completion(
+            MESSAGES, "gpt-4", temperature=0, stream=True, on_chunk=pieces.append
+        )
+        self.assertEqual(reply, "Hello there")
+        self.assertEqual(pieces, ["Hello", " there"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,256 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import requests
+from openai.error import APIError, RateLimitError
+
+from autogpt import llm_utils, rate_limiter
+from autogpt.completion_cache import CompletionCache
+from autogpt.llm_utils import (
+    acreate_chat_completion,
+    create_chat_completion,
+    run_concurrently,
+)
+from autogpt.rate_limiter import RateLimiter
+
+
+class Completion(dict):
+    """A response object exposing its fields as attributes, like the SDK's"""
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+def response(content):
+    return Completion(choices=[Completion(message={"content": content})])
+
+
+def stream(*pieces):
+    yield Completion(choices=[Completion(delta={"role": "assistant"})])
+    for piece in pieces:
+        yield Completion(choices=[Completion(delta={"content": piece})])
+    yield Completion(choices=[Completion(delta={}, finish_reason="stop")])
+
+
+class TestCreateChatCompletion(unittest.TestCase):
+    @patch("time.sleep")
+    def test_bad_gateway_is_retried(self, sleep):
+        with patch(
+            "openai.ChatCompletion.create",
+            side_effect=[APIError("bad gateway", http_status=502), response("hi")],
+        ):
+            self.assertEqual(create_chat_completion([], model="gpt-4"), "hi")
+        sleep.assert_called_once_with(4)
+
+    def test_other_errors_are_raised(self):
+        with patch(
+            "openai.ChatCompletion.create",
+            side_effect=APIError("bad request", http_status=400),
+        ):
+            with self.assertRaises(APIError):
+                create_chat_completion([], model="gpt-4")
+
+
+class TestStreamingChatCompletion(unittest.TestCase):
+    def test_pieces_are_passed_as_they_arrive(self):
+        pieces = []
+        with patch(
+            "openai.ChatCompletion.create", return_value=stream("he", "llo")
+        ) as create:
+            reply = create_chat_completion(
+                [], model="gpt-4", stream=True, on_chunk=pieces.append
+            )
+        self.assertEqual(reply, "hello")
+        self.assertEqual(pieces, ["he", "llo"])
+        self.assertTrue(create.call_args.kwargs["stream"])
+
+    def test_callback_can_stop_the_stream(self):
+        with patch(
+            "openai.ChatCompletion.create", return_value=stream("a", "b", "c")
+        ), patch.object(llm_utils, "close_response") as close_response:
+            reply = create_chat_completion(
+                [], model="gpt-4", stream=True, on_chunk=lambda piece: piece == "b"
+            )
+        self.assertEqual(reply, "ab")
+        close_response.assert_called_once_with()
+
+    @patch("time.sleep")
+    def test_interrupted_streams_are_retried(self, sleep):
+        def interrupted():
+            yield from stream("he")
+            raise requests.exceptions.ChunkedEncodingError("connection reset")
+
+        pieces = []
+        with patch(
+            "openai.ChatCompletion.create",
+            side_effect=[interrupted(), stream("he", "llo")],
+        ):
+            reply = create_chat_completion(
+                [], model="gpt-4", stream=True, on_chunk=pieces.append
+            )
+        self.assertEqual(reply, "hello")
+        # What was passed on before the interruption is not passed on again
+        self.assertEqual(pieces, ["he"])
+
+    def test_streams_interrupted_on_every_attempt_raise_an_api_error(self):
+        def interrupted():
+            raise requests.exceptions.ConnectionError("connection reset")
+            yield
+
+        with patch(
+            "openai.ChatCompletion.create", side_effect=lambda **_: interrupted()
+        ), patch("time.sleep"):
+            with self.assertRaises(APIError):
+                create_chat_completion([], model="gpt-4", stream=True)
+
+
+class TestCompletionCaching(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = CompletionCache(
+            os.path.join(self.tmp_dir.name, "completions.sqlite3"), 1024, 60
+        )
+        self.patcher = patch.object(
+            llm_utils, "get_completion_cache", return_value=self.cache
+        )
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_deterministic_calls_are_replayed(self):
+        with patch(
+            "openai.ChatCompletion.create", return_value=response("fixed")
+        ) as create:
+            for _ in range(2):
+                reply = llm_utils.call_ai_function("def f():", [], "Fix", "gpt-4")
+                self.assertEqual(reply, "fixed")
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_async_calls_share_the_cache(self):
+        messages = [{"role": "user", "content": "hi"}]
+        with patch("openai.ChatCompletion.create", return_value=response("fixed")):
+            create_chat_completion(messages, model="gpt-4", temperature=0)
+        with patch("openai.ChatCompletion.acreate") as acreate:
+            reply = asyncio.run(
+                acreate_chat_completion(messages, model="gpt-4", temperature=0)
+            )
+        self.assertEqual(reply, "fixed")
+        acreate.assert_not_called()
+
+    def test_sampled_calls_are_not_cached(self):
+        with patch(
+            "openai.ChatCompletion.create", return_value=response("hi")
+        ) as create:
+            for _ in range(2):
+                create_chat_completion([], model="gpt-4", temperature=0.7)
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 0))
+
+
+@patch.object(llm_utils.CFG, "llm_max_concurrency", 2)
+class TestAsyncChatCompletion(unittest.TestCase):
+    def setUp(self):
+        self.patcher = patch.object(rate_limiter, "_limiter", RateLimiter())
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_concurrency_is_bounded(self):
+        running = 0
+        peak = 0
+
+        async def acreate(messages, **kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return response(messages[0]["content"])
+
+        with patch("openai.ChatCompletion.acreate", side_effect=acreate):
+            replies = run_concurrently(
+                acreate_chat_completion([{"role": "user", "content": str(i)}])
+                for i in range(6)
+            )
+
+        self.assertEqual(replies, [str(i) for i in range(6)])
+        self.assertEqual(peak, 2)
+
+    def test_backoff_does_not_block_the_loop(self):
+        acreate = AsyncMock(side_effect=[RateLimitError("slow down"), response("hi")])
+        sleep = AsyncMock()
+        with patch("openai.ChatCompletion.acreate", acreate), patch.object(
+            llm_utils.asyncio, "sleep", sleep
+        ), patch.object(llm_utils.logger, "double_check"):
+            reply = asyncio.run(acreate_chat_completion([], model="gpt-4"))
+
+        self.assertEqual(reply, "hi")
+        sleep.assert_awaited_once_with(4)
+
+    def test_cancellation_releases_the_slot(self):
+        async def scenario():
+            gate = asyncio.Event()
+
+            async def hang(**kwargs):
+                gate.set()
+                await asyncio.sleep(60)
+
+            with patch("openai.ChatCompletion.acreate", side_effect=hang):
+                task = asyncio.create_task(acreate_chat_completion([]))
+                await gate.wait()
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+            # Both slots are free again
+            semaphore = llm_utils._concurrency_limit()
+            await semaphore.acquire()
+            return semaphore.locked()
+
+        self.assertFalse(asyncio.run(scenario()))
+
+    def test_calls_can_be_run_from_a_coroutine(self):
+        async def acreate(messages, **kwargs):
+            return response(messages[0]["content"])
+
+        async def caller():
+            return run_concurrently(
+                acreate_chat_completion([{"role": "user", "content": str(i)}])
+                for i in range(3)
+            )
+
+        with patch("openai.ChatCompletion.acreate", side_effect=acreate):
+            replies = asyncio.run(caller())
+
+        self.assertEqual(replies, ["0", "1", "2"])
+
+    def test_failure_cancels_the_other_calls(self):
+        cancelled = []
+
+        async def acreate(messages, **kwargs):
+            if messages[0]["content"] == "fail":
+                raise APIError("bad request", http_status=400)
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        with patch("openai.ChatCompletion.acreate", side_effect=acreate):
+            with self.assertRaises(APIError):
+                run_concurrently(
+                    acreate_chat_completion([{"role": "user", "content": content}])
+                    for content in ("wait", "fail")
+                )
+        self.assertEqual(cancelled, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
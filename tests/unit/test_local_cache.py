@@ -0,0 +1,167 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from autogpt import embeddings
+from autogpt.config import Singleton
+from autogpt.embeddings import EmbeddingClient, HashingEmbeddingBackend
+from autogpt.memory import local
+from autogpt.memory.local import LocalCache, top_k
+
+EMBED_DIM = 8
+
+EMBEDDINGS = {
+    text: np.eye(EMBED_DIM, dtype=np.float32)[i]
+    for i, text in enumerate(["apple", "banana", "cherry"])
+}
+
+
+def mock_config(memory_index, local_memory_index="flat", precision="float32"):
+    """Mock the Config class"""
+    return type(
+        "MockConfig",
+        (object,),
+        {
+            "memory_index": memory_index,
+            "local_memory_index": local_memory_index,
+            "local_memory_nprobe": 16,
+            "local_memory_precision": precision,
+            "local_memory_rerank": 4,
+        },
+    )
+
+
+def mock_embedding(text):
+    """Embed a text as a mix of the fruits it mentions"""
+    vector = np.zeros(EMBED_DIM, dtype=np.float32)
+    for position, word in enumerate(text.split()):
+        vector += EMBEDDINGS[word] / (position + 1)
+    return vector.tolist()
+
+
+class TestTopK(unittest.TestCase):
+    def test_top_k_is_sorted_best_first(self):
+        scores = np.array([0.1, 0.9, 0.5, 0.7, 0.2])
+        np.testing.assert_array_equal(top_k(scores, 3), [1, 3, 2])
+
+    def test_top_k_larger_than_scores(self):
+        scores = np.array([0.1, 0.9])
+        np.testing.assert_array_equal(top_k(scores, 5), [1, 0])
+
+    def test_top_k_empty(self):
+        self.assertEqual(len(top_k(np.array([]), 3)), 0)
+        self.assertEqual(len(top_k(np.array([0.1]), 0)), 0)
+
+
+class TestLocalCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        cfg = mock_config(self.cache_prefix())
+        Singleton._instances.pop(LocalCache, None)
+        self.patcher = patch.object(local, "embed", side_effect=mock_embedding)
+        self.patcher.start()
+        self.client_patcher = patch.object(
+            embeddings, "_client", EmbeddingClient(HashingEmbeddingBackend(EMBED_DIM))
+        )
+        self.client_patcher.start()
+        self.batch_patcher = patch.object(
+            local,
+            "embed_many",
+            side_effect=lambda texts: [mock_embedding(text) for text in texts],
+        )
+        self.batch_patcher.start()
+        self.cache = LocalCache(cfg)
+        for text in ["apple", "banana", "cherry"]:
+            self.cache.add(text)
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.batch_patcher.stop()
+        self.client_patcher.stop()
+        self.cache.storage.close()
+        Singleton._instances.pop(LocalCache, None)
+        self.tmp_dir.cleanup()
+
+    def test_get_relevant(self):
+        self.assertEqual(
+            self.cache.get_relevant("banana cherry", 2), ["banana", "cherry"]
+        )
+
+    def test_add_many(self):
+        added = self.cache.add_many(["banana apple", "Command Error: oops"])
+        self.assertEqual(added, ["banana apple"])
+        self.assertEqual(local.embed_many.call_count, 1)
+        self.assertEqual(self.cache.get_stats(), (4, (4, EMBED_DIM)))
+        self.assertEqual(self.cache.get_relevant("banana apple", 1), ["banana apple"])
+
+    def test_get_relevant_batch(self):
+        self.assertEqual(
+            self.cache.get_relevant_batch(["cherry apple", "banana apple"], 2),
+            [["cherry", "apple"], ["banana", "apple"]],
+        )
+
+    def test_get_relevant_batch_empty(self):
+        self.assertEqual(self.cache.get_relevant_batch([], 2), [])
+
+    def test_memories_are_converted_to_int8(self):
+        self.cache.storage.close()
+        Singleton._instances.pop(LocalCache, None)
+        self.cache = LocalCache(mock_config(self.cache_prefix(), precision="int8"))
+        self.assertEqual(self.cache.storage.precision, "int8")
+        self.assertEqual(self.cache.get_stats(), (3, (3, EMBED_DIM)))
+        self.assertEqual(
+            self.cache.get_relevant("banana cherry", 2), ["banana", "cherry"]
+        )
+        self.assertEqual(
+            self.cache.get_relevant_batch(["cherry apple", "banana apple"], 2),
+            [["cherry", "apple"], ["banana", "apple"]],
+        )
+
+    def test_memories_are_reloaded(self):
+        Singleton._instances.pop(LocalCache, None)
+        reloaded = LocalCache(mock_config(self.cache_prefix()))
+        self.assertEqual(list(reloaded.data.texts), ["apple", "banana", "cherry"])
+        self.assertEqual(reloaded.get_relevant("cherry", 1), ["cherry"])
+        reloaded.storage.close()
+
+    def cache_prefix(self):
+        return os.path.join(self.tmp_dir.name, "auto-gpt")
+
+
+class TestLocalCacheOffline(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        client = EmbeddingClient(HashingEmbeddingBackend(dimension=64))
+        self.patcher = patch.object(embeddings, "_client", client)
+        self.patcher.start()
+        Singleton._instances.pop(LocalCache, None)
+        self.cache = LocalCache(
+            mock_config(os.path.join(self.tmp_dir.name, "auto-gpt"))
+        )
+
+    def tearDown(self):
+        self.cache.storage.close()
+        Singleton._instances.pop(LocalCache, None)
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def test_local_embeddings(self):
+        self.cache.add_many(
+            [
+                "The weather in Paris is sunny",
+                "Python lists are dynamic arrays",
+                "The stock market fell today",
+            ]
+        )
+        self.assertEqual(self.cache.get_stats(), (3, (3, 64)))
+        self.assertEqual(
+            self.cache.get_relevant("how are python lists implemented", 1),
+            ["Python lists are dynamic arrays"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
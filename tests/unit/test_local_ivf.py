@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from autogpt.memory.local_ivf import RETRAIN_FACTOR, IVFIndex
+
+
+def clustered_vectors(count, dim=32, clusters=8, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=count)]
+    vectors += 0.1 * rng.normal(size=(count, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+class TestIVFIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.tmp_dir.name, "auto-gpt")
+        self.vectors = clustered_vectors(400)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def new_index(self):
+        return IVFIndex(self.prefix, nprobe=2, min_train_size=100)
+
+    def test_not_trained_below_min_train_size(self):
+        index = self.new_index()
+        index.load(self.vectors[:99])
+        self.assertFalse(index.trained)
+        self.assertIsNone(index.candidates(self.vectors[0]))
+
+    def test_trains_and_assigns_incrementally(self):
+        index = self.new_index()
+        index.load(self.vectors[:0])
+        for size in range(1, 301):
+            index.update(self.vectors[:size])
+
+        self.assertTrue(index.trained)
+        self.assertEqual(index.count, 300)
+        self.assertEqual(sum(len(ids) for ids in index.lists), 300)
+        self.assertEqual(os.path.getsize(index.assignments_filename), 300 * 4)
+
+    def test_retrains_on_load_when_memory_grew(self):
+        index = self.new_index()
+        index.load(self.vectors[:100])
+        self.assertEqual(index.trained_size, 100)
+        # Adding vectors never retrains
+        index.update(self.vectors[: 100 * RETRAIN_FACTOR])
+        self.assertEqual(index.trained_size, 100)
+        self.assertEqual(index.count, 100 * RETRAIN_FACTOR)
+        self.assertTrue(index.stale)
+        index.close()
+
+        reloaded = self.new_index()
+        reloaded.load(self.vectors[: 100 * RETRAIN_FACTOR])
+        self.assertEqual(reloaded.trained_size, 100 * RETRAIN_FACTOR)
+        self.assertFalse(reloaded.stale)
+
+    def test_candidates_contain_nearest_neighbour(self):
+        index = self.new_index()
+        index.load(self.vectors[:300])
+        for i in range(0, 300, 7):
+            self.assertIn(i, index.candidates(self.vectors[i]))
+
+    def test_persisted_index_is_reloaded(self):
+        index = self.new_index()
+        index.load(self.vectors[:300])
+        index.close()
+
+        reloaded = self.new_index()
+        reloaded.load(self.vectors[:310])
+
+        np.testing.assert_array_equal(reloaded.centroids, index.centroids)
+        self.assertEqual(reloaded.count, 310)
+        self.assertIn(305, reloaded.candidates(self.vectors[305]))
+
+    def test_clear(self):
+        index = self.new_index()
+        index.load(self.vectors[:300])
+        index.clear()
+        self.assertFalse(index.trained)
+        self.assertFalse(os.path.exists(index.centroids_filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
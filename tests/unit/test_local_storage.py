@@ -0,0 +1,165 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import orjson
+
+from autogpt.memory.local_storage import LocalStorage
+from autogpt.memory.local_vectors import MIN_CAPACITY
+
+
+class TestLocalStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.tmp_dir.name, "auto-gpt")
+        self.storage = LocalStorage(self.prefix, 4)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_load_creates_empty_store(self):
+        texts, embeddings = self.storage.load()
+        self.assertEqual(texts, [])
+        self.assertEqual(embeddings.shape, (0, 4))
+        self.assertTrue(self.storage.exists())
+
+    def test_append_and_reload(self):
+        self.storage.load()
+        self.storage.append("first", np.array([1, 0, 0, 0], dtype=np.float32))
+        self.storage.append("sécond", np.array([0, 1, 0, 0], dtype=np.float32))
+
+        texts, embeddings = LocalStorage(self.prefix, 4).load()
+
+        self.assertEqual(texts, ["first", "sécond"])
+        self.assertEqual(texts[-1], "sécond")
+        self.assertIsInstance(embeddings, np.memmap)
+        np.testing.assert_array_equal(embeddings, np.eye(4, dtype=np.float32)[:2])
+
+    def test_offsets_are_rebuilt_for_older_stores(self):
+        self.storage.load()
+        self.storage.append("first", np.ones(4, dtype=np.float32))
+        self.storage.append("second", np.ones(4, dtype=np.float32))
+        self.storage.close()
+        os.remove(self.storage.offsets_filename)
+
+        texts, _ = self.storage.load()
+
+        self.assertEqual(texts, ["first", "second"])
+
+    def test_stores_of_another_embedding_model_are_refused(self):
+        LocalStorage(self.prefix, 4, model="hashing-4").load()
+        LocalStorage(self.prefix, 4, model="hashing-4").load()
+        with self.assertRaises(ValueError):
+            LocalStorage(self.prefix, 4, model="text-embedding-ada-002").load()
+
+    def test_the_model_is_recorded_for_older_stores(self):
+        self.storage.load()
+        self.storage.close()
+        LocalStorage(self.prefix, 4, model="hashing-4").load()
+        with open(f"{self.prefix}.meta.json", "rb") as f:
+            self.assertEqual(orjson.loads(f.read())["model"], "hashing-4")
+
+    def test_append_only_writes_its_own_record(self):
+        self.storage.load()
+        self.storage.append("first", np.ones(4, dtype=np.float32))
+        size = os.path.getsize(self.storage.texts_filename)
+        self.storage.append("other", np.ones(4, dtype=np.float32))
+        self.assertEqual(os.path.getsize(self.storage.texts_filename), 2 * size)
+
+    def test_capacity_doubles(self):
+        self.storage.load()
+        for i in range(MIN_CAPACITY + 1):
+            self.storage.append(str(i), np.full(4, i, dtype=np.float32))
+
+        self.assertEqual(self.storage.capacity, 2 * MIN_CAPACITY)
+        self.assertEqual(self.storage.embeddings.shape, (MIN_CAPACITY + 1, 4))
+        self.assertEqual(self.storage.embeddings[-1, 0], MIN_CAPACITY)
+
+        texts, embeddings = LocalStorage(self.prefix, 4).load()
+        self.assertEqual(len(texts), MIN_CAPACITY + 1)
+        self.assertEqual(embeddings.shape, (MIN_CAPACITY + 1, 4))
+
+    def test_unused_capacity_is_reclaimed_on_load(self):
+        self.storage.load()
+        for i in range(3):
+            self.storage.append(str(i), np.full(4, i, dtype=np.float32))
+        self.assertEqual(self.storage.capacity, MIN_CAPACITY)
+
+        storage = LocalStorage(self.prefix, 4)
+        _, embeddings = storage.load()
+
+        self.assertEqual(storage.capacity, 3)
+        self.assertEqual(os.path.getsize(storage.vectors_filename), 3 * 4 * 4)
+        np.testing.assert_array_equal(embeddings[:, 0], [0, 1, 2])
+        storage.append("3", np.full(4, 3, dtype=np.float32))
+        self.assertEqual(storage.capacity, MIN_CAPACITY)
+        self.assertEqual(storage.embeddings[-1, 0], 3)
+
+    def test_torn_tail_is_truncated(self):
+        self.storage.load()
+        self.storage.append("first", np.ones(4, dtype=np.float32))
+        # Simulate a crash before the offset of the second record was committed
+        with open(self.storage.vectors_filename, "ab") as f:
+            f.write(np.ones(4, dtype=np.float32).tobytes())
+        with open(self.storage.texts_filename, "ab") as f:
+            f.write(b"\x06\x00\x00\x00second")
+
+        texts, embeddings = self.storage.load()
+
+        self.assertEqual(texts, ["first"])
+        self.assertEqual(embeddings.shape, (1, 4))
+        self.assertEqual(os.path.getsize(self.storage.texts_filename), 9)
+        self.assertEqual(os.path.getsize(self.storage.offsets_filename), 8)
+
+    def test_clear(self):
+        self.storage.load()
+        self.storage.append("first", np.ones(4, dtype=np.float32))
+        self.storage.clear()
+        texts, embeddings = self.storage.load()
+        self.assertEqual(texts, [])
+        self.assertEqual(embeddings.shape, (0, 4))
+
+    def test_migrate_json(self):
+        json_filename = f"{self.prefix}.json"
+        with open(json_filename, "wb") as f:
+            f.write(
+                orjson.dumps(
+                    {"texts": ["old memory"], "embeddings": [[0.5, 0.5, 0.5, 0.5]]}
+                )
+            )
+
+        self.assertTrue(self.storage.migrate_json(json_filename))
+        texts, embeddings = self.storage.load()
+
+        self.assertEqual(texts, ["old memory"])
+        np.testing.assert_array_equal(embeddings, np.full((1, 4), 0.5))
+        self.assertFalse(os.path.exists(json_filename))
+        self.assertTrue(os.path.exists(f"{json_filename}.migrated"))
+        self.assertFalse(self.storage.migrate_json(json_filename))
+
+    def test_migrate_json_records_the_ada_model(self):
+        json_filename = f"{self.prefix}.json"
+        with open(json_filename, "wb") as f:
+            f.write(orjson.dumps({"texts": ["old memory"], "embeddings": [[0.5] * 4]}))
+        storage = LocalStorage(self.prefix, 4, model="hashing-4")
+
+        self.assertTrue(storage.migrate_json(json_filename))
+
+        with self.assertRaises(ValueError):
+            storage.load()
+        LocalStorage(self.prefix, 4, model="text-embedding-ada-002").load()
+
+    def test_migrate_json_of_another_dimension(self):
+        json_filename = f"{self.prefix}.json"
+        with open(json_filename, "wb") as f:
+            f.write(orjson.dumps({"texts": ["old memory"], "embeddings": [[0.5] * 8]}))
+
+        self.assertFalse(self.storage.migrate_json(json_filename))
+
+        self.assertFalse(self.storage.exists())
+        self.assertTrue(os.path.exists(json_filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
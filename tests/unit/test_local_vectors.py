@@ -0,0 +1,141 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from autogpt.memory.local_storage import LocalStorage
+from autogpt.memory.local_vectors import MIN_CAPACITY, DecodedView, VectorFile
+
+
+def unit_vectors(count, dim=64, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+class TestVectorFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, "auto-gpt.vectors")
+        self.vectors = unit_vectors(100)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_unknown_precision(self):
+        with self.assertRaises(ValueError):
+            VectorFile(self.filename, 64, "int4")
+
+    def test_row_sizes(self):
+        self.assertEqual(VectorFile(self.filename, 64).row_nbytes, 256)
+        self.assertEqual(VectorFile(self.filename, 64, "float16").row_nbytes, 128)
+        self.assertEqual(VectorFile(self.filename, 64, "int8").row_nbytes, 68)
+
+    def test_decode_error_is_bounded(self):
+        for precision, tolerance in (("float16", 1e-3), ("int8", 1 / 254)):
+            vector_file = VectorFile(self.filename, 64, precision)
+            decoded = vector_file.decode(vector_file.encode(self.vectors))
+            # int8 rounds each component to half a step of max(|x|) / 127
+            bound = tolerance * np.abs(self.vectors).max(axis=1, keepdims=True)
+            self.assertTrue(np.all(np.abs(decoded - self.vectors) <= bound + 1e-7))
+
+    def test_zero_vector_roundtrip(self):
+        vector_file = VectorFile(self.filename, 64, "int8")
+        decoded = vector_file.decode(vector_file.encode(np.zeros((1, 64))))
+        np.testing.assert_array_equal(decoded, np.zeros((1, 64)))
+
+    def test_score_matches_decoded_dot_product(self):
+        vector_file = VectorFile(self.filename, 64, "int8")
+        vector_file.write_all(self.vectors)
+        vector_file.map(vector_file.rows_on_disk())
+        rows = vector_file.view(100)
+        decoded = vector_file.decode(rows)
+        queries = unit_vectors(3, seed=1)
+
+        np.testing.assert_allclose(
+            vector_file.score(rows, queries[0]), decoded @ queries[0], atol=1e-5
+        )
+        np.testing.assert_allclose(
+            vector_file.score(rows, queries.T), decoded @ queries.T, atol=1e-5
+        )
+        np.testing.assert_allclose(
+            DecodedView(vector_file, rows)[10:20], decoded[10:20], atol=1e-7
+        )
+        vector_file.close()
+
+    def test_write_row_grows_the_file(self):
+        vector_file = VectorFile(self.filename, 64, "int8")
+        vector_file.write_all(np.zeros((0, 64)))
+        vector_file.write_row(0, self.vectors[0])
+        self.assertEqual(vector_file.capacity, MIN_CAPACITY)
+        self.assertEqual(os.path.getsize(self.filename), MIN_CAPACITY * 68)
+        vector_file.close()
+
+
+class TestQuantizedStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.tmp_dir.name, "auto-gpt")
+        self.vectors = unit_vectors(10)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def fill(self, storage):
+        storage.load()
+        for i, vector in enumerate(self.vectors):
+            storage.append(f"memory {i}", vector)
+        storage.close()
+
+    def test_precision_is_converted_on_load(self):
+        self.fill(LocalStorage(self.prefix, 64))
+
+        storage = LocalStorage(self.prefix, 64, "int8", keep_full_precision=True)
+        texts, embeddings = storage.load()
+
+        self.assertEqual(len(texts), 10)
+        self.assertEqual(embeddings.dtype, storage.vectors.row_dtype)
+        np.testing.assert_allclose(
+            storage.decoded_embeddings[:], self.vectors, atol=1 / 127
+        )
+        # The float32 copy is exact and is used for re-ranking
+        np.testing.assert_array_equal(
+            storage.exact_score(self.vectors[3], np.arange(10)),
+            np.dot(self.vectors, self.vectors[3]),
+        )
+        storage.close()
+
+        storage = LocalStorage(self.prefix, 64, "float16")
+        storage.load()
+        self.assertFalse(os.path.exists(storage.full_vectors_filename))
+        np.testing.assert_allclose(storage.embeddings, self.vectors, atol=1e-3)
+        storage.close()
+
+    def test_full_precision_copy_is_appended(self):
+        self.fill(LocalStorage(self.prefix, 64, "int8", keep_full_precision=True))
+
+        storage = LocalStorage(self.prefix, 64, "int8", keep_full_precision=True)
+        storage.load()
+        np.testing.assert_array_equal(
+            storage.full_vectors.view(10), self.vectors.astype(np.float32)
+        )
+        storage.close()
+
+    def test_full_precision_copy_of_a_quantized_store_is_approximate(self):
+        self.fill(LocalStorage(self.prefix, 64, "int8"))
+
+        storage = LocalStorage(self.prefix, 64, "int8", keep_full_precision=True)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            storage.load()
+        self.assertIn("only approximate", output.getvalue())
+        np.testing.assert_allclose(
+            storage.full_vectors.view(10), self.vectors, atol=1 / 127
+        )
+        storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from openai.error import Timeout
+
+from autogpt import llm_utils, model_router
+from autogpt.model_router import ModelRouter
+from tests.unit.test_llm_utils import response
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def config(**overrides):
+    return SimpleNamespace(
+        **{
+            "fast_llm_model": "gpt-3.5-turbo",
+            "smart_llm_model": "gpt-4",
+            "fast_token_limit": 4000,
+            "smart_token_limit": 8000,
+            "model_router_max_error_rate": 0.5,
+            "model_router_latency_budget": 0,
+            "model_router_fallback": True,
+            **overrides,
+        }
+    )
+
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.router = ModelRouter(config(), clock=self.clock)
+
+    def test_the_preferred_model_is_kept_by_default(self):
+        self.assertEqual(
+            self.router.route("chat", "gpt-3.5-turbo", 1000), "gpt-3.5-turbo"
+        )
+        self.assertEqual(self.router.route("ai_function", "gpt-4", 1000), "gpt-4")
+
+    def test_prompts_too_long_for_the_preferred_model_move(self):
+        self.assertEqual(
+            self.router.route("chat", "gpt-3.5-turbo", 3500, 1000), "gpt-4"
+        )
+        # Unless the other model is too small as well
+        self.assertEqual(
+            self.router.route("chat", "gpt-3.5-turbo", 9000), "gpt-3.5-turbo"
+        )
+
+    def test_token_limits_are_capped_to_the_model_context(self):
+        router = ModelRouter(
+            config(fast_token_limit=16000, smart_llm_model="gpt-4-32k-0314")
+        )
+        self.assertEqual(router.token_limit("gpt-3.5-turbo"), 4096)
+        self.assertEqual(router.token_limit("gpt-4-32k-0314"), 8000)
+        self.assertEqual(router.token_limit("my-finetune"), float("inf"))
+        self.assertEqual(router.route("chat", "gpt-3.5-turbo", 5000), "gpt-4-32k-0314")
+
+    def test_failing_models_are_avoided_until_the_failures_expire(self):
+        for _ in range(3):
+            self.router.record("gpt-4", 0, failed=True)
+        self.assertEqual(
+            self.router.route("ai_function", "gpt-4", 100), "gpt-3.5-turbo"
+        )
+        self.clock.now = 301
+        self.assertEqual(self.router.route("ai_function", "gpt-4", 100), "gpt-4")
+
+    def test_slow_models_are_avoided_only_for_faster_ones(self):
+        router = ModelRouter(config(model_router_latency_budget=10), clock=self.clock)
+        for _ in range(3):
+            router.record("gpt-4", 20)
+        self.assertEqual(router.route("ai_function", "gpt-4", 100), "gpt-4")
+        for _ in range(3):
+            router.record("gpt-3.5-turbo", 5)
+        self.assertEqual(router.route("ai_function", "gpt-4", 100), "gpt-3.5-turbo")
+
+    def test_a_single_model_is_never_routed_away(self):
+        router = ModelRouter(config(smart_llm_model="gpt-3.5-turbo"))
+        self.assertEqual(router.route("chat", "gpt-3.5-turbo", 9000), "gpt-3.5-turbo")
+        self.assertIsNone(router.fallback("gpt-3.5-turbo"))
+
+    def test_decisions_are_logged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log_file = os.path.join(directory, "logs", "router.jsonl")
+            router = ModelRouter(config(), log_file)
+            router.route("chat", "gpt-3.5-turbo", 3500, 1000)
+            router.fallback("gpt-4")
+            with open(log_file) as f:
+                entries = [json.loads(line) for line in f]
+
+        self.assertEqual(
+            [(e["call_site"], e["model"], e["reason"]) for e in entries],
+            [("chat", "gpt-4", "context"), ("retry", "gpt-3.5-turbo", "timeout")],
+        )
+        self.assertEqual(router.report(), "Model routing: 1 context, 1 timeout")
+
+
+class TestTimeoutFallback(unittest.TestCase):
+    def setUp(self):
+        for patcher in (
+            patch.object(llm_utils.CFG, "completion_cache", False),
+            patch.object(model_router, "_router", ModelRouter(config())),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_timed_out_requests_are_retried_on_the_other_model(self):
+        with patch(
+            "openai.ChatCompletion.create",
+            side_effect=[Timeout("timed out"), response("hi")],
+        ) as create:
+            reply = llm_utils.create_chat_completion([], model="gpt-4")
+
+        self.assertEqual(reply, "hi")
+        self.assertEqual(
+            [call.kwargs["model"] for call in create.call_args_list],
+            ["gpt-4", "gpt-3.5-turbo"],
+        )
+
+    def test_timeouts_are_raised_without_fallback(self):
+        model_router._router.cfg.model_router_fallback = False
+        with patch("openai.ChatCompletion.create", side_effect=Timeout("timed out")):
+            with self.assertRaises(Timeout):
+                llm_utils.create_chat_completion([], model="gpt-4")
+
+
+if __name__ == "__main__":
+    unittest.main()
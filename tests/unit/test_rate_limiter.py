@@ -0,0 +1,201 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+import openai
+
+from autogpt import embeddings, llm_utils, rate_limiter
+from autogpt.api_endpoints import Endpoint, EndpointPool
+from autogpt.embeddings import EmbeddingClient, OpenAIEmbeddingBackend
+from autogpt.mock_openai_server import MockOpenAIServer
+from autogpt.rate_limiter import AdaptiveSemaphore, RateLimiter, parse_duration
+
+KEY = ("gpt-4", None)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+    def patch_asyncio_sleep(self, test):
+        """Make asyncio.sleep move the clock instead of waiting"""
+        real_sleep = asyncio.sleep
+
+        async def sleep(delay, result=None):
+            self.now += delay
+            return await real_sleep(0, result)
+
+        patcher = patch("asyncio.sleep", sleep)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+def limit_headers(limit, remaining, **extra):
+    return {
+        "x-ratelimit-limit-requests": str(limit),
+        "x-ratelimit-remaining-requests": str(remaining),
+        **extra,
+    }
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(clock=self.clock)
+
+    def test_requests_are_not_delayed_before_limits_are_known(self):
+        self.assertEqual([self.limiter.reserve(KEY, 100) for _ in range(5)], [0] * 5)
+
+    def test_requests_are_spread_once_the_limit_is_reached(self):
+        self.limiter.observe(KEY, limit_headers(60, 2))
+        delays = [self.limiter.reserve(KEY, 0) for _ in range(4)]
+        self.assertEqual(delays, [0, 0, 1.0, 2.0])
+        # Other models have their own limits
+        self.assertEqual(self.limiter.reserve(("gpt-3.5-turbo", None), 0), 0)
+
+    def test_tokens_are_limited(self):
+        self.limiter.observe(
+            KEY,
+            {"X-RateLimit-Limit-Tokens": "6000", "X-RateLimit-Remaining-Tokens": "100"},
+        )
+        self.assertEqual(self.limiter.reserve(KEY, 100), 0)
+        self.assertAlmostEqual(self.limiter.reserve(KEY, 500), 5.0)
+
+    def test_retry_after_blocks_the_model(self):
+        retry_after = self.limiter.throttled(KEY, {"Retry-After": "2"})
+        self.assertEqual(retry_after, 2.0)
+        self.assertEqual(self.limiter.reserve(KEY, 0), 2.0)
+        self.clock.now = 3.0
+        self.assertEqual(self.limiter.reserve(KEY, 0), 0)
+
+    def test_reset_is_used_without_retry_after(self):
+        headers = limit_headers(60, 0, **{"x-ratelimit-reset-requests": "1m30s"})
+        self.assertEqual(self.limiter.throttled(KEY, headers), 90.0)
+
+    def test_concurrency_is_halved_and_recovers(self):
+        self.assertEqual(self.limiter.concurrency(8), 8)
+        self.limiter.throttled(KEY, {})
+        self.assertEqual(self.limiter.concurrency(8), 4)
+        self.limiter.throttled(KEY, {})
+        self.assertEqual(self.limiter.concurrency(8), 2)
+        for _ in range(40):
+            self.limiter.observe(KEY, {})
+        self.assertEqual(self.limiter.concurrency(8), 8)
+
+    def test_durations(self):
+        self.assertEqual(parse_duration("20ms"), 0.02)
+        self.assertEqual(parse_duration("6m0s"), 360.0)
+        self.assertEqual(parse_duration("1.5"), 1.5)
+        self.assertIsNone(parse_duration("soon"))
+
+
+class TestAdaptiveSemaphore(unittest.TestCase):
+    def test_waiters_follow_the_number_of_slots(self):
+        slots = 1
+
+        async def scenario():
+            nonlocal slots
+            semaphore = AdaptiveSemaphore(lambda: slots)
+            await semaphore.acquire()
+            waiters = [asyncio.ensure_future(semaphore.acquire()) for _ in range(2)]
+            await asyncio.sleep(0)
+            self.assertEqual(semaphore.in_use, 1)
+            slots = 2
+            semaphore.release()
+            await asyncio.sleep(0)
+            await asyncio.gather(*waiters)
+            return semaphore.in_use
+
+        self.assertEqual(asyncio.run(scenario()), 2)
+
+
+class TestAgainstFakeServer(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            patch.object(openai, "api_key", "sk-test"),
+            patch.object(llm_utils.CFG, "use_azure", False),
+            patch.object(llm_utils.CFG, "completion_cache", False),
+            patch.object(llm_utils.CFG, "llm_max_concurrency", 4),
+            patch.object(llm_utils.logger, "double_check"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def serve(self, server, limiter):
+        server.__enter__()
+        self.addCleanup(server.__exit__)
+        for patcher in (
+            patch.object(openai, "api_base", server.url),
+            patch.object(rate_limiter, "_limiter", limiter),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return server
+
+    def test_retry_after_replaces_the_exponential_backoff(self):
+        server = self.serve(MockOpenAIServer(), RateLimiter())
+        server.fail_next(429, {"retry-after": "0.05"})
+
+        with patch("time.sleep", wraps=time.sleep) as sleep:
+            reply = llm_utils.create_chat_completion([], model="gpt-4")
+
+        self.assertEqual(reply, "ok")
+        self.assertEqual(server.received, 2)
+        sleep.assert_called_once_with(0.05)
+
+    def test_bursts_are_scheduled_under_the_limit(self):
+        clock = FakeClock()
+        clock.patch_asyncio_sleep(self)
+        # Requests sent before the limit was known are not in the headers of the
+        # responses to the ones in flight, so one is sent at a time
+        concurrency = patch.object(llm_utils.CFG, "llm_max_concurrency", 1)
+        concurrency.start()
+        self.addCleanup(concurrency.stop)
+        server = self.serve(
+            MockOpenAIServer(requests_per_period=10, period=0.5, clock=clock),
+            RateLimiter(period=0.5, clock=clock),
+        )
+
+        replies = llm_utils.run_concurrently(
+            llm_utils.acreate_chat_completion(
+                [{"role": "user", "content": str(i)}], model="gpt-4"
+            )
+            for i in range(30)
+        )
+
+        self.assertEqual(replies, ["ok"] * 30)
+        self.assertEqual(server.throttled, 0)
+        self.assertEqual(server.received, 30)
+        # The 20 requests over the initial burst wait for the bucket to refill
+        self.assertAlmostEqual(clock.now, 1.0)
+
+    @patch.object(embeddings, "count_string_tokens", return_value=1)
+    def test_embeddings_share_the_limiter(self, _):
+        clock = FakeClock()
+        limiter = RateLimiter(clock=clock)
+        server = self.serve(MockOpenAIServer(clock=clock), limiter)
+        server.fail_next(429, {"retry-after": "0.01"})
+        waits = []
+        client = EmbeddingClient(
+            OpenAIEmbeddingBackend(
+                EndpointPool([Endpoint(None)], limiter, clock=clock)
+            ),
+            sleep=lambda delay: (waits.append(delay), clock.sleep(delay)),
+        )
+
+        self.assertEqual(client.embed_many(["a", "bb"]), [[1.0], [2.0]])
+        # The wait asked for is taken once, not again before the next request
+        self.assertEqual(waits, [0.01])
+        self.assertEqual(limiter.throttled_requests, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import patch
+
+import openai
+
+from autogpt import llm_utils, rate_limiter
+from autogpt.mock_openai_server import MockOpenAIServer
+from autogpt.rate_limiter import RateLimiter
+from autogpt.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flights = SingleFlight("tests")
+
+    def test_concurrent_threads_share_one_call(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def call():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return "result"
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(self.flights.do("key", call))
+        )
+        leader.start()
+        started.wait()
+        followers = [
+            threading.Thread(
+                target=lambda: results.append(self.flights.do("key", call))
+            )
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        while self.flights.metrics.requests < 4:
+            pass
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join()
+
+        self.assertEqual(results, ["result"] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.flights.metrics.coalesced, 3)
+        self.assertEqual(self.flights.metrics.coalesced_rate, 0.75)
+
+    def test_calls_after_the_flight_are_made_again(self):
+        self.assertEqual(self.flights.do("key", lambda: 1), 1)
+        self.assertEqual(self.flights.do("key", lambda: 2), 2)
+        self.assertEqual(self.flights.metrics.coalesced, 0)
+
+    def test_errors_are_shared(self):
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError("failed")
+
+        async def scenario():
+            return await asyncio.gather(
+                self.flights.ado("key", fail),
+                self.flights.ado("key", fail),
+                return_exceptions=True,
+            )
+
+        errors = asyncio.run(scenario())
+        self.assertIsInstance(errors[0], ValueError)
+        self.assertIs(errors[0], errors[1])
+
+    def test_concurrent_tasks_share_one_call(self):
+        calls = []
+
+        async def call(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value
+
+        async def scenario():
+            return await asyncio.gather(
+                self.flights.ado("a", lambda: call(1)),
+                self.flights.ado("a", lambda: call(2)),
+                self.flights.ado("b", lambda: call(3)),
+            )
+
+        self.assertEqual(asyncio.run(scenario()), [1, 1, 3])
+        self.assertEqual(calls, [1, 3])
+        self.assertIn("1 of 3 requests", self.flights.report())
+
+    def test_the_call_outlives_a_cancelled_caller(self):
+        cancelled = []
+
+        async def call():
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return "result"
+
+        async def scenario():
+            first = asyncio.ensure_future(self.flights.ado("key", call))
+            second = asyncio.ensure_future(self.flights.ado("key", call))
+            await asyncio.sleep(0)
+            first.cancel()
+            result = await second
+            self.assertTrue(first.cancelled())
+            return result
+
+        self.assertEqual(asyncio.run(scenario()), "result")
+        self.assertEqual(cancelled, [])
+
+    def test_the_call_is_cancelled_with_its_last_caller(self):
+        cancelled = []
+
+        async def call():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def scenario():
+            caller = asyncio.ensure_future(self.flights.ado("key", call))
+            await asyncio.sleep(0)
+            caller.cancel()
+            await asyncio.wait([caller])
+
+        asyncio.run(scenario())
+        self.assertEqual(cancelled, [True])
+
+
+class TestChatCompletionCoalescing(unittest.TestCase):
+    def setUp(self):
+        server = MockOpenAIServer().__enter__()
+        self.addCleanup(server.__exit__)
+        self.server = server
+        for patcher in (
+            patch.object(openai, "api_key", "sk-test"),
+            patch.object(openai, "api_base", server.url),
+            patch.object(llm_utils.CFG, "use_azure", False),
+            patch.object(llm_utils.CFG, "completion_cache", False),
+            patch.object(llm_utils.logger, "double_check"),
+            patch.object(rate_limiter, "_limiter", RateLimiter()),
+            patch.object(llm_utils, "_chat_completion_flights", SingleFlight("chat")),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_identical_requests_share_one_call(self):
+        messages = [{"role": "user", "content": "Hello"}]
+
+        replies = llm_utils.run_concurrently(
+            llm_utils.acreate_chat_completion(messages, model="gpt-4") for _ in range(5)
+        )
+
+        self.assertEqual(replies, ["ok"] * 5)
+        self.assertEqual(self.server.received, 1)
+        self.assertEqual(llm_utils.chat_completion_coalescing().coalesced, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
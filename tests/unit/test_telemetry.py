@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from autogpt import llm_utils, telemetry
+from autogpt.telemetry import LLMCall, LLMLedger, llm_command, model_prices
+from tests.unit.test_llm_utils import Completion, response, stream
+
+
+def summarize_page():
+    return llm_utils.create_chat_completion([{"role": "user", "content": "page"}])
+
+
+class TestLLMLedger(unittest.TestCase):
+    def test_prices_match_the_longest_prefix(self):
+        self.assertEqual(model_prices("gpt-4-0314"), (0.03, 0.06))
+        self.assertEqual(model_prices("gpt-4-32k-0314"), (0.06, 0.12))
+        self.assertEqual(model_prices("davinci"), (0.0, 0.0))
+
+    def test_calls_are_written_and_totalled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "logs", "ledger.jsonl")
+            ledger = LLMLedger(filename)
+            ledger.record(LLMCall("chat", "gpt-4", "fix_json", None, 1000, 500, 2.0))
+            ledger.record(
+                LLMCall("chat", "gpt-3.5-turbo", "summarize_chunk", "browse", 500, 0, 1)
+            )
+            with open(filename) as f:
+                entries = [json.loads(line) for line in f]
+
+        self.assertEqual(entries[0]["cost"], 0.06)
+        self.assertEqual(entries[1]["command"], "browse")
+        self.assertEqual(ledger.total.calls, 2)
+        self.assertAlmostEqual(ledger.by_command["agent"].cost, 0.06)
+        self.assertEqual(ledger.by_call_site["summarize_chunk"].prompt_tokens, 500)
+        summary = ledger.summary()
+        self.assertIn("LLM calls: 2, 1500 prompt and 500 completion tokens", summary)
+        # The most expensive comes first
+        self.assertLess(summary.index("  agent"), summary.index("  browse"))
+
+
+class TestChatCompletionLedger(unittest.TestCase):
+    def setUp(self):
+        self.ledger = LLMLedger()
+        for patcher in (
+            patch.object(llm_utils.CFG, "completion_cache", False),
+            patch.object(telemetry, "_ledger", self.ledger),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_usage_call_site_and_command_are_recorded(self):
+        reply = response("a summary")
+        reply["usage"] = Completion(prompt_tokens=12, completion_tokens=3)
+        with patch("openai.ChatCompletion.create", return_value=reply):
+            with llm_command("browse_website"):
+                summarize_page()
+
+        call = self.ledger.by_call_site["summarize_page"]
+        self.assertEqual((call.prompt_tokens, call.completion_tokens), (12, 3))
+        self.assertEqual(list(self.ledger.by_command), ["browse_website"])
+
+    def test_streamed_usage_is_estimated(self):
+        with patch("openai.ChatCompletion.create", return_value=stream("abcd" * 3)):
+            llm_utils.create_chat_completion(
+                [{"role": "user", "content": "abcdefgh"}], stream=True
+            )
+
+        self.assertEqual(self.ledger.total.prompt_tokens, 2)
+        self.assertEqual(self.ledger.total.completion_tokens, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()